@@ -0,0 +1,42 @@
+"""Compara dois resultados de ``bench.run`` (antes → depois).
+
+    python -m bench.compare bench/results/A.json bench/results/B.json
+"""
+import argparse
+import json
+
+METRICS = (("latency_s", "s", 1), ("requests", "req", 1), ("bytes_out", "MB", 1e6), ("peak_mem_bytes", "MB mem", 1e6))
+
+
+def _index(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data["commit"], {(r["leads"], r["scenario"]): r for r in data["results"]}
+
+
+def _delta(a, b):
+    if not a:
+        return "   n/a"
+    return f"{(b - a) / a * 100:+6.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--phase", choices=["cold", "warm"], default="cold")
+    args = parser.parse_args(argv)
+
+    commit_a, before = _index(args.before)
+    commit_b, after = _index(args.after)
+    print(f"{commit_a} → {commit_b} ({args.phase})")
+    for key in sorted(before.keys() & after.keys()):
+        a, b = before[key][args.phase], after[key][args.phase]
+        cells = [f"{b[m] / scale:10.2f} {unit} {_delta(a[m], b[m])}" for m, unit, scale in METRICS]
+        print(f"{key[0]:>9} {key[1]:24s} " + " | ".join(cells))
+    for key in sorted(before.keys() ^ after.keys()):
+        print(f"{key[0]:>9} {key[1]:24s} só em {'antes' if key in before else 'depois'}")
+
+
+if __name__ == "__main__":
+    main()
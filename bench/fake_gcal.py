@@ -0,0 +1,358 @@
+"""Servidor local que imita a API v3 do Google Agenda (eventos) para testes.
+
+Implementa o que utils/google_calendar.py usa: events.list com
+``syncToken``/``pageToken``/``showDeleted`` (410 para token expirado),
+insert/get/update/patch/delete de eventos, o endpoint de batch
+(multipart/mixed) e a troca de refresh token por token de acesso. Com
+``--rate`` cada item acima do limite por segundo recebe 429, como a cota
+do Google.
+
+Rotas de controle (não existem no Google):
+    POST /__gcal/edit     {"calendar": "...", "id": "...", "patch": {...}}  edição feita "no Google"
+    POST /__gcal/delete   {"calendar": "...", "id": "..."}
+    POST /__gcal/expire   invalida os syncTokens emitidos até agora
+    POST /__gcal/quota    {"rate": N}  muda o limite de itens por segundo
+    GET  /__gcal/events   eventos de todas as agendas
+    GET  /__gcal/stats    requisições, itens de lote, bytes e 429s
+    POST /__gcal/reset    apaga as agendas e zera as estatísticas
+
+Uso: ``python -m bench.fake_gcal --port 8085`` e
+``GCAL_API_URL=http://127.0.0.1:8085/calendar/v3``,
+``GCAL_BATCH_URL=http://127.0.0.1:8085/batch/calendar/v3``,
+``GCAL_TOKEN_URL=http://127.0.0.1:8085/token``.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+API_PREFIX = "/calendar/v3"
+BATCH_PATH = "/batch/calendar/v3"
+_EVENTS = re.compile(rf"^{API_PREFIX}/calendars/([^/]+)/events(?:/([^/]+))?$")
+
+
+class ApiError(Exception):
+    def __init__(self, status, reason, message):
+        super().__init__(message)
+        self.status = status
+        self.body = {"error": {"code": status, "message": message,
+                               "errors": [{"domain": "global", "reason": reason, "message": message}]}}
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+# ---------------- Dados ----------------
+class Store:
+    """Eventos por agenda; cada alteração recebe um número de sequência (base dos syncTokens)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calendars = {}
+            self.seq = 0
+            self.min_token = 0  # tokens abaixo disso respondem 410
+
+    def _touch(self, event):
+        self.seq += 1
+        event["_seq"] = self.seq
+        event["etag"] = f'"{self.seq}"'
+        event["updated"] = _now()
+        return event
+
+    def events(self, calendar):
+        return self.calendars.setdefault(calendar, {})
+
+    def insert(self, calendar, body):
+        with self.lock:
+            events = self.events(calendar)
+            eid = body.get("id") or uuid.uuid4().hex
+            if eid in events:
+                raise ApiError(409, "duplicate", "The requested identifier already exists.")
+            event = {**body, "id": eid, "status": "confirmed", "created": _now(), "kind": "calendar#event"}
+            events[eid] = self._touch(event)
+            return event
+
+    def get(self, calendar, eid):
+        with self.lock:
+            event = self.events(calendar).get(eid)
+            if event is None:
+                raise ApiError(404, "notFound", "Not Found")
+            return event
+
+    def update(self, calendar, eid, body, merge=False):
+        with self.lock:
+            events = self.events(calendar)
+            current = events.get(eid)
+            if current is None:
+                raise ApiError(404, "notFound", "Not Found")
+            base = {**current, **body} if merge else {**body, "created": current["created"], "kind": current["kind"]}
+            event = {**base, "id": eid, "status": body.get("status", "confirmed")}
+            events[eid] = self._touch(event)
+            return event
+
+    def delete(self, calendar, eid):
+        with self.lock:
+            event = self.events(calendar).get(eid)
+            if event is None:
+                raise ApiError(404, "notFound", "Not Found")
+            if event["status"] == "cancelled":
+                raise ApiError(410, "deleted", "Resource has been deleted")
+            event["status"] = "cancelled"
+            self._touch(event)
+
+    def changes(self, calendar, sync_token, show_deleted):
+        """(eventos em ordem de sequência, sequência atual) desde ``sync_token``."""
+        with self.lock:
+            since = 0
+            if sync_token is not None:
+                since = int(sync_token)
+                if since < self.min_token:
+                    raise ApiError(410, "fullSyncRequired", "Sync token is no longer valid, a full sync is required.")
+            items = [e for e in self.events(calendar).values() if e["_seq"] > since]
+            if sync_token is None and not show_deleted:
+                items = [e for e in items if e["status"] != "cancelled"]
+            return sorted(items, key=lambda e: e["_seq"]), self.seq
+
+    def expire_tokens(self):
+        with self.lock:
+            self.min_token = self.seq + 1
+
+
+def _public(event):
+    return {k: v for k, v in event.items() if not k.startswith("_")}
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.batches = 0
+            self.items = 0
+            self.rate_limited = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.by_operation = {}
+
+    def record(self, operation, items=1, limited=0):
+        with self.lock:
+            self.items += items
+            self.rate_limited += limited
+            self.by_operation[operation] = self.by_operation.get(operation, 0) + items
+
+    def as_dict(self):
+        with self.lock:
+            return {"requests": self.requests, "batches": self.batches, "items": self.items,
+                    "rate_limited": self.rate_limited, "bytes_in": self.bytes_in, "bytes_out": self.bytes_out,
+                    "by_operation": dict(self.by_operation)}
+
+
+class Quota:
+    """Limite de itens por segundo (0 = sem limite), em janelas de um segundo."""
+
+    def __init__(self, rate=0):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.window = 0
+        self.used = 0
+
+    def take(self):
+        if not self.rate:
+            return True
+        with self.lock:
+            now = int(time.monotonic())
+            if now != self.window:
+                self.window, self.used = now, 0
+            self.used += 1
+            return self.used <= self.rate
+
+
+# ---------------- HTTP ----------------
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    store = None
+    stats = None
+    quota = None
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, payload=None, raw=None, content_type="application/json"):
+        data = raw if raw is not None else (b"" if payload is None else json.dumps(payload).encode())
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        return len(data)
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        body = self._body()
+        try:
+            if url.path.startswith("/__gcal/"):
+                sent = self._control(url.path, body)
+            elif url.path == "/token":
+                sent = self._send(200, {"access_token": f"fake-{uuid.uuid4().hex}", "expires_in": 3600, "token_type": "Bearer"})
+            elif not (self.headers.get("Authorization") or "").startswith("Bearer "):
+                raise ApiError(401, "authError", "Invalid Credentials")
+            elif url.path == BATCH_PATH and self.command == "POST":
+                with self.stats.lock:
+                    self.stats.batches += 1
+                sent = self._batch(body)
+            else:
+                status, payload = self._api(self.command, url.path, dict(parse_qsl(url.query)), body)
+                sent = self._send(status, payload)
+        except ApiError as e:
+            sent = self._send(e.status, e.body)
+        except Exception as e:  # erro do próprio stand-in: responde em vez de derrubar a conexão
+            sent = self._send(500, {"error": {"code": 500, "message": repr(e), "errors": [{"reason": "backendError"}]}})
+        if not url.path.startswith("/__gcal/"):
+            with self.stats.lock:
+                self.stats.requests += 1
+                self.stats.bytes_in += len(body)
+                self.stats.bytes_out += sent
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+    def _api(self, method, path, params, body):
+        """Uma chamada da API (direta ou item de lote) → (status, corpo)."""
+        match = _EVENTS.match(path)
+        if match is None:
+            raise ApiError(404, "notFound", f"rota não suportada: {method} {path}")
+        calendar, eid = unquote(match.group(1)), match.group(2) and unquote(match.group(2))
+        operation = {"GET": "list" if eid is None else "get", "POST": "insert", "PUT": "update",
+                     "PATCH": "patch", "DELETE": "delete"}[method]
+        if not self.quota.take():
+            self.stats.record(operation, limited=1)
+            raise ApiError(429, "rateLimitExceeded", "Rate Limit Exceeded")
+        self.stats.record(operation)
+        payload = json.loads(body) if body else {}
+        if operation == "list":
+            return 200, self._list(calendar, params)
+        if operation == "get":
+            return 200, _public(self.store.get(calendar, eid))
+        if operation == "insert":
+            return 200, _public(self.store.insert(calendar, payload))
+        if operation in ("update", "patch"):
+            return 200, _public(self.store.update(calendar, eid, payload, merge=operation == "patch"))
+        self.store.delete(calendar, eid)
+        return 204, None
+
+    def _list(self, calendar, params):
+        # pageToken = "desde,até,posição": as páginas seguintes veem a mesma fotografia
+        if params.get("pageToken"):
+            since, upto, offset = params["pageToken"].split(",")
+            token = None if since == "-" else since
+            items, _ = self.store.changes(calendar, token, params.get("showDeleted") == "true")
+            items = [e for e in items if e["_seq"] <= int(upto)]
+            offset, upto = int(offset), int(upto)
+        else:
+            token = params.get("syncToken")
+            items, upto = self.store.changes(calendar, token, params.get("showDeleted") == "true")
+            offset = 0
+        size = int(params.get("maxResults", 250))
+        page = items[offset:offset + size]
+        reply = {"kind": "calendar#events", "items": [_public(e) for e in page]}
+        if offset + size < len(items):
+            reply["nextPageToken"] = f"{token or '-'},{upto},{offset + size}"
+        else:
+            reply["nextSyncToken"] = str(upto)
+        return reply
+
+    def _batch(self, body):
+        boundary = re.search(r'boundary="?([^";]+)"?', self.headers.get("Content-Type") or "")
+        if boundary is None:
+            raise ApiError(400, "badRequest", "multipart/mixed sem boundary")
+        text = body.decode().replace("\r\n", "\n")
+        out_boundary = f"batch_{uuid.uuid4().hex}"
+        out = []
+        for part in text.split(f"--{boundary.group(1)}")[1:]:
+            if part.startswith("--"):
+                break
+            head, _, inner = part.strip("\n").partition("\n\n")
+            cid = re.search(r"content-id:\s*<([^>]+)>", head, re.I)
+            request_line, _, rest = inner.partition("\n")
+            method, target = request_line.split()[:2]
+            payload = rest.partition("\n\n")[2].strip().encode()
+            url = urlsplit(target)
+            try:
+                status, reply = self._api(method, url.path, dict(parse_qsl(url.query)), payload)
+            except ApiError as e:
+                status, reply = e.status, e.body
+            data = "" if reply is None else json.dumps(reply)
+            reason = {200: "OK", 204: "No Content"}.get(status, "Error")
+            out.append("\r\n".join([
+                f"--{out_boundary}", "Content-Type: application/http",
+                f"Content-ID: <response-{cid.group(1) if cid else ''}>", "",
+                f"HTTP/1.1 {status} {reason}", "Content-Type: application/json; charset=UTF-8", "", data,
+            ]))
+        raw = ("\r\n".join(out) + f"\r\n--{out_boundary}--\r\n").encode()
+        return self._send(200, raw=raw, content_type=f"multipart/mixed; boundary={out_boundary}")
+
+    # -- controle
+    def _control(self, path, body):
+        args = json.loads(body or b"{}")
+        if path == "/__gcal/edit":
+            event = self.store.update(args["calendar"], args["id"], args.get("patch") or {}, merge=True)
+            return self._send(200, _public(event))
+        if path == "/__gcal/delete":
+            self.store.delete(args["calendar"], args["id"])
+            return self._send(200, {})
+        if path == "/__gcal/expire":
+            self.store.expire_tokens()
+            return self._send(200, {})
+        if path == "/__gcal/quota":
+            self.quota.rate = int(args.get("rate") or 0)
+            return self._send(200, {})
+        if path == "/__gcal/events":
+            with self.store.lock:
+                dump = {cal: [_public(e) for e in events.values()] for cal, events in self.store.calendars.items()}
+            return self._send(200, dump)
+        if path == "/__gcal/stats":
+            return self._send(200, self.stats.as_dict())
+        if path == "/__gcal/reset":
+            self.store.reset()
+            self.stats.reset()
+            return self._send(200, {})
+        return self._send(404, {"message": "not found"})
+
+
+def make_server(host="127.0.0.1", port=0, rate=0):
+    handler = type("FakeGcalHandler", (Handler,), {"store": Store(), "stats": Stats(), "quota": Quota(rate)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--rate", type=int, default=0, help="itens por segundo antes de responder 429 (0 = sem limite)")
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.rate)
+    print(f"fake google agenda em http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
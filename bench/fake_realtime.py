@@ -0,0 +1,238 @@
+"""Servidor local que imita o Supabase Realtime (postgres_changes) para testes.
+
+Fala o protocolo do Phoenix que o cliente ``realtime`` usa (vsn 1.0.0):
+``phx_join`` com ``config.postgres_changes`` recebe o ``phx_reply`` com os
+ids de cada assinatura, ``heartbeat`` no tópico ``phoenix`` é respondido e
+``phx_leave`` encerra o canal. Os eventos entram pelas rotas de controle
+e saem para todos os canais assinados na tabela, no formato do Supabase
+(``{"ids": [...], "data": {"type", "table", "record", "old_record", ...}}``).
+
+Rotas de controle (HTTP, porta própria; não existem no Supabase):
+    POST /__realtime/emit    {"table": "...", "type": "INSERT|UPDATE|DELETE", "record": {...}, "old_record": {...}}
+    POST /__realtime/replay  {"events": [evento, ...], "interval": 0}  repete uma sequência gravada, em ordem
+    POST /__realtime/drop    derruba as conexões abertas (teste de reconexão)
+    GET  /__realtime/stats   conexões, joins, heartbeats e eventos entregues
+    POST /__realtime/reset   zera as estatísticas
+
+Uso: ``python -m bench.fake_realtime --port 4000 --control-port 4001`` e
+``SUPABASE_REALTIME_URL=http://127.0.0.1:4000/realtime/v1``.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from websockets.asyncio.server import serve
+
+PHOENIX = "phoenix"
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.joins = 0
+            self.heartbeats = 0
+            self.events = 0      # eventos recebidos pelo controle
+            self.delivered = 0   # mensagens postgres_changes enviadas
+            self.drops = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def as_dict(self, open_connections=0):
+        with self.lock:
+            return {"connections": self.connections, "open": open_connections, "joins": self.joins,
+                    "heartbeats": self.heartbeats, "events": self.events, "delivered": self.delivered,
+                    "drops": self.drops}
+
+
+class Hub:
+    """Conexões websocket e canais assinados; roda num event loop próprio."""
+
+    def __init__(self):
+        self.loop = None
+        self.stats = Stats()
+        self.sockets = {}  # websocket → {tópico: [(id, evento, schema, tabela)]}
+        self._next_id = 1
+
+    # -- protocolo
+    async def handle(self, websocket):
+        self.stats.add(connections=1)
+        channels = self.sockets[websocket] = {}
+        try:
+            async for raw in websocket:
+                msg = json.loads(raw)
+                topic, event, ref = msg.get("topic"), msg.get("event"), msg.get("ref")
+                if topic == PHOENIX and event == "heartbeat":
+                    self.stats.add(heartbeats=1)
+                    await self._reply(websocket, topic, ref, {})
+                elif event == "phx_join":
+                    config = (msg.get("payload") or {}).get("config") or {}
+                    bindings = []
+                    for change in config.get("postgres_changes") or []:
+                        bindings.append({"id": self._next_id, "event": change.get("event", "*"),
+                                         "schema": change.get("schema", "public"), "table": change.get("table"),
+                                         "filter": change.get("filter")})
+                        self._next_id += 1
+                    channels[topic] = bindings
+                    self.stats.add(joins=1)
+                    await self._reply(websocket, topic, ref, {"postgres_changes": bindings})
+                elif event == "phx_leave":
+                    channels.pop(topic, None)
+                    await self._reply(websocket, topic, ref, {})
+                elif ref is not None:
+                    await self._reply(websocket, topic, ref, {})
+        except Exception:
+            pass  # conexão derrubada pelo cliente ou por /__realtime/drop
+        finally:
+            self.sockets.pop(websocket, None)
+
+    async def _reply(self, websocket, topic, ref, response, status="ok"):
+        await websocket.send(json.dumps({"topic": topic, "event": "phx_reply", "ref": ref,
+                                         "payload": {"status": status, "response": response}}))
+
+    async def broadcast(self, change):
+        table = change.get("table")
+        kind = (change.get("type") or "").upper()
+        data = {
+            "schema": change.get("schema", "public"),
+            "table": table,
+            "type": kind,
+            "commit_timestamp": change.get("commit_timestamp") or _now(),
+            "record": change.get("record") or {},
+            "old_record": change.get("old_record") or {},
+            "columns": [{"name": k} for k in (change.get("record") or change.get("old_record") or {})],
+            "errors": None,
+        }
+        self.stats.add(events=1)
+        for websocket, channels in list(self.sockets.items()):
+            for topic, bindings in channels.items():
+                ids = [b["id"] for b in bindings if b["table"] == table and b["event"] in ("*", kind)]
+                if not ids:
+                    continue
+                try:
+                    await websocket.send(json.dumps({"topic": topic, "event": "postgres_changes", "ref": None,
+                                                     "payload": {"ids": ids, "data": data}}))
+                    self.stats.add(delivered=1)
+                except Exception:
+                    pass
+
+    async def replay(self, events, interval=0):
+        for change in events:
+            await self.broadcast(change)
+            if interval:
+                await asyncio.sleep(interval)
+
+    async def drop(self):
+        self.stats.add(drops=len(self.sockets))
+        for websocket in list(self.sockets):
+            await websocket.close(code=1012, reason="drop")
+
+    # -- chamadas de outras threads (rotas de controle)
+    def call(self, coroutine, timeout=60):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    hub = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload=None):
+        data = b"" if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self):
+        path = urlsplit(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        hub = self.hub
+        if path == "/__realtime/emit":
+            hub.call(hub.broadcast(body))
+            return self._send(200, {})
+        if path == "/__realtime/replay":
+            hub.call(hub.replay(body.get("events") or [], float(body.get("interval") or 0)), timeout=None)
+            return self._send(200, {"events": len(body.get("events") or [])})
+        if path == "/__realtime/drop":
+            hub.call(hub.drop())
+            return self._send(200, {})
+        if path == "/__realtime/stats":
+            return self._send(200, hub.stats.as_dict(len(hub.sockets)))
+        if path == "/__realtime/reset":
+            hub.stats.reset()
+            return self._send(200, {})
+        return self._send(404, {"message": "not found"})
+
+    do_GET = do_POST = _dispatch
+
+
+class FakeRealtime:
+    """Servidor websocket (thread com event loop) mais as rotas de controle em HTTP."""
+
+    def __init__(self, host="127.0.0.1", port=0, control_port=0):
+        self.hub = Hub()
+        started = threading.Event()
+
+        async def run():
+            self.hub.loop = asyncio.get_running_loop()
+            self._stopped = asyncio.Event()
+            async with serve(self.hub.handle, host, port) as server:
+                self.port = server.sockets[0].getsockname()[1]
+                started.set()
+                await self._stopped.wait()
+
+        self._thread = threading.Thread(target=lambda: asyncio.run(run()), name="fake-realtime", daemon=True)
+        self._thread.start()
+        if not started.wait(15):
+            raise RuntimeError("o realtime de mentira não subiu")
+        handler = type("FakeRealtimeControl", (ControlHandler,), {"hub": self.hub})
+        self.control = ThreadingHTTPServer((host, control_port), handler)
+        threading.Thread(target=self.control.serve_forever, daemon=True).start()
+        # Base para SUPABASE_REALTIME_URL (o cliente troca http por ws e acrescenta /websocket)
+        self.url = f"http://{host}:{self.port}/realtime/v1"
+        self.control_url = f"http://{host}:{self.control.server_address[1]}"
+
+    def stop(self):
+        self.control.shutdown()
+        self.hub.loop.call_soon_threadsafe(self._stopped.set)
+        self._thread.join(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--control-port", type=int, default=4001)
+    args = parser.parse_args()
+    server = FakeRealtime(args.host, args.port, args.control_port)
+    print(f"fake realtime em {server.url} (controle em {server.control_url})", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,681 @@
+"""Servidor local que imita o PostgREST e o Storage do Supabase para o benchmark.
+
+Implementa só o que o painel usa: select com projeção, filtros (eq, neq,
+gt/gte/lt/lte, like/ilike, in, is, or/and), order, limit/offset,
+``Prefer: count=exact`` (Content-Range), HEAD, insert/update/delete com
+``return=representation|minimal``, a view de leads por empreendimento,
+as tombstones de sql/002 e as tabelas de rollup de sql/006 (atualizadas
+a cada escrita, como os triggers). O Storage guarda os objetos em memória e aceita
+uploads resumíveis (TUS, ``/storage/v1/upload/resumable``).
+
+Rotas de controle (não existem no Supabase):
+    POST /__bench/seed    {"leads": N, "agendamentos": N, "usuarios": N, "empreendimentos": N, "seed": 1}
+    GET  /__bench/stats   requisições, bytes e tempo desde o último reset
+    POST /__bench/reset   zera as estatísticas
+
+Uso: ``python -m bench.fake_supabase --port 54321``
+"""
+import argparse
+import base64
+import bisect
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+from zoneinfo import ZoneInfo
+
+PRIMARY_KEYS = {
+    "mais_emp_usuarios": "id_usuario",
+    "mais_emp_empreendimentos": "id_empreendimento",
+    "mais_emp_lead": "id_lead",
+    "mais_emp_agendamento": "id_agendamento",
+    "mais_emp_exclusoes": "id",
+}
+TOMBSTONES = "mais_emp_exclusoes"
+LEADS_VIEW = "mais_emp_leads_por_empreendimento"
+# sql/006: tabela de rollup → (tabela de origem, dia da linha, grupos, contagem)
+LOCAL_TZ = ZoneInfo("America/Sao_Paulo")
+ROLLUPS = {
+    "mais_emp_rollup_leads": (
+        "mais_emp_lead",
+        lambda r: datetime.fromisoformat(r["created_at"]).astimezone(LOCAL_TZ).date().isoformat(),
+        ("id_empreendimento", "potencial"), "leads",
+    ),
+    "mais_emp_rollup_agendamentos": (
+        "mais_emp_agendamento",
+        lambda r: date.fromisoformat(str(r["data"])[:10]).isoformat() if r.get("data") else None,
+        ("tipo_evento", "status"), "agendamentos",
+    ),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.body = {"code": code, "message": message, "details": None, "hint": None}
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+# ---------------- Dados ----------------
+class Table:
+    """Linhas ordenadas pela chave (inteira, crescente como um bigserial)."""
+
+    def __init__(self, pk):
+        self.pk = pk
+        self.rows = []
+        self.keys = []
+        self.next_id = 1
+
+    def insert(self, row):
+        row = dict(row)
+        if row.get(self.pk) is None:
+            row[self.pk] = self.next_id
+        self.next_id = max(self.next_id, int(row[self.pk]) + 1)
+        stamp = _now()
+        row.setdefault("created_at", stamp)
+        row["updated_at"] = stamp
+        if self.keys and row[self.pk] <= self.keys[-1]:
+            pos = bisect.bisect_left(self.keys, row[self.pk])
+            if pos < len(self.keys) and self.keys[pos] == row[self.pk]:
+                raise ApiError(409, "23505", f"duplicate key value violates unique constraint on {self.pk}")
+            self.keys.insert(pos, row[self.pk])
+            self.rows.insert(pos, row)
+        else:
+            self.keys.append(row[self.pk])
+            self.rows.append(row)
+        return row
+
+    def remove(self, doomed):
+        ids = {id(r) for r in doomed}
+        self.rows = [r for r in self.rows if id(r) not in ids]
+        self.keys = [r[self.pk] for r in self.rows]
+
+
+class Database:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.tables = {name: Table(pk) for name, pk in PRIMARY_KEYS.items()}
+        self.objects = {}
+        self.object_times = {}  # criação de cada objeto (list devolve created_at)
+        self.uploads = {}  # uploads TUS em andamento
+        self.rollups = {name: {} for name in ROLLUPS}  # tabela → chave → linha
+
+    def rows_of(self, name):
+        if name == LEADS_VIEW:
+            return self._leads_view()
+        if name in self.rollups:
+            return list(self.rollups[name].values())
+        if name not in self.tables:
+            raise ApiError(404, "42P01", f'relation "public.{name}" does not exist')
+        return self.tables[name].rows
+
+    def _leads_view(self):
+        emps = {r["id_empreendimento"]: r.get("nome") for r in self.tables["mais_emp_empreendimentos"].rows}
+        totals = {}
+        for lead in self.tables["mais_emp_lead"].rows:
+            emp = lead.get("id_empreendimento")
+            emp = emp if emp in emps else None
+            totals[emp] = totals.get(emp, 0) + 1
+        return [
+            {"id_empreendimento": emp, "empreendimento": emps.get(emp) or "Sem vínculo", "leads": n}
+            for emp, n in totals.items()
+        ]
+
+    def roll(self, table, added=(), removed=()):
+        """Soma as linhas inseridas e subtrai as apagadas nos rollups de ``table`` (os triggers de sql/006)."""
+        for name, (source, day_of, dims, measure) in ROLLUPS.items():
+            if source != table:
+                continue
+            totals = {}
+            for rows, sign in ((added, 1), (removed, -1)):
+                for row in rows:
+                    day = day_of(row)
+                    if day is not None:
+                        group = (day, *(row.get(d) for d in dims))
+                        totals[group] = totals.get(group, 0) + sign
+            stamp = _now()
+            for group, n in totals.items():
+                if not n:
+                    continue  # update que não mudou dia nem grupo
+                key = "|".join("" if v is None else str(v) for v in group)
+                entry = self.rollups[name].get(key)
+                if entry is None:
+                    entry = self.rollups[name][key] = {"chave": key, "dia": group[0], **dict(zip(dims, group[1:])),
+                                                       measure: 0}
+                entry[measure] += n
+                entry["updated_at"] = stamp
+
+    def rebuild_rollups(self):
+        self.rollups = {name: {} for name in ROLLUPS}
+        for source in {spec[0] for spec in ROLLUPS.values()}:
+            self.roll(source, added=self.tables[source].rows)
+        for entries in self.rollups.values():
+            for entry in entries.values():
+                entry["updated_at"] = "2025-06-30T00:00:00+00:00"
+
+    def tombstone(self, table, rows):
+        if table in (TOMBSTONES,) or table not in PRIMARY_KEYS:
+            return
+        pk = PRIMARY_KEYS[table]
+        for row in rows:
+            self.tables[TOMBSTONES].insert({"tabela": table, "id_registro": str(row[pk]), "excluido_em": _now()})
+
+
+# ---------------- Carga sintética ----------------
+FIRST = ["Ana", "Bruno", "Carla", "Diego", "Elaine", "Fábio", "Gabriela", "Heitor", "Íris", "João", "Lívia", "Marcos"]
+LAST = ["Silva", "Souza", "Oliveira", "Santos", "Pereira", "Lima", "Carvalho", "Gomes", "Ribeiro", "Araújo"]
+CIDADES = ["Goiânia", "Anápolis", "Aparecida de Goiânia", "Brasília", "Rio Verde"]
+
+
+def seed(db, leads=10_000, agendamentos=None, usuarios=None, empreendimentos=50, seed=1):
+    """Recria as tabelas com dados sintéticos determinísticos (mesmo ``seed``, mesmos dados)."""
+    rnd = random.Random(seed)
+    agendamentos = leads // 2 if agendamentos is None else agendamentos
+    usuarios = max(20, leads // 100) if usuarios is None else usuarios
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    span = int((datetime(2025, 6, 30, tzinfo=timezone.utc) - start).total_seconds())
+
+    def stamp():
+        return (start + timedelta(seconds=rnd.randrange(span))).isoformat()
+
+    def person():
+        return f"{rnd.choice(FIRST)} {rnd.choice(LAST)} {rnd.randrange(1000)}"
+
+    with db.lock:
+        db.tables = {name: Table(pk) for name, pk in PRIMARY_KEYS.items()}
+        db.objects = {}
+        db.object_times = {}
+        db.uploads = {}
+        t = db.tables["mais_emp_usuarios"]
+        for i in range(usuarios):
+            created = stamp()
+            t.insert({"nome": person(), "telefone": f"(62) 9{rnd.randrange(10**8):08d}",
+                      "email": f"usuario{i}@exemplo.com", "created_at": created})
+        t = db.tables["mais_emp_empreendimentos"]
+        for i in range(empreendimentos):
+            t.insert({"nome": f"Residencial {i + 1}", "localizacao": rnd.choice(CIDADES),
+                      "tipo": rnd.choice(["Apartamento", "Casa", "Lote"]), "link_pdf": None,
+                      "link_tour_360_computador": f"https://tour.exemplo.com/{i}",
+                      "link_tour_360_mobile": None, "created_at": stamp()})
+        t = db.tables["mais_emp_lead"]
+        for _ in range(leads):
+            t.insert({
+                "nome": person(), "id_usuario": None,
+                "id_empreendimento": rnd.randrange(1, empreendimentos + 1) if empreendimentos and rnd.random() > 0.1 else None,
+                "objetivo": rnd.choice(["Moradia", "Investimento"]),
+                "forma_pagamento": rnd.choice(["À vista", "Financiamento"]),
+                "renda_familiar": round(rnd.uniform(2000, 40000), 2) if rnd.random() > 0.2 else None,
+                "potencial": rnd.choice(["Alto", "Médio", "Baixo"]),
+                "interesse_empreendimento": None, "created_at": stamp(),
+            })
+        t = db.tables["mais_emp_agendamento"]
+        today = datetime(2025, 6, 30).date()
+        for _ in range(agendamentos):
+            uid = rnd.randrange(1, usuarios + 1) if usuarios else None
+            t.insert({
+                "id_usuario": uid, "cliente_id": uid,
+                "tipo_evento": rnd.choice(["Reunião", "Visita"]),
+                "data": (today + timedelta(days=rnd.randrange(-180, 90))).isoformat(),
+                "horario": f"{rnd.randrange(8, 19):02d}:{rnd.choice(['00', '30'])}:00",
+                "status": rnd.choice(["agendado", "realizada"]),
+                "negociacao": None, "created_at": stamp(),
+            })
+        # Carga inicial não conta como alteração recente
+        for table in db.tables.values():
+            for row in table.rows:
+                row["updated_at"] = row["created_at"]
+        db.rebuild_rollups()
+    return {name: len(t.rows) for name, t in db.tables.items()}
+
+
+# ---------------- Filtros do PostgREST ----------------
+def _split(text):
+    # Divide por vírgulas de nível zero (fora de parênteses e aspas)
+    parts, depth, quoted, escaped, cur = [], 0, False, False, []
+    for ch in text:
+        if escaped:
+            cur.append(ch)
+            escaped = False
+            continue
+        if ch == "\\":
+            cur.append(ch)
+            escaped = True
+            continue
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append("".join(cur))
+            cur = []
+            continue
+        cur.append(ch)
+    if cur:
+        parts.append("".join(cur))
+    return parts
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def _like(pattern, flags):
+    out, escaped = [], False
+    for ch in pattern:
+        if escaped:
+            out.append(re.escape(ch))
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch in "*%":
+            out.append(".*")
+        elif ch == "_":
+            out.append(".")
+        else:
+            out.append(re.escape(ch))
+    return re.compile("".join(out), flags | re.DOTALL)
+
+
+def _coerce(raw, sample):
+    if isinstance(sample, bool):
+        return raw.lower() == "true"
+    if isinstance(sample, int):
+        try:
+            return int(raw)
+        except ValueError:
+            return float(raw)
+    if isinstance(sample, float):
+        return float(raw)
+    return raw
+
+
+def _predicate(column, op):
+    negate = False
+    if op.startswith("not."):
+        negate, op = True, op[4:]
+    name, _, value = op.partition(".")
+    if name in ("eq", "neq", "gt", "gte", "lt", "lte"):
+        value = _unquote(value)
+        cmp = {
+            "eq": lambda a, b: a == b, "neq": lambda a, b: a != b,
+            "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+            "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b,
+        }[name]
+
+        def test(row):
+            v = row.get(column)
+            return v is not None and cmp(v, _coerce(value, v))
+    elif name in ("like", "ilike"):
+        regex = _like(_unquote(value), re.IGNORECASE if name == "ilike" else 0)
+
+        def test(row):
+            v = row.get(column)
+            return v is not None and regex.fullmatch(str(v)) is not None
+    elif name == "in":
+        values = [_unquote(v) for v in _split(value.strip()[1:-1])]
+
+        def test(row):
+            v = row.get(column)
+            return v is not None and any(v == _coerce(x, v) for x in values)
+    elif name == "is":
+        target = {"null": None, "true": True, "false": False}[value.lower()]
+
+        def test(row):
+            return row.get(column) is target
+    else:
+        raise ApiError(400, "PGRST100", f"operador não suportado: {name}")
+    return (lambda row: not test(row)) if negate else test
+
+
+def _group(kind, body, negate=False):
+    tests = [_condition(part) for part in _split(body[1:-1])]
+    combine = any if kind == "or" else all
+
+    def test(row):
+        return combine(t(row) for t in tests)
+    return (lambda row: not test(row)) if negate else test
+
+
+def _condition(text):
+    # Item de or=(...)/and=(...): "col.op.valor", "and(...)", "not.or(...)"
+    negate = text.startswith("not.")
+    body = text[4:] if negate else text
+    for kind in ("and", "or"):
+        if body.startswith(kind + "("):
+            return _group(kind, body[len(kind):], negate)
+    column, _, op = text.partition(".")
+    return _predicate(column, op)
+
+
+RESERVED = {"select", "order", "limit", "offset", "columns", "on_conflict"}
+
+
+def parse_filters(params):
+    tests, pk_bounds = [], []
+    for key, value in params:
+        if key in RESERVED:
+            continue
+        if key in ("or", "and", "not.or", "not.and"):
+            kind = key.split(".")[-1]
+            tests.append(_group(kind, value, negate=key.startswith("not.")))
+        else:
+            tests.append(_predicate(key, value))
+            pk_bounds.append((key, value))
+    return tests, pk_bounds
+
+
+def _sort(rows, order, pk):
+    if not order:
+        return rows
+    rows = list(rows)
+    for item in reversed(order.split(",")):
+        parts = item.split(".")
+        column = parts[0]
+        desc = len(parts) > 1 and parts[1] == "desc"
+        nulls_first = "nullsfirst" in parts[2:] or (desc and "nullslast" not in parts[2:])
+        values = [r for r in rows if r.get(column) is not None]
+        nulls = [r for r in rows if r.get(column) is None]
+        values.sort(key=lambda r: r[column], reverse=desc)
+        rows = nulls + values if nulls_first else values + nulls
+    return rows
+
+
+def _project(rows, select):
+    if not select or select.strip() == "*":
+        return rows
+    cols = [c.strip() for c in select.split(",") if c.strip()]
+    return [{c: r.get(c) for c in cols} for r in rows]
+
+
+# ---------------- HTTP ----------------
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.server_ms = 0.0
+            self.by_table = {}
+
+    def record(self, method, table, bytes_in, bytes_out, ms):
+        with self.lock:
+            self.requests += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.server_ms += ms
+            entry = self.by_table.setdefault(f"{method} {table}", {"requests": 0, "bytes_out": 0})
+            entry["requests"] += 1
+            entry["bytes_out"] += bytes_out
+
+    def as_dict(self):
+        with self.lock:
+            return {"requests": self.requests, "bytes_in": self.bytes_in, "bytes_out": self.bytes_out,
+                    "server_ms": round(self.server_ms, 3), "by_table": self.by_table}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    db = None
+    stats = None
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, payload=None, headers=None, raw=None, content_type="application/json"):
+        data = raw if raw is not None else (b"" if payload is None else json.dumps(payload).encode())
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+        return len(data) if self.command != "HEAD" else 0
+
+    def _dispatch(self):
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        body = self._body()
+        table = "-"
+        try:
+            if url.path.startswith("/__bench/"):
+                sent = self._control(url.path, body)
+            elif url.path.startswith("/rest/v1/"):
+                table = unquote(url.path[len("/rest/v1/"):])
+                sent = self._rest(table, parse_qsl(url.query, keep_blank_values=True), body)
+            elif url.path.startswith("/storage/v1/"):
+                table = "storage"
+                sent = self._storage(unquote(url.path[len("/storage/v1/"):]), body)
+            else:
+                sent = self._send(404, {"message": "not found"})
+        except ApiError as e:
+            sent = self._send(e.status, e.body)
+        except Exception as e:  # erro do próprio stand-in: responde em vez de derrubar a conexão
+            sent = self._send(500, {"code": "XX000", "message": repr(e), "details": None, "hint": None})
+        if not url.path.startswith("/__bench/"):
+            self.stats.record(self.command, table, len(body), sent, (time.perf_counter() - started) * 1000)
+
+    do_GET = do_HEAD = do_POST = do_PATCH = do_DELETE = do_PUT = _dispatch
+
+    # -- controle
+    def _control(self, path, body):
+        if path == "/__bench/seed":
+            sizes = json.loads(body or b"{}")
+            counts = seed(self.db, **sizes)
+            self.stats.reset()
+            return self._send(200, counts)
+        if path == "/__bench/stats":
+            return self._send(200, self.stats.as_dict())
+        if path == "/__bench/reset":
+            self.stats.reset()
+            return self._send(200, {})
+        return self._send(404, {"message": "not found"})
+
+    # -- PostgREST
+    def _prefer(self):
+        return {p.strip() for p in (self.headers.get("Prefer") or "").split(",") if p.strip()}
+
+    def _match(self, table, params):
+        tests, bounds = parse_filters(params)
+        db = self.db
+        rows = db.rows_of(table)
+        t = db.tables.get(table)
+        # Atalho: filtros só na chave (keyset) viram busca binária
+        if t is not None and bounds and len(bounds) == len(tests) and all(k == t.pk for k, _ in bounds):
+            lo, hi = 0, len(rows)
+            for _, op in bounds:
+                name, _, raw = op.partition(".")
+                if name == "gt":
+                    lo = max(lo, bisect.bisect_right(t.keys, int(raw)))
+                elif name == "gte":
+                    lo = max(lo, bisect.bisect_left(t.keys, int(raw)))
+                elif name == "lt":
+                    hi = min(hi, bisect.bisect_left(t.keys, int(raw)))
+                elif name == "lte":
+                    hi = min(hi, bisect.bisect_right(t.keys, int(raw)))
+                else:
+                    return [r for r in rows if all(test(r) for test in tests)]
+            return rows[lo:hi]
+        if not tests:
+            return rows
+        return [r for r in rows if all(test(r) for test in tests)]
+
+    def _rest(self, table, params, body):
+        p = dict(params)
+        prefer = self._prefer()
+        with self.db.lock:
+            if self.command in ("GET", "HEAD"):
+                rows = self._match(table, params)
+                pk = PRIMARY_KEYS.get(table)
+                order = p.get("order")
+                if order and not (pk and order in (pk, f"{pk}.asc")):
+                    rows = _sort(rows, order, pk)
+                total = len(rows)
+                offset = int(p.get("offset") or 0)
+                limit = p.get("limit")
+                end = total if limit is None else min(total, offset + int(limit))
+                page = _project(rows[offset:end], p.get("select"))
+                headers = {}
+                if "count=exact" in prefer:
+                    span = f"{offset}-{end - 1}" if end > offset else "*"
+                    headers["Content-Range"] = f"{span}/{total}"
+                return self._send(200, page, headers)
+
+            if table not in self.db.tables:
+                raise ApiError(405, "PGRST205", f"{table} não aceita escrita")
+
+            if self.command == "POST":
+                data = json.loads(body or b"[]")
+                rows = [self.db.tables[table].insert(r) for r in (data if isinstance(data, list) else [data])]
+                self.db.roll(table, added=rows)
+                return self._rows_reply(201, rows, prefer, p)
+
+            if self.command == "PATCH":
+                changes = json.loads(body or b"{}")
+                rows = self._match(table, params)
+                before = [dict(row) for row in rows]
+                for row in rows:
+                    row.update(changes)
+                    row["updated_at"] = _now()
+                self.db.roll(table, added=rows, removed=before)
+                return self._rows_reply(200, rows, prefer, p)
+
+            if self.command == "DELETE":
+                rows = list(self._match(table, params))
+                self.db.tables[table].remove(rows)
+                self.db.tombstone(table, rows)
+                self.db.roll(table, removed=rows)
+                return self._rows_reply(200, rows, prefer, p)
+        raise ApiError(405, "PGRST000", "método não suportado")
+
+    def _rows_reply(self, status, rows, prefer, params):
+        if "return=representation" in prefer:
+            return self._send(status, _project(rows, params.get("select")))
+        return self._send(204 if status == 200 else status)
+
+    # -- Storage
+    def _storage(self, path, body):
+        objects = self.db.objects
+        if path.startswith("upload/resumable"):
+            return self._resumable(path[len("upload/resumable"):].strip("/"), body)
+        if path.startswith("object/public/"):
+            key = path[len("object/public/"):]
+            if key not in objects:
+                raise ApiError(404, "not_found", "Object not found")
+            return self._send(200, raw=objects[key], content_type="application/octet-stream")
+        if path.startswith("object/list/"):
+            bucket = path[len("object/list/"):]
+            options = json.loads(body or b"{}")
+            prefix = (options.get("prefix") or "").strip("/")
+            base = f"{bucket}/{prefix}/" if prefix else f"{bucket}/"
+            entries = {}
+            for k, v in objects.items():
+                if not k.startswith(base):
+                    continue
+                name = k[len(base):]
+                if "/" in name:  # subpasta: aparece uma vez, sem id (como no Supabase)
+                    folder = name.split("/", 1)[0]
+                    entries[folder] = {"name": folder, "id": None, "metadata": None}
+                else:
+                    stamp = self.db.object_times.get(k)
+                    entries[name] = {"name": name, "id": k, "created_at": stamp, "updated_at": stamp,
+                                     "metadata": {"size": len(v)}}
+            items = [entries[n] for n in sorted(entries)]
+            offset = int(options.get("offset") or 0)
+            return self._send(200, items[offset:offset + int(options.get("limit") or 100)])
+        if path.startswith("object/"):
+            key = path[len("object/"):]
+            if self.command in ("POST", "PUT"):
+                if key in objects and self.command == "POST" and (self.headers.get("x-upsert") or "").lower() != "true":
+                    raise ApiError(400, "Duplicate", "The resource already exists")
+                objects[key] = body
+                self.db.object_times[key] = _now()
+                return self._send(200, {"Key": key})
+            if self.command == "DELETE":
+                bucket = key
+                removed = [p for p in json.loads(body or b"{}").get("prefixes", []) if objects.pop(f"{bucket}/{p}", None) is not None]
+                for p in removed:
+                    self.db.object_times.pop(f"{bucket}/{p}", None)
+                return self._send(200, [{"name": p} for p in removed])
+            if self.command in ("GET", "HEAD"):
+                if key not in objects:
+                    raise ApiError(404, "not_found", "Object not found")
+                return self._send(200, raw=objects[key], content_type="application/octet-stream")
+        raise ApiError(404, "not_found", "rota de storage não suportada")
+
+    def _resumable(self, upload_id, body):
+        # Protocolo TUS 1.0: POST cria, HEAD diz o offset, PATCH acrescenta a partir dele
+        tus = {"Tus-Resumable": "1.0.0"}
+        if self.command == "POST" and not upload_id:
+            meta = {}
+            for item in (self.headers.get("Upload-Metadata") or "").split(","):
+                if item.strip():
+                    k, _, v = item.strip().partition(" ")
+                    meta[k] = base64.b64decode(v).decode()
+            key = f"{meta['bucketName']}/{meta['objectName']}"
+            if key in self.db.objects and (self.headers.get("x-upsert") or "").lower() != "true":
+                raise ApiError(409, "Duplicate", "The resource already exists")
+            upload_id = uuid.uuid4().hex
+            self.db.uploads[upload_id] = {"key": key, "length": int(self.headers["Upload-Length"]), "data": bytearray()}
+            location = f"http://{self.headers.get('Host')}/storage/v1/upload/resumable/{upload_id}"
+            return self._send(201, headers={**tus, "Location": location})
+        upload = self.db.uploads.get(upload_id)
+        if upload is None:
+            raise ApiError(404, "not_found", "Upload not found")
+        if self.command == "HEAD":
+            return self._send(200, headers={**tus, "Upload-Offset": str(len(upload["data"])),
+                                            "Upload-Length": str(upload["length"]), "Cache-Control": "no-store"})
+        if self.command == "PATCH":
+            if int(self.headers.get("Upload-Offset", -1)) != len(upload["data"]):
+                raise ApiError(409, "Conflict", "Upload-Offset diverge do servidor")
+            upload["data"] += body
+            if len(upload["data"]) >= upload["length"]:
+                self.db.objects[upload["key"]] = bytes(upload["data"])
+                self.db.object_times[upload["key"]] = _now()
+                del self.db.uploads[upload_id]
+            return self._send(204, headers={**tus, "Upload-Offset": str(len(upload["data"]))})
+        raise ApiError(405, "method_not_allowed", "método não suportado no upload resumível")
+
+
+def make_server(host="127.0.0.1", port=0):
+    handler = type("BenchHandler", (Handler,), {"db": Database(), "stats": Stats()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    args = parser.parse_args()
+    server = make_server(args.host, args.port)
+    print(f"fake supabase em http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Sincronização com o Google Agenda contra servidores de mentira.
+
+Sobe o PostgREST de mentira (bench/fake_supabase.py) e a API do Google
+Agenda de mentira (bench/fake_gcal.py), popula os agendamentos e roda
+rodadas de sincronização em sequência: carga inicial, rodada sem
+mudanças, edições e exclusões de cada lado, syncToken expirado e cota
+estourada. Cada rodada mostra requisições, itens enviados e tempo, e
+confere se os dois lados terminaram iguais.
+
+    python -m bench.gcal_sync --agendamentos 2000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import date
+
+from bench.run import FakeServer, _configure_env
+
+CALENDAR = "agenda-bench@exemplo.com"
+SEED_DAY = date(2025, 6, 30)  # âncora dos dados de bench/fake_supabase.py
+
+
+class FakeCalendar:
+    def __init__(self, rate=0):
+        from bench.fake_gcal import make_server
+
+        self.server = make_server(rate=rate)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _call(self, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode()
+        req = urllib.request.Request(self.url + path, data=data, method="GET" if data is None else "POST")
+        with urllib.request.urlopen(req, timeout=60) as res:
+            return json.loads(res.read())
+
+    def stats(self):
+        return self._call("/__gcal/stats")
+
+    def reset_stats(self):
+        self.server.RequestHandlerClass.stats.reset()
+
+    def events(self):
+        return [e for e in self._call("/__gcal/events").get(CALENDAR, []) if e["status"] != "cancelled"]
+
+    def edit(self, eid, patch):
+        return self._call("/__gcal/edit", {"calendar": CALENDAR, "id": eid, "patch": patch})
+
+    def delete(self, eid):
+        return self._call("/__gcal/delete", {"calendar": CALENDAR, "id": eid})
+
+    def control(self, path, payload=None):
+        return self._call(path, payload or {})
+
+    def stop(self):
+        self.server.shutdown()
+
+
+def _configure_calendar(url, workdir, rate):
+    os.environ.update({
+        "GCAL_CALENDAR_ID": CALENDAR,
+        "GCAL_API_URL": f"{url}/calendar/v3",
+        "GCAL_BATCH_URL": f"{url}/batch/calendar/v3",
+        "GCAL_TOKEN_URL": f"{url}/token",
+        "GCAL_CLIENT_ID": "bench", "GCAL_CLIENT_SECRET": "bench", "GCAL_REFRESH_TOKEN": "bench",
+        "GCAL_STATE_DB": os.path.join(workdir, "gcal.sqlite"),
+        "GCAL_RATE": str(rate),
+        # Os dados de bench/fake_supabase.py terminam em SEED_DAY; envia todos
+        "GCAL_DAYS_BACK": str((date.today() - SEED_DAY).days + 200),
+    })
+
+
+def _consistent(calendar):
+    # Cada agendamento dentro da janela tem um evento com a mesma data/hora
+    from utils import google_calendar as gc
+
+    frame = gc.load_table(gc.TABLE, columns=gc.FIELDS)
+    events = {e["id"]: e for e in calendar.events()}
+    mismatched = 0
+    for row in gc.to_records(frame):
+        event = events.pop(gc.event_id(row[gc.PK]), None)
+        if event is None or gc.from_event(event)["data"] != row["data"] or gc.from_event(event)["horario"] != row["horario"]:
+            mismatched += 1
+    return mismatched + len(events)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agendamentos", type=int, default=2000)
+    parser.add_argument("--edits", type=int, default=20, help="alterações de cada lado por rodada")
+    parser.add_argument("--rate", type=float, default=500, help="GCAL_RATE do cliente (req/s)")
+    parser.add_argument("--quota", type=int, default=60, help="limite do servidor no cenário de cota (itens/s)")
+    args = parser.parse_args(argv)
+
+    server = FakeServer()
+    calendar = FakeCalendar()
+    workdir = tempfile.mkdtemp(prefix="mais-emp-gcal-")
+    _configure_env(server.url, workdir)
+    _configure_calendar(calendar.url, workdir, args.rate)
+    try:
+        server.seed(leads=args.agendamentos * 2, agendamentos=args.agendamentos)
+        from utils import google_calendar as gc
+        from utils.supabase_client import delete_data, update_data
+
+        sync = gc.CalendarSync()
+        ids = gc.load_table(gc.TABLE, columns=[gc.PK])[gc.PK].tolist()
+
+        def local_edits():
+            for key in ids[:args.edits]:
+                update_data(gc.TABLE, gc.PK, key, {"negociacao": f"editado {time.time()}"})
+
+        def remote_edits():
+            for key in ids[args.edits:2 * args.edits]:
+                calendar.edit(gc.event_id(key), {"start": {"dateTime": "2025-07-01T15:00:00-03:00"},
+                                                 "end": {"dateTime": "2025-07-01T16:00:00-03:00"}})
+
+        def deletes():
+            delete_data(gc.TABLE, gc.PK, ids[-1])
+            calendar.delete(gc.event_id(ids[-2]))
+
+        def quota():
+            calendar.control("/__gcal/quota", {"rate": args.quota})
+            for key in ids[:args.agendamentos // 4]:
+                update_data(gc.TABLE, gc.PK, key, {"status": "realizada"})
+
+        rounds = [
+            ("inicial", None),
+            ("sem mudanças", None),
+            (f"{args.edits} edições locais", local_edits),
+            (f"{args.edits} edições no Google", remote_edits),
+            ("exclusões (1 + 1)", deletes),
+            ("syncToken expirado", lambda: calendar.control("/__gcal/expire")),
+            (f"cota de {args.quota}/s", quota),
+        ]
+        for name, prepare in rounds:
+            if prepare:
+                prepare()
+            calendar.reset_stats()
+            result = sync.run_once()
+            stats = calendar.stats()
+            ops = ", ".join(f"{k} {v}" for k, v in sorted(stats["by_operation"].items()))
+            print(f"{name:24s} {result['seconds']:7.2f}s {stats['requests']:4d} req "
+                  f"({stats['batches']} lotes; {ops or '-'}; 429: {stats['rate_limited']}) "
+                  f"pull {result.get('pull')} push {result.get('push')}"
+                  + (f" ERRO: {result['error']}" if result.get("error") else ""), flush=True)
+        print(f"divergências: {_consistent(calendar)}")
+    finally:
+        calendar.stop()
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if os.path.dirname(os.path.dirname(os.path.abspath(__file__))) not in sys.path:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
@@ -0,0 +1,92 @@
+"""Custo de import de cada página (processo novo por página).
+
+Lê os imports de topo de cada arquivo com ``ast`` e os executa num
+interpretador limpo, depois do streamlit (que já está carregado quando o
+servidor roda a página). Mostra o tempo total e os módulos mais caros
+segundo ``python -X importtime``.
+
+    python -m bench.imports
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["app.py", *sorted(os.path.join("pages", p) for p in os.listdir(os.path.join(ROOT, "pages")) if p.endswith(".py"))]
+
+_PROBE = """
+import json, sys, time
+import streamlit
+t = time.perf_counter()
+{imports}
+print(json.dumps({{"seconds": time.perf_counter() - t}}), file=sys.stdout)
+"""
+
+
+def _top_imports(path):
+    tree = ast.parse(open(os.path.join(ROOT, path), encoding="utf-8").read())
+    lines = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            lines.append(ast.unparse(node))
+    return lines
+
+
+def _heaviest(stderr, top):
+    # Linhas "import time: self | cumulative | pacote"; submódulos vêm indentados
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum_us, name = line[len("import time:"):].split("|")
+        if name.startswith("  "):
+            continue
+        rows.append((int(cum_us), name.strip()))
+    rows.sort(reverse=True)
+    return [{"module": name, "ms": round(us / 1000, 1)} for us, name in rows[:top]]
+
+
+def measure(pages=PAGES, top=5):
+    """{página: {"seconds": s, "heaviest": [...]}} medido em processos novos."""
+    env = {**os.environ, "SUPABASE_URL": os.environ.get("SUPABASE_URL", "http://127.0.0.1:1"),
+           "SUPABASE_KEY": os.environ.get("SUPABASE_KEY", "bench-anon-key")}
+    results = {}
+    # streamlit já vem importado no probe; fica de fora do ranking
+    baseline = subprocess.run([sys.executable, "-X", "importtime", "-c", "import json, sys, time, streamlit"],
+                              cwd=ROOT, env=env, capture_output=True, text=True)
+    preloaded = {m["module"] for m in _heaviest(baseline.stderr, 10_000)}
+    for page in pages:
+        code = _PROBE.format(imports="\n".join(_top_imports(page)))
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                              cwd=ROOT, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            results[page] = {"error": proc.stderr.strip().splitlines()[-1]}
+            continue
+        heaviest = [m for m in _heaviest(proc.stderr, 10_000) if m["module"] not in preloaded][:top]
+        results[page] = {"seconds": round(json.loads(proc.stdout.strip().splitlines()[-1])["seconds"], 4),
+                         "heaviest": heaviest}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    args = parser.parse_args(argv)
+    results = measure(top=args.top)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    for page, res in results.items():
+        if "error" in res:
+            print(f"{page:28s} ERRO: {res['error']}")
+            continue
+        heavy = ", ".join(f"{m['module']} {m['ms']:.0f}ms" for m in res["heaviest"])
+        print(f"{page:28s} {res['seconds'] * 1000:8.0f} ms  ({heavy})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Feed realtime contra servidores de mentira.
+
+Sobe o PostgREST de mentira (bench/fake_supabase.py) e o Realtime de
+mentira (bench/fake_realtime.py), carrega o snapshot dos leads e liga o
+feed de utils/live.py. Cada rodada grava direto no servidor (como outro
+processo faria) e repete os eventos postgres_changes correspondentes:
+inserções, edições e exclusões, ecos das escritas deste processo e uma
+queda da conexão com escritas no meio. Mostra o atraso até o snapshot
+refletir os eventos, as leituras feitas ao Supabase e se o snapshot
+terminou igual ao servidor.
+
+    python -m bench.realtime_replay --leads 20000 --events 500
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+
+from bench.run import FakeServer, _configure_env
+
+TABLE = "mais_emp_lead"
+PK = "id_lead"
+
+
+class FakeFeed:
+    def __init__(self):
+        from bench.fake_realtime import FakeRealtime
+
+        self.server = FakeRealtime()
+        self.url = self.server.url
+
+    def _call(self, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode()
+        req = urllib.request.Request(self.server.control_url + path, data=data, method="GET" if data is None else "POST")
+        with urllib.request.urlopen(req, timeout=120) as res:
+            return json.loads(res.read())
+
+    def replay(self, events):
+        return self._call("/__realtime/replay", {"events": events})
+
+    def drop(self):
+        return self._call("/__realtime/drop", {})
+
+    def stats(self):
+        return self._call("/__realtime/stats")
+
+    def stop(self):
+        self.server.stop()
+
+
+def _rest(server, method, query, payload=None):
+    # Escrita "de outro processo": direto no servidor, sem passar pelo cliente do painel
+    data = None if payload is None else json.dumps(payload).encode()
+    req = urllib.request.Request(f"{server.url}/rest/v1/{TABLE}{query}", data=data, method=method, headers={
+        "Content-Type": "application/json", "Prefer": "return=representation", "apikey": "bench-anon-key",
+    })
+    with urllib.request.urlopen(req, timeout=120) as res:
+        return json.loads(res.read() or b"[]")
+
+
+def _reads(stats):
+    return sum(v["requests"] for k, v in stats["by_table"].items() if k.startswith(("GET", "HEAD")))
+
+
+def _wait(predicate, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _divergences(server, snap):
+    rows = _rest(server, "GET", f"?select={PK},updated_at")
+    remote = {str(r[PK]): r["updated_at"] for r in rows}
+    import pandas as pd
+
+    frame, _ = snap.current()
+    local = dict(zip(frame[PK].astype(str), frame["updated_at"]))
+    diff = set(remote) ^ set(local)
+    diff |= {k for k in set(remote) & set(local) if pd.Timestamp(remote[k]) != local[k]}
+    return len(diff)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--leads", type=int, default=20000)
+    parser.add_argument("--events", type=int, default=500, help="eventos por rodada")
+    args = parser.parse_args(argv)
+
+    server = FakeServer()
+    feed_server = FakeFeed()
+    workdir = tempfile.mkdtemp(prefix="mais-emp-realtime-")
+    _configure_env(server.url, workdir)
+    os.environ.update({
+        "REALTIME_ENABLED": "1",
+        "SUPABASE_REALTIME_URL": feed_server.url,
+        # Com o feed conectado o delta só roda depois de uma queda
+        "SNAPSHOT_LIVE_SYNC_INTERVAL": "3600",
+    })
+    try:
+        server.seed(leads=args.leads, agendamentos=0)
+        from utils.live import start_change_feed
+        from utils.snapshot import get_snapshot, load_table
+        from utils.supabase_client import update_data
+
+        load_table(TABLE)
+        snap = get_snapshot(TABLE)
+        feed = start_change_feed()
+        if not feed.connected.wait(15):
+            raise RuntimeError("o feed não conectou no realtime de mentira")
+        n = args.events
+        created = []
+
+        def inserts():
+            rows = _rest(server, "POST", "", [{"nome": f"remoto {i}", "potencial": "Alto"} for i in range(n)])
+            created.extend(rows)
+            return [{"table": TABLE, "type": "INSERT", "record": r} for r in rows]
+
+        def edits():
+            events = []
+            for row in created[:n // 2]:
+                new = _rest(server, "PATCH", f"?{PK}=eq.{row[PK]}", {"potencial": "Baixo"})[0]
+                events.append({"table": TABLE, "type": "UPDATE", "record": new, "old_record": {PK: row[PK]}})
+            return events
+
+        def deletes():
+            doomed = created[n // 2:]
+            _rest(server, "DELETE", f"?{PK}=in.({','.join(str(r[PK]) for r in doomed)})")
+            return [{"table": TABLE, "type": "DELETE", "record": {}, "old_record": {PK: r[PK]}} for r in doomed]
+
+        def echoes():
+            # Escritas deste processo: o servidor devolve o mesmo evento depois
+            rows = [update_data(TABLE, PK, r[PK], {"nome": f"eco {r[PK]}"})[0] for r in created[:n // 4]]
+            return [{"table": TABLE, "type": "UPDATE", "record": r, "old_record": {PK: r[PK]}} for r in rows]
+
+        rounds = [
+            (f"{n} inserções", inserts),
+            (f"{n // 2} edições", edits),
+            (f"{n - n // 2} exclusões", deletes),
+            (f"{n // 4} ecos locais", echoes),
+        ]
+        for name, prepare in rounds:
+            events = prepare()
+            version = snap.version
+            server.reset()
+            started = time.perf_counter()
+            feed_server.replay(events)
+            last = events[-1]
+            timeout = 30 + len(events) * 0.2
+            if last["type"] == "DELETE":
+                done = _wait(lambda: snap.contains_change("DELETE", None, last["old_record"]), timeout)
+            else:
+                done = _wait(lambda: snap.contains_change(last["type"], last["record"]), timeout)
+            elapsed = time.perf_counter() - started
+            print(f"{name:24s} {elapsed:7.3f}s {len(events):5d} eventos  leituras {_reads(server.stats()):3d}  "
+                  f"versões do snapshot +{snap.version - version}" + ("" if done else "  NÃO APLICADO"), flush=True)
+
+        # Queda: escritas durante a desconexão não geram eventos; a reconexão força um delta
+        feed_server.drop()
+        _wait(lambda: not feed.connected.is_set(), timeout=5)
+        _rest(server, "PATCH", f"?{PK}=lte.{n}", {"potencial": "Médio"})
+        if not feed.connected.wait(30):
+            raise RuntimeError("o feed não reconectou")
+        server.reset()
+        started = time.perf_counter()
+        load_table(TABLE)
+        print(f"{'queda e reconexão':24s} {time.perf_counter() - started:7.3f}s   delta    leituras "
+              f"{_reads(server.stats()):3d}", flush=True)
+        print(f"realtime: {feed_server.stats()}")
+        print(f"divergências: {_divergences(server, snap)}")
+    finally:
+        feed_server.stop()
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if os.path.dirname(os.path.dirname(os.path.abspath(__file__))) not in sys.path:
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    main()
@@ -0,0 +1,245 @@
+"""Benchmark das páginas contra o Supabase de mentira (bench/fake_supabase.py).
+
+Para cada tamanho de carga, popula o servidor local e roda cada página com
+o ``AppTest`` do Streamlit duas vezes: fria (cache e snapshots vazios) e
+quente (segunda execução no mesmo processo, como um rerun). Mede latência
+do render, requisições e bytes trocados com o servidor e o pico de memória
+Python (tracemalloc; inclui numpy/pandas, não os buffers do pyarrow).
+
+    python -m bench.run --leads 10000 100000 1000000
+    python -m bench.compare bench/results/A.json bench/results/B.json
+
+Antes das páginas mede o custo de import de cada uma num processo novo
+(``bench/imports.py``; ``--skip-imports`` desliga). O resultado vai para
+``bench/results/<data>-<commit>.json``.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from datetime import date, datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+
+
+# ---------------- Cenários ----------------
+def _toggle_off(key):
+    def steps(at):
+        at.run()
+        at.toggle(key=key).set_value(False).run()
+    return steps
+
+
+def _run(at):
+    at.run()
+
+
+def _calendar(view):
+    # Mês/semana da data-base do seed (bench/fake_supabase.py)
+    def steps(at):
+        at.session_state["ag_visao"] = view
+        at.session_state["ag_ancora"] = date(2025, 6, 30)
+        at.run()
+    return steps
+
+
+SCENARIOS = {
+    "inicio": ("app.py", _run),
+    "resumo": ("pages/1_Resumo.py", _run),
+    "leads": ("pages/2_Leads.py", _run),
+    "leads_completo": ("pages/2_Leads.py", _toggle_off("leads_paginado")),
+    "agendamentos": ("pages/3_Agendamentos.py", _run),
+    "agendamentos_completo": ("pages/3_Agendamentos.py", _toggle_off("ag_paginado")),
+    "agendamentos_semana": ("pages/3_Agendamentos.py", _calendar("Semana")),
+    "agendamentos_mes": ("pages/3_Agendamentos.py", _calendar("Mês")),
+    "empreendimentos": ("pages/4_Empreendimentos.py", _run),
+    "usuarios": ("pages/5_Usuarios.py", _run),
+}
+
+
+# ---------------- Servidor ----------------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeServer:
+    def __init__(self):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "bench.fake_supabase", "--port", str(self.port)],
+            cwd=ROOT, stdout=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                self.stats()
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("o servidor de benchmark não subiu")
+                time.sleep(0.1)
+
+    def _call(self, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode()
+        req = urllib.request.Request(self.url + path, data=data, method="GET" if data is None else "POST")
+        with urllib.request.urlopen(req, timeout=600) as res:
+            return json.loads(res.read())
+
+    def seed(self, **sizes):
+        return self._call("/__bench/seed", sizes)
+
+    def stats(self):
+        return self._call("/__bench/stats")
+
+    def reset(self):
+        return self._call("/__bench/reset", {})
+
+    def stop(self):
+        self.proc.terminate()
+        self.proc.wait(timeout=10)
+
+
+# ---------------- Execução ----------------
+def _configure_env(server_url, workdir):
+    # Antes de importar utils/: o cliente lê o ambiente na importação
+    os.environ.update({
+        "SUPABASE_URL": server_url,
+        "SUPABASE_KEY": "bench-anon-key",
+        "REALTIME_ENABLED": "0",
+        "SNAPSHOT_DIR": os.path.join(workdir, "snapshots"),
+        "IMPORT_DIR": os.path.join(workdir, "imports"),
+        "EXPORT_DIR": os.path.join(workdir, "exports"),
+        "STORAGE_UPLOAD_STATE": os.path.join(workdir, "uploads.json"),
+        # Varredura do Storage numa thread mexeria nas contagens das páginas
+        "STORAGE_GC_INTERVAL": "0",
+    })
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+
+def _reset_app_state():
+    # Equivale a um processo novo: sem cache, sem snapshots em memória ou em disco
+    from utils import dimensions, snapshot
+    from utils.supabase_client import cache, get_client
+
+    cache.invalidate()
+    # O cliente vive o processo todo; criá-lo aqui deixa o import do supabase
+    # (caro sob tracemalloc) fora da medição. O custo de import sai em bench/imports.py
+    get_client()
+    with snapshot._snapshots_lock:
+        snapshot._snapshots.clear()
+    with dimensions._indexes_lock:
+        dimensions._indexes.clear()
+    shutil.rmtree(snapshot.SNAPSHOT_DIR, ignore_errors=True)
+
+
+def _measure(server, page, steps, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    # Threads de carga fora do script disparam este aviso a cada execução
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+    at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=timeout)
+    server.reset()
+    tracemalloc.start()
+    started = time.perf_counter()
+    steps(at)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = server.stats()
+    return {
+        "latency_s": round(elapsed, 4),
+        "requests": stats["requests"],
+        "bytes_in": stats["bytes_in"],
+        "bytes_out": stats["bytes_out"],
+        "server_ms": stats["server_ms"],
+        "peak_mem_bytes": peak,
+        "by_table": stats["by_table"],
+        "exceptions": [str(e.value) for e in at.exception],
+    }
+
+
+def _commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "")
+    except OSError:
+        return "unknown"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das páginas com Supabase local de mentira")
+    parser.add_argument("--leads", type=int, nargs="+", default=[10_000, 100_000],
+                        help="tamanhos da tabela de leads (agendamentos = leads/2, usuários = leads/100)")
+    parser.add_argument("--agendamentos", type=int, default=None)
+    parser.add_argument("--usuarios", type=int, default=None)
+    parser.add_argument("--empreendimentos", type=int, default=50)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--timeout", type=float, default=600, help="limite por execução de página (s)")
+    parser.add_argument("--out", default=None, help="arquivo JSON de saída")
+    parser.add_argument("--skip-imports", action="store_true", help="não mede o custo de import das páginas")
+    args = parser.parse_args(argv)
+
+    server = FakeServer()
+    workdir = tempfile.mkdtemp(prefix="mais-emp-bench-")
+    _configure_env(server.url, workdir)
+    commit = _commit()
+    results = []
+    import_times = {}
+    if not args.skip_imports:
+        from bench.imports import measure as measure_imports
+
+        import_times = measure_imports()
+        for page, res in import_times.items():
+            print(f"import {page:28s} {res.get('seconds', float('nan')) * 1000:8.0f} ms", flush=True)
+    try:
+        for size in args.leads:
+            counts = server.seed(leads=size, agendamentos=args.agendamentos, usuarios=args.usuarios,
+                                 empreendimentos=args.empreendimentos)
+            print(f"== {size} leads: {counts}", flush=True)
+            for name in args.scenarios:
+                page, steps = SCENARIOS[name]
+                _reset_app_state()
+                cold = _measure(server, page, steps, args.timeout)
+                warm = _measure(server, page, steps, args.timeout)
+                results.append({"leads": size, "rows": counts, "scenario": name, "page": page,
+                                "cold": cold, "warm": warm})
+                print(f"{name:24s} frio {cold['latency_s']:8.3f}s {cold['requests']:5d} req "
+                      f"{cold['bytes_out'] / 1e6:8.2f} MB | quente {warm['latency_s']:8.3f}s "
+                      f"{warm['requests']:5d} req {warm['bytes_out'] / 1e6:8.2f} MB"
+                      + (f" | ERRO: {cold['exceptions'] or warm['exceptions']}" if cold["exceptions"] or warm["exceptions"] else ""),
+                      flush=True)
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out = args.out or os.path.join(RESULTS_DIR, f"{stamp}-{commit}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": commit, "created_at": stamp,
+            "python": platform.python_version(), "platform": platform.platform(),
+            "imports": import_times, "results": results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"resultados em {out}")
+
+
+if __name__ == "__main__":
+    main()
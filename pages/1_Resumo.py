@@ -1,7 +1,16 @@
+from datetime import timedelta
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from utils.supabase_client import get_table_data
+from utils.supabase_client import count_rows, leads_por_empreendimento, clear_cache, run_parallel
+from utils.dimensions import get_dimension
+from utils.rollups import get_rollup
+from utils.live import start_change_feed
+from utils import metrics
+
+# Mudanças feitas por outros usuários chegam por push (uma vez por processo)
+start_change_feed()
+# Trace do rerun (painel de desempenho: PERF_PANEL=1)
+metrics.begin_page("resumo")
 
 st.title("📈 Resumo do Sistema")
 st.subheader("📊 Visão geral com métricas e gráficos")
@@ -15,45 +24,124 @@ def rerun():
 colA, _ = st.columns([1, 3])
 with colA:
     if st.button("🔄 Atualizar"):
+        clear_cache()
         rerun()
 
-usuarios = pd.DataFrame(get_table_data("mais_emp_usuarios"))
-empreendimentos = pd.DataFrame(get_table_data("mais_emp_empreendimentos"))
-leads = pd.DataFrame(get_table_data("mais_emp_lead"))
-agendamentos = pd.DataFrame(get_table_data("mais_emp_agendamento"))
+# Todas as consultas da página saem juntas; o tempo é o da mais lenta
+dados, erros = run_parallel({
+    "Usuários": lambda: count_rows("mais_emp_usuarios"),
+    "Empreendimentos": lambda: count_rows("mais_emp_empreendimentos"),
+    "Leads": lambda: count_rows("mais_emp_lead"),
+    "Agendamentos": lambda: count_rows("mais_emp_agendamento"),
+    "grafico": leads_por_empreendimento,
+    "tendência de leads": lambda: get_rollup("leads"),
+    "tendência de agendamentos": lambda: get_rollup("agendamentos"),
+    "nomes dos empreendimentos": lambda: get_dimension("mais_emp_empreendimentos"),
+})
+for nome, erro in erros.items():
+    st.error(f"Erro ao carregar {nome}: {erro}")
 
-# KPIs
+# KPIs (contagem no servidor, sem baixar as linhas)
 col1, col2, col3, col4 = st.columns(4)
-col1.metric("Usuários", len(usuarios))
-col2.metric("Empreendimentos", len(empreendimentos))
-col3.metric("Leads", len(leads))
-col4.metric("Agendamentos", len(agendamentos))
+for col, nome in zip([col1, col2, col3, col4], ["Usuários", "Empreendimentos", "Leads", "Agendamentos"]):
+    col.metric(nome, dados.get(nome, "—"))
 
 st.markdown("---")
 
-# Leads por Empreendimento (usa nome amigável)
+# Leads por Empreendimento (agregado no banco, uma linha por empreendimento)
 st.subheader("📋 Leads por Empreendimento")
-if not leads.empty:
-    df = leads.copy()
-    if "id_empreendimento" not in df.columns:
-        df["id_empreendimento"] = None
-
-    if not empreendimentos.empty:
-        df = df.merge(
-            empreendimentos[["id_empreendimento", "nome"]].rename(columns={"nome": "Empreendimento"}),
-            on="id_empreendimento",
-            how="left"
+agg = dados.get("grafico")
+if agg is not None and not agg.empty:
+    import plotly.express as px  # ~0,3 s de import: só quando há gráfico, depois das métricas na tela
+
+    fig = px.bar(agg, x="Empreendimento", y="Leads", title="Leads por Empreendimento")
+    st.plotly_chart(fig, use_container_width=True)
+else:
+    st.info("Sem dados de leads para exibir.")
+
+st.markdown("---")
+
+
+def longo(serie, nome, valor, vazio):
+    # Colunas por grupo → linhas (periodo, grupo, valor) para o plotly
+    serie = serie.rename(columns=lambda c: vazio if c is None or c != c else c)
+    return serie.reset_index().melt(id_vars="periodo", var_name=nome, value_name=valor)
+
+
+# Tendências a partir dos agregados diários (sql/006): o custo não depende
+# do tamanho do período nem do número de leads
+st.subheader("📅 Tendências")
+cubo_leads = dados.get("tendência de leads")
+cubo_ag = dados.get("tendência de agendamentos")
+emps = dados.get("nomes dos empreendimentos")
+if cubo_leads is None or cubo_ag is None or (cubo_leads.empty and cubo_ag.empty):
+    st.info("Sem dados de leads ou agendamentos para as tendências.")
+else:
+    # Padrão: os 90 dias até o último lead (ou agendamento) registrado
+    fim = (cubo_leads.end if not cubo_leads.empty else cubo_ag.end).date()
+    c1, c2, c3 = st.columns([2, 1, 2])
+    with c1:
+        periodo = st.date_input("Período", value=(fim - timedelta(days=89), fim), format="DD/MM/YYYY",
+                                key="resumo_periodo")
+    with c2:
+        agrupar = st.radio("Agrupar por", ["Dia", "Semana"], horizontal=True, key="resumo_agrupar")
+    with c3:
+        escolhidos = st.multiselect(
+            "Empreendimentos (leads)",
+            options=[] if emps is None else [r[emps.key] for r in emps.records()],
+            format_func=lambda v: emps.label_of(v, str(v)),
+            key="resumo_emps",
         )
+    if len(periodo) < 2:
+        st.info("Selecione a data final do período.")
     else:
-        df["Empreendimento"] = None
+        inicio, fim = periodo
+        freq = "W" if agrupar == "Semana" else "D"
+        filtro = {"id_empreendimento": escolhidos} if escolhidos else None
 
-    df["Empreendimento"] = df["Empreendimento"].fillna("Sem vínculo")
+        total_leads = cubo_leads.totals(inicio, fim, where=filtro)
+        por_status = cubo_ag.totals(inicio, fim, by=["status"])
+        por_status = dict(zip(por_status["status"], por_status["agendamentos"]))
+        total_ag = int(sum(por_status.values()))
+        realizadas = int(por_status.get("realizada", 0))
+        k1, k2, k3 = st.columns(3)
+        k1.metric("Leads no período", total_leads)
+        k2.metric("Agendamentos no período", total_ag)
+        k3.metric("Conversão (realizadas)", f"{realizadas / total_ag:.0%}" if total_ag else "—")
 
-    agg = df.groupby("Empreendimento", dropna=False).size().reset_index(name="Leads")
-    if not agg.empty and "Empreendimento" in agg.columns:
-        fig = px.bar(agg, x="Empreendimento", y="Leads", title="Leads por Empreendimento")
+        import plotly.express as px
+
+        rotulo = "Semana" if freq == "W" else "Dia"
+        entrada = longo(cubo_leads.series(inicio, fim, "potencial", freq=freq, where=filtro),
+                        "Potencial", "Leads", "Sem potencial")
+        fig = px.bar(entrada, x="periodo", y="Leads", color="Potencial", title=f"Entrada de leads por {rotulo.lower()}",
+                     labels={"periodo": rotulo})
         st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.info("Sem dados de leads para exibir.")
-else:
-    st.info("Sem dados de leads para exibir.")
+
+        g1, g2 = st.columns(2)
+        with g1:
+            mix = cubo_leads.totals(inicio, fim, by=["potencial"], where=filtro)
+            mix["potencial"] = mix["potencial"].astype(object).where(mix["potencial"].notna(), "Sem potencial")
+            if mix["leads"].sum():
+                fig = px.pie(mix, names="potencial", values="leads", title="Mix de potencial dos leads")
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("Nenhum lead no período.")
+        with g2:
+            ag = cubo_ag.series(inicio, fim, "status", freq=freq)
+            if total_ag:
+                feitos = ag["realizada"] if "realizada" in ag.columns else 0
+                taxa = (feitos / ag.sum(axis=1).where(ag.sum(axis=1) > 0)).rename("Conversão").reset_index()
+                fig = px.bar(longo(ag, "Status", "Agendamentos", "Sem status"), x="periodo", y="Agendamentos",
+                             color="Status", barmode="group", title="Agendado × realizada", labels={"periodo": rotulo})
+                st.plotly_chart(fig, use_container_width=True)
+                fig = px.line(taxa, x="periodo", y="Conversão", title="Conversão por período",
+                              labels={"periodo": rotulo})
+                fig.update_yaxes(tickformat=".0%")
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("Nenhum agendamento no período.")
+        if escolhidos:
+            st.caption("O filtro de empreendimentos vale para os leads; agendamentos não têm empreendimento.")
+
+metrics.end_page()
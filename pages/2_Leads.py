@@ -1,6 +1,20 @@
 import streamlit as st
 import pandas as pd
-from utils.supabase_client import get_table_data, insert_data, delete_data
+from utils.supabase_client import get_table_df, insert_data, delete_rows, clear_cache, count_rows, run_parallel, Filters
+from utils.dimensions import DimensionIndex, get_dimension
+from utils.grid import paginated_grid
+from utils.picker import record_picker
+from utils.lead_import import IMPORT_BATCH_SIZE, import_leads
+from utils.export import export_panel
+from utils.search import SEARCH_MAX_IDS, rank, search, search_filters
+from utils.snapshot import load_table
+from utils.live import start_change_feed
+from utils import metrics
+
+# Mudanças feitas por outros usuários chegam por push (uma vez por processo)
+start_change_feed()
+# Trace do rerun (painel de desempenho: PERF_PANEL=1)
+metrics.begin_page("leads")
 
 st.title("📋 Leads")
 st.subheader(
@@ -16,69 +30,94 @@ def rerun():
 colA, _ = st.columns([1, 3])
 with colA:
     if st.button("🔄 Atualizar"):
+        clear_cache("mais_emp_empreendimentos")
+        clear_cache("mais_emp_lead")
         rerun()
 
-# Dados
-empreendimentos = pd.DataFrame(get_table_data("mais_emp_empreendimentos"))
-leads = pd.DataFrame(get_table_data("mais_emp_lead"))
+LEAD_COLS = ("id_lead", "nome", "id_empreendimento", "objetivo", "forma_pagamento",
+             "renda_familiar", "potencial", "interesse_empreendimento", "created_at")
+LEAD_PICKER_COLS = ("id_lead", "nome", "objetivo")
+
+# Só a dimensão: a lista de leads é paginada no servidor (a tabela inteira
+# vem só no modo completo, em load_leads)
+frames, erros = run_parallel({
+    "mais_emp_empreendimentos": lambda: get_dimension("mais_emp_empreendimentos"),
+})
+for tabela, erro in erros.items():
+    st.error(f"Erro ao carregar {tabela}: {erro}")
+# Índice id → nome do empreendimento (reaproveitado até a tabela mudar)
+empreendimentos = frames.get("mais_emp_empreendimentos") or DimensionIndex("mais_emp_empreendimentos", pd.DataFrame(), 0)
+
+def load_leads(filters=None, columns=LEAD_COLS):
+    # Sem filtro: snapshot local; com filtro: só as linhas que batem (filtro no Supabase)
+    if filters:
+        df = get_table_df("mais_emp_lead", columns=columns, filters=filters)
+    else:
+        df = load_table("mais_emp_lead", columns=columns)
+    return with_labels(df)
 
-# Garantir colunas
-for df, needed in [(leads, ["id_lead", "nome", "id_empreendimento", "objetivo", "forma_pagamento",
-                            "renda_familiar", "potencial", "interesse_empreendimento", "created_at"]),
-                   (empreendimentos, ["id_empreendimento", "nome"])]:
-    for c in needed:
+def with_labels(df):
+    for c in LEAD_COLS:
         if c not in df.columns:
             df[c] = None
+    # Montar visão amigável (sem IDs)
+    df["Empreendimento"] = empreendimentos.labels_for(df["id_empreendimento"])
+    df["Nome"] = df["nome"]
+    return df
 
-# Montar visão amigável (sem IDs)
-merged = leads.copy()
-if not empreendimentos.empty:
-    merged = merged.merge(
-        empreendimentos[["id_empreendimento", "nome"]].rename(columns={"nome": "Empreendimento"}),
-        on="id_empreendimento",
-        how="left"
-    )
-else:
-    merged["Empreendimento"] = None
+def show_leads(df):
+    # Tabela amigável (sem IDs)
+    cols_show = [
+        "Nome", "Empreendimento", "objetivo", "forma_pagamento",
+        "renda_familiar", "potencial", "interesse_empreendimento", "created_at"
+    ]
+    df_show = df[cols_show] if not df.empty else pd.DataFrame(columns=cols_show)
+    return df_show.rename(columns={
+        "objetivo": "Objetivo",
+        "forma_pagamento": "Forma de Pagamento",
+        "renda_familiar": "Renda Familiar",
+        "potencial": "Potencial",
+        "interesse_empreendimento": "Interesse",
+        "created_at": "Criado em"
+    })
 
-merged["Nome"] = merged["nome"]
+# Datas já vêm tipadas; o formato é aplicado só na exibição
+LEAD_COLUMN_CONFIG = {
+    "Criado em": st.column_config.DatetimeColumn("Criado em", format="DD/MM/YYYY"),
+}
 
 # Filtros
 st.markdown("### 🔎 Filtros")
 col1, col2, col3 = st.columns(3)
 f_nome = col1.text_input("Nome")
-emp_options = [""] + (sorted(list(empreendimentos["nome"].dropna().unique())) if not empreendimentos.empty else [])
+emp_options = [""] + empreendimentos.sorted_labels()
 f_emp = col2.selectbox("Empreendimento", emp_options)
 f_pot = col3.selectbox("Potencial", ["", "Alto", "Médio", "Baixo"])
 
-df_view = merged.copy()
-if f_nome:
-    df_view = df_view[df_view["Nome"].astype(str).str.contains(f_nome, case=False, na=False)]
+# Nome: busca indexada (sem acento, tolera erro de digitação); os mais
+# parecidos viram filtro de chave no servidor
+encontrados = search("mais_emp_lead", f_nome, ("nome",))
+filtros = search_filters("mais_emp_lead", encontrados, Filters().eq("potencial", f_pot))
+if encontrados is not None and len(encontrados) >= SEARCH_MAX_IDS:
+    st.caption(f"Nome: mostrando os {SEARCH_MAX_IDS} leads mais parecidos; refine a busca para ver outros.")
 if f_emp:
-    df_view = df_view[df_view["Empreendimento"] == f_emp]
-if f_pot:
-    df_view = df_view[df_view["potencial"] == f_pot]
-
-# Tabela amigável (sem IDs) + datas
-cols_show = [
-    "Nome", "Empreendimento", "objetivo", "forma_pagamento",
-    "renda_familiar", "potencial", "interesse_empreendimento", "created_at"
-]
-df_show = df_view[cols_show] if not df_view.empty else pd.DataFrame(columns=cols_show)
-df_show = df_show.rename(columns={
-    "objetivo": "Objetivo",
-    "forma_pagamento": "Forma de Pagamento",
-    "renda_familiar": "Renda Familiar",
-    "potencial": "Potencial",
-    "interesse_empreendimento": "Interesse",
-    "created_at": "Criado em"
-})
-if not df_show.empty:
-    try:
-        df_show["Criado em"] = pd.to_datetime(df_show["Criado em"], errors="coerce").dt.strftime("%d/%m/%Y")
-    except Exception:
-        pass
-st.dataframe(df_show)
+    # Nome escolhido → id(s) do empreendimento
+    filtros.in_("id_empreendimento", empreendimentos.ids_for_label(f_emp))
+
+# Paginado: só a página visível sai do Supabase e vai para o navegador
+if st.toggle("Paginação no servidor", value=True, key="leads_paginado"):
+    paginated_grid(
+        "leads", "mais_emp_lead", LEAD_COLS, filters=filtros,
+        sort_options={"Criado em": "created_at", "Nome": "nome", "Cadastro": "id_lead"},
+        default_sort="Criado em",
+        prepare=lambda df: show_leads(with_labels(df)),
+        column_config=LEAD_COLUMN_CONFIG,
+    )
+else:
+    st.dataframe(show_leads(rank(load_leads(filtros), "id_lead", encontrados)), column_config=LEAD_COLUMN_CONFIG)
+
+export_panel("leads", "mais_emp_lead", LEAD_COLS, filters=filtros,
+             prepare=lambda df: show_leads(with_labels(df)), file_stem="leads")
 
 # Ocultar/Mostrar seções
 colx, coly = st.columns(2)
@@ -92,7 +131,7 @@ if not hide_add:
         nome_lead = st.text_input("Nome")
         empreendimento_sel = st.selectbox(
             "Empreendimento (opcional)",
-            [{"id_empreendimento": None, "nome": "Nenhum"}] + empreendimentos.to_dict("records"),
+            [{"id_empreendimento": None, "nome": "Nenhum"}] + empreendimentos.records(),
             format_func=lambda x: x.get("nome", "") if isinstance(x, dict) else ""
         )
         objetivo = st.radio("Objetivo", ["Moradia", "Investimento"])
@@ -121,38 +160,71 @@ if not hide_add:
             st.success("✅ Lead registrado com sucesso!")
             rerun()
 
-# Excluir (filtro + select)
-if not hide_del:
-    st.markdown("### 🗑️ Excluir Lead")
-    if not merged.empty:
-        f_del = st.text_input("Filtrar (Nome ou Objetivo) para excluir")
-        options = merged.copy()
-        if f_del:
-            mask = (
-                options["Nome"].astype(str).str.contains(f_del, case=False, na=False) |
-                options["objetivo"].astype(str).str.contains(f_del, case=False, na=False)
+# Importar em massa (CSV/XLSX)
+with st.expander("📥 Importar Leads (CSV/XLSX)"):
+    st.caption(
+        "Colunas: Nome, Objetivo, Forma de Pagamento, Renda Familiar, Potencial, Interesse, "
+        "Empreendimento (pelo nome). Se a importação parar no meio, envie o mesmo arquivo de novo: "
+        "só os lotes que faltaram serão gravados."
+    )
+    arquivo = st.file_uploader("Arquivo", type=["csv", "xlsx"], key="import_file")
+    col_lote, col_reiniciar = st.columns(2)
+    tamanho_lote = col_lote.number_input("Linhas por lote", min_value=50, max_value=1000, value=IMPORT_BATCH_SIZE, step=50)
+    reiniciar = col_reiniciar.checkbox("Ignorar progresso salvo (importar tudo de novo)")
+    if arquivo is not None and st.button("Importar"):
+        # O total de linhas só é conhecido no fim (o arquivo é lido em fluxo)
+        progresso = st.empty()
+        try:
+            result = import_leads(
+                arquivo, arquivo.name, empreendimentos, batch_size=int(tamanho_lote), restart=reiniciar,
+                on_progress=lambda n: progresso.caption(f"⏳ {n} linha(s) processadas..."),
             )
-            options = options[mask]
-        if options.empty:
-            st.info("Nenhum lead encontrado com o filtro informado.")
+        except Exception as e:
+            st.error(f"Erro ao importar: {e}")
         else:
-            selected = st.selectbox(
-                "Selecione o Lead",
-                options.to_dict("records"),
-                format_func=lambda x: f"{x.get('Nome','(sem nome)')} - {x.get('objetivo','')}"
-            )
-            confirm = st.checkbox("Confirmo a exclusão permanente deste lead.")
-            if st.button("Excluir Lead", disabled=not confirm):
-                try:
-                    from utils.supabase_client import get_table_data as _get
-                    delete_data("mais_emp_lead", "id_lead", selected["id_lead"])
-                    after = pd.DataFrame(_get("mais_emp_lead"))
-                    if not after.empty and "id_lead" in after.columns and str(selected["id_lead"]) in set(after["id_lead"].astype(str)):
-                        st.warning("⚠️ Exclusão solicitada, mas o registro ainda existe. Verifique RLS/constraints.")
-                    else:
-                        st.success("✅ Lead excluído com sucesso!")
-                        rerun()
-                except Exception as e:
-                    st.error(f"Erro ao excluir lead: {e}")
+            progresso.empty()
+            st.success(f"✅ {result.inserted} lead(s) importado(s) de {result.read} linha(s).")
+            if result.skipped:
+                st.info(f"{result.skipped} linha(s) já tinham sido importadas antes e foram puladas.")
+            if not result.complete:
+                st.warning(f"⚠️ {len(result.failed_batches)} lote(s) não foram enviados. Importe o mesmo arquivo de novo para retomar.")
+            relatorio = result.report()
+            if not relatorio.empty:
+                st.markdown(f"**{len(relatorio)} linha(s) com erro**")
+                st.dataframe(relatorio, hide_index=True)
+                st.download_button(
+                    "Baixar relatório de erros", relatorio.to_csv(index=False).encode("utf-8-sig"),
+                    file_name=f"erros-{arquivo.name.rsplit('.', 1)[0]}.csv", mime="text/csv",
+                )
+
+# Excluir (busca no servidor + select)
+if not hide_del:
+    st.markdown("### 🗑️ Excluir Lead")
+    if count_rows("mais_emp_lead") > 0:
+        selected = record_picker(
+            "del_leads", "Selecione o(s) Lead(s)", "mais_emp_lead", LEAD_PICKER_COLS,
+            format_func=lambda x: f"{x.get('nome') or '(sem nome)'} - {x.get('objetivo') or ''}",
+            search_columns=["nome"], order_by="nome", multiple=True,
+        )
+        confirm = st.checkbox("Confirmo a exclusão permanente dos leads selecionados.")
+        if st.button("Excluir Lead", disabled=not (confirm and selected)):
+            try:
+                # Uma requisição para todos; a resposta diz o que saiu e o que ficou
+                result = delete_rows("mais_emp_lead", "id_lead", selected)
+                if result.error:
+                    st.error(f"Erro ao excluir lead: {result.error}")
+                elif result.blocked:
+                    st.warning(
+                        f"⚠️ Exclusão solicitada, mas {len(result.blocked)} registro(s) ainda existem. "
+                        "Verifique RLS/constraints."
+                    )
+                else:
+                    st.success(f"✅ {len(result.deleted)} lead(s) excluído(s) com sucesso!")
+                    st.session_state.pop("del_leads_sel", None)
+                    rerun()
+            except Exception as e:
+                st.error(f"Erro ao excluir lead: {e}")
     else:
         st.info("Nenhum lead cadastrado para excluir.")
+
+metrics.end_page()
@@ -1,6 +1,24 @@
 import streamlit as st
 import pandas as pd
-from utils.supabase_client import get_table_data, insert_data, update_data, delete_data
+from datetime import date, timedelta
+from utils.supabase_client import get_table_df, insert_data, update_data, delete_rows, clear_cache, count_rows, run_parallel, Filters
+from utils.agenda import VIEWS, calendar_view, check_conflicts, load_window, window
+from utils.dimensions import DimensionIndex, get_dimension
+from utils.grid import paginated_grid
+from utils.picker import record_picker
+from utils.export import export_panel
+from utils.search import search
+from utils.snapshot import load_table
+from utils.live import start_change_feed
+from utils.google_calendar import start_calendar_sync
+from utils import metrics
+
+# Mudanças feitas por outros usuários chegam por push (uma vez por processo)
+start_change_feed()
+# Google Agenda: sincronização em segundo plano (só com GCAL_CALENDAR_ID)
+gcal = start_calendar_sync()
+# Trace do rerun (painel de desempenho: PERF_PANEL=1)
+metrics.begin_page("agendamentos")
 
 st.title("📅 Agendamentos")
 st.subheader("Agenda de visitas e reuniões")
@@ -11,39 +29,48 @@ def rerun():
     except Exception:
         st.experimental_rerun()
 
-colA, _ = st.columns([1, 3])
+colA, colB = st.columns([1, 3])
 with colA:
     if st.button("🔄 Atualizar"):
+        clear_cache("mais_emp_usuarios")
+        clear_cache("mais_emp_agendamento")
         rerun()
+if gcal is not None:
+    with colB:
+        ultima = gcal.status
+        if ultima.get("error"):
+            st.caption(f"Google Agenda: falha na última sincronização ({ultima['error']})")
+        elif ultima:
+            st.caption(f"Google Agenda sincronizado às {ultima['at'].astimezone():%H:%M:%S}")
+        if st.button("📆 Sincronizar Google Agenda", key="ag_gcal"):
+            gcal.request_sync()
+            st.toast("Sincronização com o Google Agenda pedida")
 
-usuarios = pd.DataFrame(get_table_data("mais_emp_usuarios"))
-ag_raw = pd.DataFrame(get_table_data("mais_emp_agendamento"))
+AG_COLS = ("id_agendamento", "id_usuario", "cliente_id", "tipo_evento", "data", "horario", "status", "negociacao", "created_at")
 
-# Garantir colunas esperadas
-for df, needed in [
-    (ag_raw, ["id_agendamento", "id_usuario", "cliente_id", "tipo_evento", "data", "horario", "status", "negociacao", "created_at"]),
-    (usuarios, ["id_usuario", "nome"])
-]:
-    for c in needed:
-        if c not in df.columns:
-            df[c] = None
+# Usuários: índice id → nome (selects e nomes na tabela). A tabela de
+# agendamentos não é baixada aqui: cada visão pede só o que mostra.
+frames, erros = run_parallel({
+    "mais_emp_usuarios": lambda: get_dimension("mais_emp_usuarios"),
+    "mais_emp_agendamento": lambda: count_rows("mais_emp_agendamento"),
+})
+for tabela, erro in erros.items():
+    st.error(f"Erro ao carregar {tabela}: {erro}")
+usuarios = frames.get("mais_emp_usuarios") or DimensionIndex("mais_emp_usuarios", pd.DataFrame(), 0)
+tem_agendamentos = frames.get("mais_emp_agendamento", 1) > 0
 
 # Se não houver usuários, evita quebra nos selects
 if usuarios.empty:
     st.warning("Não há usuários cadastrados. Cadastre um usuário antes de criar/editar agendamentos.")
-else:
-    usuarios = usuarios.reset_index(drop=True)
 
 # Visão amigável (sem IDs). Mantemos Usuário e Cliente na view, mas agora são a mesma pessoa
-ag_view = ag_raw.copy()
-if not ag_view.empty:
-    ag_view = ag_view.merge(
-        usuarios[["id_usuario", "nome"]].rename(columns={"nome": "Usuário"}),
-        left_on="id_usuario", right_on="id_usuario", how="left"
-    ).merge(
-        usuarios[["id_usuario", "nome"]].rename(columns={"id_usuario": "cliente_id", "nome": "Cliente"}),
-        on="cliente_id", how="left"
-    )
+def with_names(ag):
+    if ag.empty:
+        return ag
+    ag = ag.copy()
+    ag["Usuário"] = usuarios.labels_for(ag["id_usuario"])
+    ag["Cliente"] = usuarios.labels_for(ag["cliente_id"])
+    return ag
 
 # ---------------- Filtros ----------------
 st.markdown("### 🔎 Filtros")
@@ -52,46 +79,107 @@ f_status = col1.text_input("Status")
 f_data = col2.date_input("Data", value=None)
 f_pessoa = col3.text_input("Nome (Usuário/Cliente)")
 
-df_view = ag_view.copy()
-if f_status:
-    df_view = df_view[df_view["status"].astype(str).str.contains(f_status, case=False, na=False)]
+# Pessoas mais parecidas com o nome digitado (sem acento, tolera erro de digitação)
+PESSOAS_LIMIT = 100
+
+def pessoas_ids(term):
+    return [key for key, _ in search("mais_emp_usuarios", term, ("nome",), limit=PESSOAS_LIMIT) or []]
+
+def base_filters():
+    # Status e pessoa valem para a lista e para o calendário
+    filters = Filters().ilike("status", f_status)
+    if f_pessoa:
+        # Nome → ids dos usuários que batem, e então agendamentos de qualquer um deles
+        filters.any_in(["id_usuario", "cliente_id"], pessoas_ids(f_pessoa))
+    return filters
+
+filtros = base_filters()
 if f_data:
-    df_view = df_view[df_view["data"] == str(f_data)]
-if f_pessoa:
-    mask = (
-        df_view["Usuário"].astype(str).str.contains(f_pessoa, case=False, na=False) |
-        df_view["Cliente"].astype(str).str.contains(f_pessoa, case=False, na=False)
+    filtros.between("data", f_data, f_data)
+
+# Seleção para editar/excluir: busca pelo nome da pessoa, só os primeiros vêm do servidor
+AG_PICKER_COLS = ("id_agendamento", "cliente_id", "tipo_evento", "data")
+
+def agendamento_filters(term):
+    if not term:
+        return Filters()
+    return Filters().any_in(["id_usuario", "cliente_id"], pessoas_ids(term))
+
+def pick_agendamento(key):
+    return record_picker(
+        key, "Selecione", "mais_emp_agendamento", AG_PICKER_COLS,
+        format_func=lambda x: f"{usuarios.label_of(x.get('cliente_id'), 'Cliente')} - {x.get('tipo_evento') or ''} - {x.get('data') or ''}",
+        filters_for=agendamento_filters, order_by="data", descending=True, record_columns=AG_COLS,
     )
-    df_view = df_view[mask]
 
 # ---------------- Tabela amigável ----------------
-cols_show = ["Usuário", "Cliente", "tipo_evento", "data", "horario", "status", "negociacao", "created_at"]
-df_show = df_view[cols_show] if not df_view.empty else pd.DataFrame(columns=cols_show)
-df_show = df_show.rename(columns={
-    "tipo_evento": "Tipo",
-    "data": "Data",
-    "horario": "Horário",
-    "status": "Status",
-    "negociacao": "Negociação",
-    "created_at": "Criado em"
-})
-if not df_show.empty:
-    try:
-        df_show["Data"] = pd.to_datetime(df_show["Data"], errors="coerce").dt.strftime("%d/%m/%Y")
-    except Exception:
-        pass
-    try:
-        df_show["Criado em"] = pd.to_datetime(df_show["Criado em"], errors="coerce").dt.strftime("%d/%m/%Y")
-    except Exception:
-        pass
-st.dataframe(df_show)
+def show_agendamentos(df):
+    cols_show = ["Usuário", "Cliente", "tipo_evento", "data", "horario", "status", "negociacao", "created_at"]
+    df_show = df[cols_show] if not df.empty else pd.DataFrame(columns=cols_show)
+    return df_show.rename(columns={
+        "tipo_evento": "Tipo",
+        "data": "Data",
+        "horario": "Horário",
+        "status": "Status",
+        "negociacao": "Negociação",
+        "created_at": "Criado em"
+    })
+
+# Datas já vêm tipadas; o formato é aplicado só na exibição
+AG_COLUMN_CONFIG = {
+    "Data": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+    "Criado em": st.column_config.DatetimeColumn("Criado em", format="DD/MM/YYYY"),
+}
+
+def shift_anchor(days=None, months=None):
+    anchor = st.session_state.get("ag_ancora") or date.today()
+    if days:
+        anchor += timedelta(days=days)
+    if months:
+        month = anchor.month - 1 + months
+        anchor = date(anchor.year + month // 12, month % 12 + 1, 1)
+    st.session_state["ag_ancora"] = anchor
+
+visao = st.radio("Visualização", ["Lista", *VIEWS], horizontal=True, key="ag_visao")
+
+if visao in VIEWS:
+    # Calendário: só a semana/mês visível é pedida (intervalo em "data" no servidor)
+    step = {"days": 7} if visao == "Semana" else {"months": 1}
+    back = {k: -v for k, v in step.items()}
+    c1, c2, c3, c4 = st.columns([1, 2, 1, 1])
+    c1.button("◀", key="ag_anterior", on_click=shift_anchor, kwargs=back)
+    ancora = c2.date_input("Data de referência", key="ag_ancora", label_visibility="collapsed")
+    c3.button("▶", key="ag_proximo", on_click=shift_anchor, kwargs=step)
+    c4.button("Hoje", key="ag_hoje", on_click=lambda: st.session_state.update(ag_ancora=date.today()))
+    inicio, fim = window(visao, ancora)
+    st.caption(f"{inicio:%d/%m/%Y} a {fim:%d/%m/%Y}" + (" · o filtro de data vale só para a lista" if f_data else ""))
+    janela = with_names(load_window(inicio, fim, AG_COLS, base_filters()))
+    calendar_view(janela, inicio, fim, visao)
+# Paginado: só a página visível sai do Supabase e vai para o navegador
+elif st.toggle("Paginação no servidor", value=True, key="ag_paginado"):
+    paginated_grid(
+        "agendamentos", "mais_emp_agendamento", AG_COLS, filters=filtros,
+        sort_options={"Data": "data", "Criado em": "created_at", "Cadastro": "id_agendamento"},
+        default_sort="Data",
+        prepare=lambda df: show_agendamentos(with_names(df)),
+        column_config=AG_COLUMN_CONFIG,
+    )
+else:
+    if filtros:
+        df_view = with_names(get_table_df("mais_emp_agendamento", columns=AG_COLS, filters=filtros))
+    else:
+        df_view = with_names(load_table("mais_emp_agendamento", columns=AG_COLS))
+    st.dataframe(show_agendamentos(df_view), column_config=AG_COLUMN_CONFIG)
+
+export_panel("agendamentos", "mais_emp_agendamento", AG_COLS, filters=filtros,
+             prepare=lambda df: show_agendamentos(with_names(df)), file_stem="agendamentos")
 
 # ---------------- Adicionar ----------------
 st.markdown("### ➕ Registrar Agendamento")
 with st.form("add_agendamento"):
     usuario_sel = st.selectbox(
         "Usuário",
-        usuarios.to_dict("records"),
+        usuarios.records(),
         format_func=lambda x: x.get("nome", "") if isinstance(x, dict) else ""
     )
 
@@ -100,48 +188,44 @@ with st.form("add_agendamento"):
     data_evento = st.date_input("Data")
     horario = st.time_input("Horário")
     negociacao = st.text_area("Negociação")
+    forcar = st.checkbox("Agendar mesmo com choque de horário", key="add_ag_forcar")
 
     submitted = st.form_submit_button("Adicionar")
     if submitted:
-        try:
-            uid = usuario_sel.get("id_usuario") if isinstance(usuario_sel, dict) else None
-            insert_data("mais_emp_agendamento", {
-                "id_usuario": uid,                 # usuário e cliente são o mesmo
-                "cliente_id": uid,
-                "tipo_evento": tipo_evento or None,
-                "data": str(data_evento) if data_evento else None,
-                "horario": str(horario) if horario else None,
-                "status": "agendado",              # automático no cadastro
-                "negociacao": negociacao or None
-            })
-            st.success("✅ Agendamento registrado como 'agendado'!")
-            rerun()
-        except Exception as e:
-            st.error(f"Erro ao inserir: {e}")
+        uid = usuario_sel.get("id_usuario") if isinstance(usuario_sel, dict) else None
+        choques = check_conflicts(uid, data_evento, horario)
+        if choques and not forcar:
+            st.warning(f"⚠️ {usuarios.label_of(uid, 'O usuário')} já tem {len(choques)} agendamento(s) nesse horário. "
+                       "Marque \"Agendar mesmo com choque de horário\" para confirmar.")
+        else:
+            try:
+                insert_data("mais_emp_agendamento", {
+                    "id_usuario": uid,                 # usuário e cliente são o mesmo
+                    "cliente_id": uid,
+                    "tipo_evento": tipo_evento or None,
+                    "data": str(data_evento) if data_evento else None,
+                    "horario": str(horario) if horario else None,
+                    "status": "agendado",              # automático no cadastro
+                    "negociacao": negociacao or None
+                })
+                st.success("✅ Agendamento registrado como 'agendado'!")
+                rerun()
+            except Exception as e:
+                st.error(f"Erro ao inserir: {e}")
 
 # ---------------- Editar ----------------
 st.markdown("### ✏️ Editar Agendamento")
-if not ag_raw.empty:
-    selected = st.selectbox(
-        "Selecione",
-        ag_raw.to_dict("records"),
-        format_func=lambda x: f"{x.get('tipo_evento','')} - {x.get('data','')}"
-    )
-
-    def safe_index(df, col, val) -> int:
-        try:
-            # Garante int nativo (evita StreamlitAPIException: int64)
-            return int(df.index[df[col] == val][0])
-        except Exception:
-            return 0
-
+selected = None
+if tem_agendamentos:
+    selected = pick_agendamento("edit_ag")
+if selected:
     with st.form("edit_agendamento"):
         # Apenas um usuário (igual para id_usuario e cliente_id)
-        idx_user = safe_index(usuarios, "id_usuario", selected.get("id_usuario") or selected.get("cliente_id"))
+        idx_user = usuarios.position(selected.get("id_usuario") or selected.get("cliente_id"))
         usuario_sel_ed = st.selectbox(
             "Usuário",
-            usuarios.to_dict("records"),
-            index=int(idx_user),  # garantir int nativo
+            usuarios.records(),
+            index=idx_user,  # int nativo (evita StreamlitAPIException: int64)
             format_func=lambda x: x.get("nome", "") if isinstance(x, dict) else ""
         )
 
@@ -160,45 +244,55 @@ if not ag_raw.empty:
         status_ed = st.radio("Status", ["agendado", "realizada"], index=0 if status_atual == "agendado" else 1)
 
         negociacao_ed = st.text_area("Negociação", selected.get("negociacao") or "")
+        forcar_ed = st.checkbox("Salvar mesmo com choque de horário", key="edit_ag_forcar")
         submitted = st.form_submit_button("Salvar Alterações")
         if submitted:
-            try:
-                uid = usuario_sel_ed.get("id_usuario") if isinstance(usuario_sel_ed, dict) else None
-                update_data("mais_emp_agendamento", "id_agendamento", selected["id_agendamento"], {
-                    "id_usuario": uid,
-                    "cliente_id": uid,   # mesmo usuário
-                    "tipo_evento": tipo_evento_ed or None,
-                    "data": str(data_evento_ed) if data_evento_ed else None,
-                    "horario": str(horario_ed) if horario_ed else None,
-                    "status": status_ed or None,
-                    "negociacao": negociacao_ed or None
-                })
-                st.success("✅ Agendamento atualizado!")
-                rerun()
-            except Exception as e:
-                st.error(f"Erro ao atualizar: {e}")
-else:
+            uid = usuario_sel_ed.get("id_usuario") if isinstance(usuario_sel_ed, dict) else None
+            choques = check_conflicts(uid, data_evento_ed, horario_ed, exclude=selected["id_agendamento"])
+            if choques and not forcar_ed:
+                st.warning(f"⚠️ {usuarios.label_of(uid, 'O usuário')} já tem {len(choques)} agendamento(s) nesse horário. "
+                           "Marque \"Salvar mesmo com choque de horário\" para confirmar.")
+            else:
+                try:
+                    saved = update_data("mais_emp_agendamento", "id_agendamento", selected["id_agendamento"], {
+                        "id_usuario": uid,
+                        "cliente_id": uid,   # mesmo usuário
+                        "tipo_evento": tipo_evento_ed or None,
+                        "data": str(data_evento_ed) if data_evento_ed else None,
+                        "horario": str(horario_ed) if horario_ed else None,
+                        "status": status_ed or None,
+                        "negociacao": negociacao_ed or None
+                    }, current=selected)
+                    if saved:
+                        st.success("✅ Agendamento atualizado!")
+                        rerun()
+                    else:
+                        st.warning("⚠️ Nenhuma alteração gravada. Verifique RLS/permissões.")
+                except Exception as e:
+                    st.error(f"Erro ao atualizar: {e}")
+elif not tem_agendamentos:
     st.info("Nenhum agendamento para editar.")
 
 # ---------------- Excluir ----------------
 st.markdown("### 🗑️ Excluir Agendamento")
-if not ag_view.empty:
-    selected = st.selectbox(
-        "Selecione",
-        ag_view.to_dict("records"),
-        format_func=lambda x: f"{x.get('Cliente','Cliente')} - {x.get('tipo_evento','')} - {x.get('data','')}"
-    )
+selected = None
+if tem_agendamentos:
+    selected = pick_agendamento("del_ag")
+if selected:
     confirm = st.checkbox("Confirmo a exclusão deste agendamento.")
     if st.button("Excluir Agendamento", disabled=not confirm):
         try:
-            delete_data("mais_emp_agendamento", "id_agendamento", selected["id_agendamento"])
-            after = pd.DataFrame(get_table_data("mais_emp_agendamento"))
-            if not after.empty and "id_agendamento" in after.columns and str(selected["id_agendamento"]) in set(after["id_agendamento"].astype(str)):
+            result = delete_rows("mais_emp_agendamento", "id_agendamento", [selected["id_agendamento"]])
+            if result.error:
+                st.error(f"Erro ao excluir: {result.error}")
+            elif result.blocked:
                 st.warning("⚠️ Exclusão solicitada, mas o registro ainda existe. Verifique RLS/constraints.")
             else:
                 st.success("✅ Agendamento excluído com sucesso!")
                 rerun()
         except Exception as e:
             st.error(f"Erro ao excluir: {e}")
-else:
+elif not tem_agendamentos:
     st.info("Nenhum agendamento para excluir.")
+
+metrics.end_page()
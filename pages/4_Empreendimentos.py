@@ -1,12 +1,23 @@
 import streamlit as st
-import pandas as pd
-from uuid import uuid4
-from utils.supabase_client import get_table_data, insert_data, update_data, delete_data, supabase
+from utils.supabase_client import insert_data, update_data, delete_rows, clear_cache
+from utils.picker import record_picker
+from utils.search import SEARCH_MAX_IDS, rank, search
+from utils.snapshot import load_table
+from utils.live import start_change_feed
+from utils.storage import put_content, release, schedule_garbage_collection
+from utils import metrics
+
+# Mudanças feitas por outros usuários chegam por push (uma vez por processo)
+start_change_feed()
+# Trace do rerun (painel de desempenho: PERF_PANEL=1)
+metrics.begin_page("empreendimentos")
 
 st.title("🏢 Empreendimentos")
 st.subheader("Gerenciamento de empreendimentos.")
 
-BUCKET_PDF = "empreendimentos-pdf"  # ajuste se usar outro nome
+BUCKET_PDF = "empreendimentos-pdf"  # ajuste se usar outro nome (e REFERENCES em utils/storage.py)
+# PDFs que ficaram sem empreendimento (upload sem cadastro, cópias antigas): varredura periódica
+schedule_garbage_collection(BUCKET_PDF)
 
 def rerun():
     try:
@@ -18,13 +29,11 @@ def rerun():
 colA, _ = st.columns([1, 3])
 with colA:
     if st.button("🔄 Atualizar lista"):
+        clear_cache("mais_emp_empreendimentos")
         rerun()
 
-# Carregar dados
-emps = pd.DataFrame(get_table_data("mais_emp_empreendimentos"))
-
-# Garantir colunas do schema novo
-for c in [
+# Colunas do schema novo (as únicas pedidas ao Supabase)
+EMP_COLS = (
     "id_empreendimento",
     "nome",
     "localizacao",
@@ -32,16 +41,22 @@ for c in [
     "link_pdf",
     "link_tour_360_computador",
     "link_tour_360_mobile",
-]:
-    if c not in emps.columns:
-        emps[c] = None
+)
+
+def load_emps():
+    return load_table("mais_emp_empreendimentos", columns=EMP_COLS)
+
+# Carregar dados
+emps = load_emps()
 
 # ---------------- Filtros ----------------
 st.markdown("### 🔎 Filtros")
 filtro_nome = st.text_input("Nome", key="filtro_nome")
-df = emps.copy()
-if filtro_nome:
-    df = df[df["nome"].astype(str).str.contains(filtro_nome, case=False, na=False)]
+# Busca no índice local: sem acento, tolera erro de digitação, mais parecidos primeiro
+encontrados = search("mais_emp_empreendimentos", filtro_nome, ("nome",))
+if encontrados is not None and len(encontrados) >= SEARCH_MAX_IDS:
+    st.caption(f"Nome: mostrando os {SEARCH_MAX_IDS} empreendimentos mais parecidos; refine a busca para ver outros.")
+df = rank(emps, "id_empreendimento", encontrados)
 
 # ---------------- Tabela amigável (sem IDs) ----------------
 df_show = df.rename(columns={
@@ -56,29 +71,24 @@ cols_listagem = ["Nome", "Localização", "Tipo", "Link PDF", "Tour 360 (Computa
 st.dataframe(df_show[cols_listagem] if not df_show.empty else df_show)
 
 # ---------------- Helpers de upload ----------------
-def upload_pdf_and_get_url(file, filename_hint: str) -> str | None:
-    """Sobe o PDF ao bucket e retorna a URL pública."""
+def upload_pdf_and_get_url(file) -> str | None:
+    """Sobe o PDF ao bucket (nomeado pelo hash: o mesmo arquivo não sobe de novo) e retorna a URL pública."""
     if file is None:
         return None
     try:
-        bytes_data = file.getvalue()  # Streamlit file_uploader
-        # cria um caminho único (use o nome como prefixo para facilitar achar depois)
-        prefix = filename_hint.strip().lower().replace(" ", "-") if filename_hint else "arquivo"
-        object_path = f"{prefix}-{uuid4().hex}.pdf"
-
-        # upload com upsert para evitar erro se existir (pouco provável)
-        supabase.storage.from_(BUCKET_PDF).upload(
-            path=object_path,
-            file=bytes_data,
-            file_options={"content-type": "application/pdf", "upsert": "true"}
-        )
-
-        public_url = supabase.storage.from_(BUCKET_PDF).get_public_url(object_path)
-        return public_url
+        # Lido em blocos direto do UploadedFile, sem getvalue(); PDFs grandes vão por upload resumível
+        return put_content(BUCKET_PDF, file, content_type="application/pdf", suffix=".pdf")
     except Exception as e:
         st.error(f"Erro no upload do PDF para o Storage: {e}")
         return None
 
+def release_pdf(url):
+    # PDF antigo de uma edição/exclusão: apaga se nenhum outro empreendimento o usa
+    try:
+        release(BUCKET_PDF, url)
+    except Exception as e:
+        st.warning(f"Não foi possível apagar o PDF antigo do Storage: {e}")
+
 # ============================================================
 # ➕ Adicionar Empreendimento
 # ============================================================
@@ -95,7 +105,7 @@ with st.form("add_empreendimento"):
     if submitted:
         try:
             # 1) Se houver PDF, sobe antes e pega a URL
-            link_pdf_url = upload_pdf_and_get_url(pdf_file, nome)
+            link_pdf_url = upload_pdf_and_get_url(pdf_file)
 
             # 2) Insere incluindo link_pdf (se houver)
             insert_data("mais_emp_empreendimentos", {
@@ -112,17 +122,20 @@ with st.form("add_empreendimento"):
         except Exception as e:
             st.error(f"Erro ao inserir: {e}")
 
+# Seleção com busca no servidor (só os primeiros resultados vêm)
+def pick_emp(key):
+    return record_picker(
+        key, "Selecione", "mais_emp_empreendimentos", ("id_empreendimento", "nome"),
+        format_func=lambda x: x.get("nome") or "", search_columns=["nome", "localizacao"],
+        order_by="nome", record_columns=EMP_COLS,
+    )
+
 # ============================================================
 # ✏️ Editar Empreendimento
 # ============================================================
 st.markdown("### ✏️ Editar Empreendimento")
-if not emps.empty:
-    selected = st.selectbox(
-        "Selecione",
-        emps.to_dict("records"),
-        format_func=lambda x: x.get("nome", ""),
-        key="edit_select"  # evita StreamlitDuplicateElementId
-    )
+selected = pick_emp("edit_select") if not emps.empty else None  # keys distintas evitam StreamlitDuplicateElementId
+if selected:
     with st.form("edit_empreendimento"):
         nome_ed = st.text_input("Nome", selected.get("nome") or "", key="edit_nome")
         localizacao_ed = st.text_input("Localização", selected.get("localizacao") or "", key="edit_localizacao")
@@ -145,44 +158,48 @@ if not emps.empty:
 
                 # Se um novo PDF foi anexado, sobe e atualiza o link_pdf
                 if pdf_file_ed is not None:
-                    link_pdf_new = upload_pdf_and_get_url(pdf_file_ed, nome_ed or selected.get("nome") or "arquivo")
+                    link_pdf_new = upload_pdf_and_get_url(pdf_file_ed)
                     if link_pdf_new:
                         payload["link_pdf"] = link_pdf_new
 
-                update_data("mais_emp_empreendimentos", "id_empreendimento", selected["id_empreendimento"], payload)
+                saved = update_data("mais_emp_empreendimentos", "id_empreendimento", selected["id_empreendimento"], payload, current=selected)
 
-                st.success("✅ Empreendimento atualizado com sucesso!")
-                rerun()
+                if saved:
+                    if payload.get("link_pdf") and payload["link_pdf"] != selected.get("link_pdf"):
+                        release_pdf(selected.get("link_pdf"))
+                    st.success("✅ Empreendimento atualizado com sucesso!")
+                    rerun()
+                else:
+                    st.warning("⚠️ Nenhuma alteração gravada. Verifique RLS/permissões.")
             except Exception as e:
                 st.error(f"Erro ao atualizar: {e}")
-else:
+elif emps.empty:
     st.info("Nenhum empreendimento para editar.")
 
 # ============================================================
 # 🗑️ Excluir Empreendimento
 # ============================================================
 st.markdown("### 🗑️ Excluir Empreendimento")
-if not emps.empty:
-    selected_del = st.selectbox(
-        "Selecione",
-        emps.to_dict("records"),
-        format_func=lambda x: x.get("nome", ""),
-        key="delete_select"  # evita IDs duplicados
-    )
+selected_del = pick_emp("delete_select") if not emps.empty else None
+if selected_del:
     confirm = st.checkbox("Confirmo a exclusão deste empreendimento.", key="delete_confirm")
     if st.button("Excluir Empreendimento", disabled=not confirm, key="delete_btn"):
         try:
-            delete_data("mais_emp_empreendimentos", "id_empreendimento", selected_del["id_empreendimento"])
-            after = pd.DataFrame(get_table_data("mais_emp_empreendimentos"))
-            if not after.empty and "id_empreendimento" in after.columns and str(selected_del["id_empreendimento"]) in set(after["id_empreendimento"].astype(str)):
+            result = delete_rows("mais_emp_empreendimentos", "id_empreendimento", [selected_del["id_empreendimento"]])
+            if result.error:
+                st.error(f"Erro ao excluir (possível vínculo em Leads): {result.error}")
+            elif result.blocked:
                 st.warning(
                     "⚠️ Exclusão solicitada, mas o registro ainda existe. "
                     "Se houver Leads vinculados, configure FK como ON DELETE SET NULL/CASCADE, ou remova/reatribua os Leads."
                 )
             else:
+                release_pdf(selected_del.get("link_pdf"))
                 st.success("✅ Empreendimento excluído com sucesso!")
                 rerun()
         except Exception as e:
             st.error(f"Erro ao excluir (possível vínculo em Leads): {e}")
-else:
+elif emps.empty:
     st.info("Nenhum empreendimento para excluir.")
+
+metrics.end_page()
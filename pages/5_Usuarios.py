@@ -1,6 +1,15 @@
 import streamlit as st
-import pandas as pd
-from utils.supabase_client import get_table_data
+from utils.supabase_client import clear_cache
+from utils.snapshot import load_table
+from utils.live import start_change_feed
+from utils import metrics
+from utils.export import export_panel
+from utils.search import SEARCH_MAX_IDS, combine, rank, search, search_filters
+
+# Mudanças feitas por outros usuários chegam por push (uma vez por processo)
+start_change_feed()
+# Trace do rerun (painel de desempenho: PERF_PANEL=1)
+metrics.begin_page("usuarios")
 
 st.title("👤 Usuários")
 st.subheader("Lista de usuários Mais Empreendimentos")
@@ -14,35 +23,45 @@ def rerun():
 colA, _ = st.columns([1, 3])
 with colA:
     if st.button("🔄 Atualizar"):
+        clear_cache("mais_emp_usuarios")
         rerun()
 
-usuarios = pd.DataFrame(get_table_data("mais_emp_usuarios"))
-for c in ["id_usuario", "nome", "telefone", "email", "created_at"]:
-    if c not in usuarios.columns:
-        usuarios[c] = None
-
 st.markdown("### 🔎 Filtros")
 col1, col2 = st.columns(2)
 filtro_nome = col1.text_input("Nome")
 filtro_email = col2.text_input("E-mail")
 
-df = usuarios.copy()
-if filtro_nome:
-    df = df[df["nome"].astype(str).str.contains(filtro_nome, case=False, na=False)]
-if filtro_email:
-    df = df[df["email"].astype(str).str.contains(filtro_email, case=False, na=False)]
+# Busca no índice local (sem acento, tolera erro de digitação), em ordem
+# de relevância; nome e e-mail juntos precisam bater os dois. Só os
+# SEARCH_MAX_IDS mais parecidos viram filtro (a lista de ids vai na URL)
+USER_COLS = ("id_usuario", "nome", "telefone", "email", "created_at")
+encontrados = combine(
+    search("mais_emp_usuarios", filtro_nome, ("nome",), limit=None),
+    search("mais_emp_usuarios", filtro_email, ("email",), limit=None),
+)
+if encontrados is not None and len(encontrados) > SEARCH_MAX_IDS:
+    encontrados = encontrados[:SEARCH_MAX_IDS]
+    st.caption(f"Mostrando os {SEARCH_MAX_IDS} usuários mais parecidos; refine a busca para ver outros.")
+df = rank(load_table("mais_emp_usuarios", columns=USER_COLS), "id_usuario", encontrados)
+filtros = search_filters("mais_emp_usuarios", encontrados)
 
 # Tabela amigável (sem IDs) + datas
-df_show = df.rename(columns={
-    "nome": "Nome",
-    "telefone": "Telefone",
-    "email": "E-mail",
-    "created_at": "Criado em"
-})
-if not df_show.empty:
-    try:
-        df_show["Criado em"] = pd.to_datetime(df_show["Criado em"], errors="coerce").dt.strftime("%d/%m/%Y")
-    except Exception:
-        pass
+def show_users(df):
+    return df.rename(columns={
+        "nome": "Nome",
+        "telefone": "Telefone",
+        "email": "E-mail",
+        "created_at": "Criado em"
+    })
+
+df_show = show_users(df)
+# Datas já vêm tipadas; o formato é aplicado só na exibição
+st.dataframe(
+    df_show[["Nome", "Telefone", "E-mail", "Criado em"]] if not df_show.empty else df_show,
+    column_config={"Criado em": st.column_config.DatetimeColumn("Criado em", format="DD/MM/YYYY")},
+)
+
+export_panel("usuarios", "mais_emp_usuarios", USER_COLS, filters=filtros,
+             prepare=lambda df: show_users(df)[["Nome", "Telefone", "E-mail", "Criado em"]], file_stem="usuarios")
 
-st.dataframe(df_show[["Nome", "Telefone", "E-mail", "Criado em"]] if not df_show.empty else df_show)
+metrics.end_page()
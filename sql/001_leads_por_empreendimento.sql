@@ -0,0 +1,14 @@
+-- Total de leads por empreendimento (uma linha por empreendimento).
+-- Usada pela página Resumo para não baixar a tabela de leads inteira.
+create or replace view public.mais_emp_leads_por_empreendimento
+with (security_invoker = true) as
+select
+    e.id_empreendimento,
+    coalesce(e.nome, 'Sem vínculo') as empreendimento,
+    count(*) as leads
+from public.mais_emp_lead l
+left join public.mais_emp_empreendimentos e
+    on e.id_empreendimento = l.id_empreendimento
+group by e.id_empreendimento, coalesce(e.nome, 'Sem vínculo');
+
+grant select on public.mais_emp_leads_por_empreendimento to anon, authenticated;
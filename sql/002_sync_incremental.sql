@@ -0,0 +1,61 @@
+-- Suporte à sincronização incremental (utils/snapshot.py):
+--   * updated_at em todas as tabelas, mantido por trigger;
+--   * mais_emp_exclusoes guarda o id de cada linha apagada (tombstone).
+
+create or replace function public.mais_emp_set_updated_at()
+returns trigger language plpgsql as $$
+begin
+    new.updated_at := now();
+    return new;
+end $$;
+
+create table if not exists public.mais_emp_exclusoes (
+    id bigserial primary key,
+    tabela text not null,
+    id_registro text not null,
+    excluido_em timestamptz not null default now()
+);
+create index if not exists mais_emp_exclusoes_tabela_excluido_em
+    on public.mais_emp_exclusoes (tabela, excluido_em);
+
+alter table public.mais_emp_exclusoes enable row level security;
+drop policy if exists mais_emp_exclusoes_leitura on public.mais_emp_exclusoes;
+create policy mais_emp_exclusoes_leitura on public.mais_emp_exclusoes for select using (true);
+grant select on public.mais_emp_exclusoes to anon, authenticated;
+
+create or replace function public.mais_emp_registrar_exclusao()
+returns trigger language plpgsql security definer as $$
+begin
+    insert into public.mais_emp_exclusoes (tabela, id_registro)
+    values (tg_table_name, to_jsonb(old) ->> tg_argv[0]);
+    return old;
+end $$;
+
+do $$
+declare
+    t record;
+begin
+    for t in
+        select * from (values
+            ('mais_emp_usuarios', 'id_usuario'),
+            ('mais_emp_empreendimentos', 'id_empreendimento'),
+            ('mais_emp_lead', 'id_lead'),
+            ('mais_emp_agendamento', 'id_agendamento')
+        ) as v(tabela, pk)
+    loop
+        execute format('alter table public.%I add column if not exists updated_at timestamptz not null default now()', t.tabela);
+        execute format('create index if not exists %I on public.%I (updated_at)', t.tabela || '_updated_at', t.tabela);
+
+        execute format('drop trigger if exists %I on public.%I', t.tabela || '_updated_at', t.tabela);
+        execute format(
+            'create trigger %I before update on public.%I for each row execute function public.mais_emp_set_updated_at()',
+            t.tabela || '_updated_at', t.tabela
+        );
+
+        execute format('drop trigger if exists %I on public.%I', t.tabela || '_exclusao', t.tabela);
+        execute format(
+            'create trigger %I after delete on public.%I for each row execute function public.mais_emp_registrar_exclusao(%L)',
+            t.tabela || '_exclusao', t.tabela, t.pk
+        );
+    end loop;
+end $$;
@@ -0,0 +1,15 @@
+-- Publica as tabelas no Supabase Realtime (utils/live.py).
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['mais_emp_usuarios', 'mais_emp_empreendimentos', 'mais_emp_lead', 'mais_emp_agendamento']
+    loop
+        if not exists (
+            select 1 from pg_publication_tables
+            where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = t
+        ) then
+            execute format('alter publication supabase_realtime add table public.%I', t);
+        end if;
+    end loop;
+end $$;
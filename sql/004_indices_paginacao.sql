@@ -0,0 +1,13 @@
+-- Índices da listagem paginada (utils/grid.py): cada página é
+-- "order by <coluna> nulls last, <pk> limit n" a partir do último (valor, pk),
+-- então cada ordenação oferecida nas telas tem um índice composto.
+
+create index if not exists mais_emp_lead_created_at_pagina
+    on public.mais_emp_lead (created_at, id_lead);
+create index if not exists mais_emp_lead_nome_pagina
+    on public.mais_emp_lead (nome, id_lead);
+
+create index if not exists mais_emp_agendamento_data_pagina
+    on public.mais_emp_agendamento (data, id_agendamento);
+create index if not exists mais_emp_agendamento_created_at_pagina
+    on public.mais_emp_agendamento (created_at, id_agendamento);
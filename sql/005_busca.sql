@@ -0,0 +1,88 @@
+-- Busca sem acento e tolerante a erros de digitação no servidor
+-- (SEARCH_BACKEND=pg_trgm, utils/search.py). No Supabase as extensões
+-- ficam no schema "extensions".
+
+create extension if not exists pg_trgm with schema extensions;
+create extension if not exists unaccent with schema extensions;
+
+-- unaccent() não é immutable (depende do dicionário configurado); fixando
+-- o dicionário dá para usar a função em índices.
+create or replace function public.mais_emp_fold(texto text)
+returns text
+language sql
+immutable
+parallel safe
+as $$
+    select trim(regexp_replace(
+        lower(extensions.unaccent('extensions.unaccent'::regdictionary, coalesce(texto, ''))),
+        '[^0-9a-z]+', ' ', 'g'
+    ))
+$$;
+
+-- Índices de trigramas nas colunas buscadas pelas telas: uma por coluna de
+-- SEARCH_COLUMNS (utils/search.py); coluna buscada sem índice vira seq scan
+create index if not exists mais_emp_lead_nome_busca
+    on public.mais_emp_lead using gin (public.mais_emp_fold(nome) extensions.gin_trgm_ops);
+create index if not exists mais_emp_usuarios_nome_busca
+    on public.mais_emp_usuarios using gin (public.mais_emp_fold(nome) extensions.gin_trgm_ops);
+create index if not exists mais_emp_usuarios_email_busca
+    on public.mais_emp_usuarios using gin (public.mais_emp_fold(email) extensions.gin_trgm_ops);
+create index if not exists mais_emp_empreendimentos_nome_busca
+    on public.mais_emp_empreendimentos using gin (public.mais_emp_fold(nome) extensions.gin_trgm_ops);
+create index if not exists mais_emp_empreendimentos_localizacao_busca
+    on public.mais_emp_empreendimentos using gin (public.mais_emp_fold(localizacao) extensions.gin_trgm_ops);
+
+-- Chaves (como texto) e nota (word_similarity) das linhas parecidas com o
+-- termo, da mais para a menos relevante. Só tabelas/colunas conhecidas.
+create or replace function public.mais_emp_buscar(
+    p_tabela text,
+    p_colunas text[],
+    p_termo text,
+    p_limite integer default 500,
+    p_limiar real default 0.4
+)
+returns table (id text, score real)
+language plpgsql
+stable
+as $$
+declare
+    chave text;
+    coluna text;
+    notas text[] := '{}';
+    condicoes text[] := '{}';
+begin
+    chave := case p_tabela
+        when 'mais_emp_lead' then 'id_lead'
+        when 'mais_emp_usuarios' then 'id_usuario'
+        when 'mais_emp_empreendimentos' then 'id_empreendimento'
+    end;
+    if chave is null then
+        raise exception 'tabela sem busca: %', p_tabela;
+    end if;
+
+    foreach coluna in array p_colunas loop
+        if not exists (
+            select 1 from information_schema.columns c
+            where c.table_schema = 'public' and c.table_name = p_tabela and c.column_name = coluna
+        ) then
+            raise exception 'coluna desconhecida: %.%', p_tabela, coluna;
+        end if;
+        notas := notas || format('extensions.word_similarity(b.termo, public.mais_emp_fold(%I::text))', coluna);
+        -- <% usa o índice gin_trgm_ops quando a coluna tem um
+        condicoes := condicoes || format('b.termo operator(extensions.<%%) public.mais_emp_fold(%I::text)', coluna);
+    end loop;
+    if array_length(notas, 1) is null then
+        return;
+    end if;
+
+    perform set_config('pg_trgm.word_similarity_threshold', p_limiar::text, true);
+    return query execute format(
+        'select t.%I::text, greatest(%s)::real as score
+           from public.%I t, (select public.mais_emp_fold($1) as termo) b
+          where %s
+          order by score desc, t.%I
+          limit $2',
+        chave, array_to_string(notas, ', '), p_tabela, array_to_string(condicoes, ' or '), chave
+    ) using p_termo, p_limite;
+end;
+$$;
@@ -0,0 +1,169 @@
+-- Agregados diários para as tendências do Resumo (utils/rollups.py):
+--   * mais_emp_rollup_leads: leads por dia × empreendimento × potencial
+--     (dia = created_at no fuso de São Paulo);
+--   * mais_emp_rollup_agendamentos: agendamentos por dia × tipo × status
+--     (dia = coluna data).
+-- Triggers de instrução com tabelas de transição mantêm os totais: um
+-- insert/update/delete de N linhas vira um único upsert agrupado. Um update
+-- que não muda dia/grupo soma +1 e -1 na mesma chave e não grava nada.
+
+create table if not exists public.mais_emp_rollup_leads (
+    chave text primary key,  -- dia|id_empreendimento|potencial
+    dia date not null,
+    id_empreendimento bigint,
+    potencial text,
+    leads bigint not null default 0,
+    updated_at timestamptz not null default now()
+);
+create index if not exists mais_emp_rollup_leads_updated_at on public.mais_emp_rollup_leads (updated_at);
+create index if not exists mais_emp_rollup_leads_dia on public.mais_emp_rollup_leads (dia);
+
+create table if not exists public.mais_emp_rollup_agendamentos (
+    chave text primary key,  -- dia|tipo_evento|status
+    dia date not null,
+    tipo_evento text,
+    status text,
+    agendamentos bigint not null default 0,
+    updated_at timestamptz not null default now()
+);
+create index if not exists mais_emp_rollup_agendamentos_updated_at on public.mais_emp_rollup_agendamentos (updated_at);
+create index if not exists mais_emp_rollup_agendamentos_dia on public.mais_emp_rollup_agendamentos (dia);
+
+-- Somam ``delta`` (linhas {dia, grupo..., n}) nos totais
+create or replace function public.mais_emp_rollup_leads_somar(delta jsonb)
+returns void language sql security definer as $$
+    insert into public.mais_emp_rollup_leads as r (chave, dia, id_empreendimento, potencial, leads)
+    select concat_ws('|', d.dia, coalesce(d.id_empreendimento::text, ''), coalesce(d.potencial, '')),
+           d.dia, d.id_empreendimento, d.potencial, sum(d.n)
+    from jsonb_to_recordset(delta) as d(dia date, id_empreendimento bigint, potencial text, n bigint)
+    where d.dia is not null
+    group by d.dia, d.id_empreendimento, d.potencial
+    having sum(d.n) <> 0
+    on conflict (chave) do update set leads = r.leads + excluded.leads, updated_at = now();
+$$;
+
+create or replace function public.mais_emp_rollup_agendamentos_somar(delta jsonb)
+returns void language sql security definer as $$
+    insert into public.mais_emp_rollup_agendamentos as r (chave, dia, tipo_evento, status, agendamentos)
+    select concat_ws('|', d.dia, coalesce(d.tipo_evento, ''), coalesce(d.status, '')),
+           d.dia, d.tipo_evento, d.status, sum(d.n)
+    from jsonb_to_recordset(delta) as d(dia date, tipo_evento text, status text, n bigint)
+    where d.dia is not null
+    group by d.dia, d.tipo_evento, d.status
+    having sum(d.n) <> 0
+    on conflict (chave) do update set agendamentos = r.agendamentos + excluded.agendamentos, updated_at = now();
+$$;
+
+-- As tabelas de transição só existem para os eventos do trigger: cada
+-- consulta fica no ramo do tg_op correspondente.
+create or replace function public.mais_emp_rollup_leads_trigger()
+returns trigger language plpgsql security definer as $$
+declare
+    delta jsonb := '[]';
+begin
+    if tg_op in ('INSERT', 'UPDATE') then
+        select delta || coalesce(jsonb_agg(jsonb_build_object(
+            'dia', (created_at at time zone 'America/Sao_Paulo')::date,
+            'id_empreendimento', id_empreendimento, 'potencial', potencial, 'n', 1)), '[]')
+        into delta from novos;
+    end if;
+    if tg_op in ('UPDATE', 'DELETE') then
+        select delta || coalesce(jsonb_agg(jsonb_build_object(
+            'dia', (created_at at time zone 'America/Sao_Paulo')::date,
+            'id_empreendimento', id_empreendimento, 'potencial', potencial, 'n', -1)), '[]')
+        into delta from antigos;
+    end if;
+    perform public.mais_emp_rollup_leads_somar(delta);
+    return null;
+end $$;
+
+create or replace function public.mais_emp_rollup_agendamentos_trigger()
+returns trigger language plpgsql security definer as $$
+declare
+    delta jsonb := '[]';
+begin
+    if tg_op in ('INSERT', 'UPDATE') then
+        select delta || coalesce(jsonb_agg(jsonb_build_object(
+            'dia', data, 'tipo_evento', tipo_evento, 'status', status, 'n', 1)), '[]')
+        into delta from novos;
+    end if;
+    if tg_op in ('UPDATE', 'DELETE') then
+        select delta || coalesce(jsonb_agg(jsonb_build_object(
+            'dia', data, 'tipo_evento', tipo_evento, 'status', status, 'n', -1)), '[]')
+        into delta from antigos;
+    end if;
+    perform public.mais_emp_rollup_agendamentos_somar(delta);
+    return null;
+end $$;
+
+do $$
+declare
+    t record;
+begin
+    for t in
+        select * from (values
+            ('mais_emp_lead', 'mais_emp_rollup_leads_trigger'),
+            ('mais_emp_agendamento', 'mais_emp_rollup_agendamentos_trigger')
+        ) as v(tabela, funcao)
+    loop
+        execute format('drop trigger if exists %I on public.%I', t.tabela || '_rollup_insert', t.tabela);
+        execute format(
+            'create trigger %I after insert on public.%I referencing new table as novos '
+            'for each statement execute function public.%I()',
+            t.tabela || '_rollup_insert', t.tabela, t.funcao
+        );
+        execute format('drop trigger if exists %I on public.%I', t.tabela || '_rollup_update', t.tabela);
+        execute format(
+            'create trigger %I after update on public.%I referencing old table as antigos new table as novos '
+            'for each statement execute function public.%I()',
+            t.tabela || '_rollup_update', t.tabela, t.funcao
+        );
+        execute format('drop trigger if exists %I on public.%I', t.tabela || '_rollup_delete', t.tabela);
+        execute format(
+            'create trigger %I after delete on public.%I referencing old table as antigos '
+            'for each statement execute function public.%I()',
+            t.tabela || '_rollup_delete', t.tabela, t.funcao
+        );
+    end loop;
+end $$;
+
+-- Carga inicial (rodar o script de novo recalcula tudo). O lock segura
+-- escritas nas tabelas de origem até o fim da transação.
+begin;
+lock table public.mais_emp_lead, public.mais_emp_agendamento in share row exclusive mode;
+truncate public.mais_emp_rollup_leads, public.mais_emp_rollup_agendamentos;
+select public.mais_emp_rollup_leads_somar(coalesce(jsonb_agg(jsonb_build_object(
+    'dia', dia, 'id_empreendimento', id_empreendimento, 'potencial', potencial, 'n', n)), '[]'))
+from (
+    select (created_at at time zone 'America/Sao_Paulo')::date as dia, id_empreendimento, potencial, count(*) as n
+    from public.mais_emp_lead
+    group by 1, 2, 3
+) as g;
+select public.mais_emp_rollup_agendamentos_somar(coalesce(jsonb_agg(jsonb_build_object(
+    'dia', data, 'tipo_evento', tipo_evento, 'status', status, 'n', n)), '[]'))
+from (
+    select data, tipo_evento, status, count(*) as n
+    from public.mais_emp_agendamento
+    group by 1, 2, 3
+) as g;
+commit;
+
+-- Leitura pela API (como as demais tabelas) e push pelo Realtime (utils/live.py)
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['mais_emp_rollup_leads', 'mais_emp_rollup_agendamentos']
+    loop
+        execute format('alter table public.%I enable row level security', t);
+        execute format('drop policy if exists %I on public.%I', t || '_leitura', t);
+        execute format('create policy %I on public.%I for select using (true)', t || '_leitura', t);
+        execute format('grant select on public.%I to anon, authenticated', t);
+        if not exists (
+            select 1 from pg_publication_tables
+            where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = t
+        ) then
+            execute format('alter publication supabase_realtime add table public.%I', t);
+        end if;
+    end loop;
+end $$;
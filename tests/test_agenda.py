@@ -0,0 +1,44 @@
+from datetime import date, time
+
+import pandas as pd
+
+from utils.agenda import ConflictIndex, overlapping
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=["id_agendamento", "id_usuario", "data", "horario"])
+
+
+def test_conflicts_with_null_id_usuario():
+    # Um agendamento sem usuário deixa a coluna em float64 (3 vira 3.0)
+    frame = _frame([
+        (1, 3, "2025-07-01", "10:00:00"),
+        (2, None, "2025-07-01", "10:00:00"),
+        (3, 4, "2025-07-01", "10:30:00"),
+    ])
+    assert frame["id_usuario"].dtype == "float64"
+    index = ConflictIndex(frame, version=1)
+    start = pd.Timestamp.combine(date(2025, 7, 1), time(10, 30))
+    assert index.conflicts(3, start) == [1]
+    assert index.conflicts("3", start) == [1]
+    assert index.conflicts(4, start) == [3]
+
+
+def test_apply_keeps_user_keys_consistent():
+    frame = _frame([(1, 3, "2025-07-01", "10:00:00"), (2, None, "2025-07-02", "09:00:00")])
+    index = ConflictIndex(frame, version=1)
+    index.apply("INSERT", {"id_agendamento": 5, "id_usuario": 3, "data": "2025-07-01", "horario": "11:30:00"})
+    index.apply("UPDATE", {"id_agendamento": 2, "id_usuario": 3.0, "data": "2025-07-01", "horario": "12:00:00"})
+    start = pd.Timestamp.combine(date(2025, 7, 1), time(11, 45))
+    assert sorted(index.conflicts(3, start)) == [2, 5]
+    index.apply("DELETE", old={"id_agendamento": 5})
+    assert index.conflicts(3, start) == [2]
+
+
+def test_overlapping_ignores_rows_without_user():
+    frame = _frame([
+        (1, 3, "2025-07-01", "10:00:00"),
+        (2, None, "2025-07-01", "10:00:00"),
+        (3, 3, "2025-07-01", "10:30:00"),
+    ])
+    assert overlapping(frame).tolist() == [True, False, True]
@@ -0,0 +1,252 @@
+import bisect
+import os
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils import metrics
+from utils.snapshot import get_snapshot
+from utils.supabase_client import Filters, get_table_df, on_change
+
+# Agenda: visão de semana/mês (só a janela visível é pedida ao Supabase) e
+# detecção de choque de horário por usuário. Cada agendamento ocupa
+# [data + horário, + AGENDA_DURACAO_MIN).
+TABLE = "mais_emp_agendamento"
+DURATION = pd.Timedelta(minutes=int(os.getenv("AGENDA_DURACAO_MIN", "60")))
+VIEWS = ("Semana", "Mês")
+WEEKDAYS = ("Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom")
+# Eventos listados por dia na visão de mês (o resto vira "+N")
+MONTH_CELL_EVENTS = 3
+
+
+def window(view, anchor):
+    """(primeiro, último) dia da semana (segunda a domingo) ou do mês de ``anchor``."""
+    if view == "Semana":
+        start = anchor - timedelta(days=anchor.weekday())
+        return start, start + timedelta(days=6)
+    start = anchor.replace(day=1)
+    return start, (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+
+def load_window(start, end, columns, filters=None):
+    """Agendamentos com ``data`` entre ``start`` e ``end`` (intervalo no servidor, índice de sql/004)."""
+    filters = filters if filters is not None else Filters()
+    return get_table_df(TABLE, columns=columns, filters=filters.between("data", start, end))
+
+
+def starts_of(df):
+    """Início de cada agendamento (data + horário) como datetime64; NaT se faltar algum."""
+    if df.empty:
+        return pd.Series([], dtype="datetime64[ns]")
+    day = pd.to_datetime(df["data"], errors="coerce")
+    hour = pd.to_timedelta(df["horario"].astype("string"), errors="coerce")
+    return day + hour
+
+
+def _user_key(value):
+    # Chave do usuário como texto do inteiro: 3, 3.0 (coluna com nulos vira
+    # float64) e "3" caem na mesma lista
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _user_keys(values):
+    numeric = pd.to_numeric(values, errors="coerce")
+    if numeric.notna().sum() == values.notna().sum():
+        return numeric.astype("Int64").astype(str)
+    return values.map(_user_key)
+
+
+class ConflictIndex:
+    """Intervalos de cada usuário ordenados pelo início.
+
+    Com duração fixa, um horário novo [início, fim) só choca com
+    agendamentos que começam em (início - duração, fim): duas buscas
+    binárias na lista do usuário, O(log n) sem varrer a tabela. Montado
+    uma vez a partir do snapshot; depois cada escrita entra ou sai com
+    ``apply`` (``bisect.insort`` na lista do usuário).
+    """
+
+    def __init__(self, frame, version=None, duration=DURATION):
+        self.version = version
+        self.duration = duration
+        self.lock = threading.Lock()
+        self._users = {}   # usuário → ([inícios em ns, ordenados], [ids na mesma ordem])
+        self._where = {}   # id → (usuário, início em ns)
+        if frame.empty:
+            return
+        starts = starts_of(frame)
+        valid = starts.notna() & frame["id_usuario"].notna()
+        users = _user_keys(frame["id_usuario"][valid]).to_numpy(dtype=object)
+        ids = frame["id_agendamento"][valid].to_numpy()
+        values = starts[valid].to_numpy(dtype="datetime64[ns]").view("int64")
+        order = np.lexsort((values, users))
+        users, ids, values = users[order], ids[order], values[order]
+        bounds = np.flatnonzero(users[1:] != users[:-1]) + 1
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(users)]):
+            if hi > lo:
+                user_values, user_ids = values[lo:hi].tolist(), ids[lo:hi].tolist()
+                self._users[users[lo]] = (user_values, user_ids)
+                for key, value in zip(user_ids, user_values):
+                    self._where[str(key)] = (users[lo], value)
+
+    def _remove(self, key):
+        user, value = self._where.pop(str(key), (None, None))
+        if user is None:
+            return
+        values, ids = self._users[user]
+        pos = bisect.bisect_left(values, value)
+        while pos < len(values) and values[pos] == value:
+            if str(ids[pos]) == str(key):
+                del values[pos], ids[pos]
+                break
+            pos += 1
+
+    def _add(self, key, user_id, start):
+        user, value = _user_key(user_id), pd.Timestamp(start).value
+        values, ids = self._users.setdefault(user, ([], []))
+        pos = bisect.bisect_right(values, value)
+        values.insert(pos, value)
+        ids.insert(pos, key)
+        self._where[str(key)] = (user, value)
+
+    def apply(self, event, new=None, old=None):
+        """Atualiza o intervalo de um agendamento escrito (INSERT/UPDATE/DELETE)."""
+        row = {**(old or {}), **(new or {})}
+        key = row.get("id_agendamento")
+        if key is None:
+            return
+        with self.lock:
+            self._remove(key)
+            if event == "DELETE" or row.get("id_usuario") is None:
+                return
+            start = starts_of(pd.DataFrame([{"data": row.get("data"), "horario": row.get("horario")}])).iloc[0]
+            if not pd.isna(start):
+                self._add(key, row["id_usuario"], start)
+
+    def conflicts(self, user_id, start, exclude=None):
+        """Ids dos agendamentos do usuário que se sobrepõem a ``start`` (+ duração)."""
+        if user_id is None or start is None or pd.isna(start):
+            return []
+        start = pd.Timestamp(start).value
+        with self.lock:
+            found = self._users.get(_user_key(user_id))
+            if found is None:
+                return []
+            values, ids = found
+            lo = bisect.bisect_right(values, start - self.duration.value)
+            hi = bisect.bisect_left(values, start + self.duration.value)
+            hits = ids[lo:hi]
+        return [i for i in hits if exclude is None or str(i) != str(exclude)]
+
+
+def overlapping(df, duration=DURATION):
+    """Máscara das linhas que chocam com outra do mesmo usuário (vetorizado, para a janela)."""
+    if df.empty:
+        return pd.Series([], dtype=bool, index=df.index)
+    key = pd.DataFrame({"user": df["id_usuario"].astype("string"), "start": starts_of(df)}, index=df.index)
+    key = key.dropna().sort_values(["user", "start"])
+    same_user = key["user"].eq(key["user"].shift())
+    close = (key["start"] - key["start"].shift()) < duration
+    hit = same_user & close
+    mask = hit | hit.shift(-1, fill_value=False)
+    return mask.reindex(df.index, fill_value=False)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_conflict_index():
+    """Índice de choques para a versão atual do snapshot de agendamentos."""
+    global _index
+    snap = get_snapshot(TABLE)
+    snap.sync()
+    frame, version = snap.current()
+    with _index_lock:
+        if _index is not None and _index.version == version:
+            return _index
+    with metrics.stage("conflict_index", TABLE, rows=len(frame)):
+        index = ConflictIndex(frame, version)
+    with _index_lock:
+        _index = index
+    return index
+
+
+def _on_change(table_name, event, new, old):
+    # Escrita (deste processo ou do feed realtime) já aplicada no snapshot:
+    # o índice acompanha a versão sem ser remontado. Se ele já estava atrás
+    # (delta sincronizado por outro caminho), a próxima leitura remonta.
+    if table_name != TABLE:
+        return
+    with _index_lock:
+        index = _index
+    if index is None:
+        return
+    version = get_snapshot(TABLE).version  # sem aplicar as pendências do snapshot
+    if index.version == version - 1:
+        index.apply(event, new, old)
+        index.version = version
+
+
+on_change(_on_change)
+
+
+def check_conflicts(user_id, day, hour, exclude=None):
+    """Agendamentos do usuário que chocam com ``day`` + ``hour`` (ids)."""
+    if user_id is None or day is None or hour is None:
+        return []
+    start = pd.Timestamp.combine(day, hour)
+    return get_conflict_index().conflicts(user_id, start, exclude=exclude)
+
+
+# ---------------- Exibição ----------------
+def _event_line(row, conflict):
+    hour = str(row.get("horario") or "")[:5]
+    done = " ✓" if row.get("status") == "realizada" else ""
+    warn = " ⚠️" if conflict else ""
+    return f"**{hour}** {row.get('tipo_evento') or ''} · {row.get('Cliente') or '—'}{done}{warn}"
+
+
+def calendar_view(df, start, end, view):
+    """Desenha a semana ou o mês (``df`` já com a coluna ``Cliente``); ⚠️ marca choques."""
+    today = date.today()
+    flags = overlapping(df)
+    by_day = {}
+    if not df.empty:
+        days = pd.to_datetime(df["data"], errors="coerce").dt.date
+        ordered = df.assign(_day=days, _conflict=flags).sort_values(["_day", "horario"], na_position="last")
+        for row in ordered.to_dict("records"):
+            by_day.setdefault(row["_day"], []).append(_event_line(row, row["_conflict"]))
+
+    if int(flags.sum()):
+        st.warning(f"⚠️ {int(flags.sum())} agendamento(s) com choque de horário no período.")
+
+    def cell(container, day, limit=None):
+        title = f"**{WEEKDAYS[day.weekday()]} {day:%d/%m}**" if view == "Semana" else f"**{day.day}**"
+        if day == today:
+            title += " 🔵"
+        lines = by_day.get(day, [])
+        shown = lines if limit is None else lines[:limit]
+        extra = f"\n\n+{len(lines) - len(shown)}" if len(lines) > len(shown) else ""
+        container.markdown("\n\n".join([title, *shown]) + extra)
+
+    if view == "Semana":
+        for i, col in enumerate(st.columns(7)):
+            cell(col, start + timedelta(days=i))
+        return
+
+    header = st.columns(7)
+    for col, name in zip(header, WEEKDAYS):
+        col.markdown(f"**{name}**")
+    first = start - timedelta(days=start.weekday())
+    while first <= end:
+        for i, col in enumerate(st.columns(7)):
+            day = first + timedelta(days=i)
+            if start <= day <= end:
+                cell(col, day, limit=MONTH_CELL_EVENTS)
+        first += timedelta(days=7)
@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Tempo de vida (segundos) de cada tabela no cache.
+# Tabelas de dimensão mudam pouco; agendamentos mudam o dia inteiro.
+DEFAULT_TTL = 60
+TABLE_TTL = {
+    "mais_emp_usuarios": 300,
+    "mais_emp_empreendimentos": 300,
+    "mais_emp_lead": 60,
+    "mais_emp_agendamento": 30,
+}
+
+# Depois de vencido, o valor ainda é servido por esta janela enquanto
+# uma thread em segundo plano busca a versão nova (stale-while-revalidate).
+STALE_WINDOW = 120
+
+# Limite de consultas distintas guardadas (descarta a menos usada).
+MAX_ENTRIES = 256
+
+
+class _Entry:
+    __slots__ = ("table", "value", "stored_at", "ttl", "refreshing")
+
+    def __init__(self, table, value, ttl):
+        self.table = table
+        self.value = value
+        self.stored_at = time.monotonic()
+        self.ttl = ttl
+        self.refreshing = False
+
+
+class TableCache:
+    """Cache compartilhado pelo processo inteiro (todas as sessões do Streamlit).
+
+    Leituras iguais que chegam juntas (mesma chave e mesma geração) esperam
+    uma única carga (single-flight). Se a carga falhar com um erro aceito
+    por ``fallback_on(exc)``, devolve o último valor bom da chave, mesmo
+    vencido ou invalidado, e avisa ``on_fallback(key, table, age, exc)``.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, default_ttl=DEFAULT_TTL, table_ttl=None, stale_window=STALE_WINDOW,
+                 fallback_on=None, on_fallback=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.table_ttl = dict(TABLE_TTL if table_ttl is None else table_ttl)
+        self.stale_window = stale_window
+        self.fallback_on = fallback_on
+        self.on_fallback = on_fallback
+        self._entries = OrderedDict()
+        # Geração por tabela: muda a cada escrita, para descartar leituras
+        # que começaram antes da escrita e terminaram depois dela.
+        self._generations = {}
+        # Cargas em andamento: (chave, geração) -> Future
+        self._inflight = {}
+        # Último valor bom de cada chave (sobrevive a invalidate): reserva
+        # para quando o servidor estiver fora
+        self._last_good = OrderedDict()
+        self._lock = threading.RLock()
+
+    def ttl_for(self, table):
+        return self.table_ttl.get(table, self.default_ttl)
+
+    def generation(self, table):
+        with self._lock:
+            return self._generations.get(table, 0)
+
+    def get_or_load(self, key, table, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.stored_at
+                if age < entry.ttl:
+                    self._entries.move_to_end(key)
+                    return entry.value
+                if age < entry.ttl + self.stale_window:
+                    self._entries.move_to_end(key)
+                    if not entry.refreshing:
+                        entry.refreshing = True
+                        threading.Thread(
+                            target=self._refresh, args=(key, table, loader), daemon=True
+                        ).start()
+                    return entry.value
+            generation = self._generations.get(table, 0)
+            flight = self._inflight.get((key, generation))
+            leader = flight is None
+            if leader:
+                flight = self._inflight[(key, generation)] = Future()
+
+        if leader:
+            try:
+                value = loader()
+            except BaseException as e:
+                flight.set_exception(e)
+            else:
+                self._store(key, table, value, generation)
+                flight.set_result(value)
+            finally:
+                with self._lock:
+                    self._inflight.pop((key, generation), None)
+        try:
+            return flight.result()
+        except Exception as e:
+            return self._fallback(key, table, e)
+
+    def _fallback(self, key, table, exc):
+        if self.fallback_on is None or not self.fallback_on(exc):
+            raise exc
+        with self._lock:
+            good = self._last_good.get(key)
+        if good is None:
+            raise exc
+        value, stored_at = good
+        if self.on_fallback is not None:
+            self.on_fallback(key, table, time.monotonic() - stored_at, exc)
+        return value
+
+    def _refresh(self, key, table, loader):
+        generation = self.generation(table)
+        try:
+            value = loader()
+        except Exception:
+            # Mantém o valor antigo; a próxima leitura tenta de novo
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refreshing = False
+            return
+        self._store(key, table, value, generation)
+
+    def _store(self, key, table, value, generation):
+        with self._lock:
+            if self._generations.get(table, 0) != generation:
+                return
+            entry = self._entries[key] = _Entry(table, value, self.ttl_for(table))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._last_good[key] = (value, entry.stored_at)
+            self._last_good.move_to_end(key)
+            while len(self._last_good) > self.max_entries:
+                self._last_good.popitem(last=False)
+
+    def patch(self, table, fn):
+        """Reescreve as entradas da tabela com ``fn(key, value)``.
+
+        Se ``fn`` devolver None a entrada é descartada. Leituras que estavam
+        em andamento são ignoradas, pois não enxergam a escrita.
+        """
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for key, entry in list(self._entries.items()):
+                if entry.table != table:
+                    continue
+                value = fn(key, entry.value)
+                if value is None:
+                    del self._entries[key]
+                else:
+                    entry.value = value
+                    if key in self._last_good:
+                        self._last_good[key] = (value, self._last_good[key][1])
+
+    def invalidate(self, table=None):
+        with self._lock:
+            if table is None:
+                for t in {e.table for e in self._entries.values()} | set(self._generations):
+                    self._generations[t] = self._generations.get(t, 0) + 1
+                self._entries.clear()
+                return
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for key in [k for k, e in self._entries.items() if e.table == table]:
+                del self._entries[key]
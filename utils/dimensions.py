@@ -0,0 +1,92 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils import metrics
+from utils.schema import to_records
+from utils.snapshot import get_snapshot
+from utils.supabase_client import LOOKUP_LABELS, PRIMARY_KEYS
+
+
+class DimensionIndex:
+    """id → rótulo/posição de uma tabela de dimensão (usuários, empreendimentos).
+
+    Montado uma vez por versão do snapshot; as páginas trocam os merges por
+    ``labels_for`` (um ``get_indexer`` + ``take``) e a busca linear do
+    select por ``position``.
+    """
+
+    def __init__(self, table_name, frame, version):
+        self.table = table_name
+        self.version = version
+        self.key = PRIMARY_KEYS[table_name]
+        self.label = LOOKUP_LABELS[table_name]
+        cols = [self.key, self.label]
+        frame = frame[cols] if not frame.empty else pd.DataFrame(columns=cols)
+        self.frame = frame.reset_index(drop=True)
+        self._index = pd.Index(self.frame[self.key])
+        self._labels = self.frame[self.label].astype("string").to_numpy(dtype=object, na_value=None)
+        # Último item None: posição -1 (id inexistente) cai nele no take
+        self._take = np.append(self._labels, None)
+        self._records = None
+        self._by_label = None
+
+    @property
+    def empty(self):
+        return self.frame.empty
+
+    def labels_for(self, ids):
+        """Rótulos para uma Series de ids (NA onde o id não existe)."""
+        pos = self._index.get_indexer(pd.Index(ids))
+        return pd.Series(self._take.take(pos), index=ids.index, dtype="string")
+
+    def position(self, value, default=0):
+        """Posição do id na lista de ``records`` (para o ``index`` do selectbox)."""
+        if value is None:
+            return default
+        pos = self._index.get_indexer([value])[0]
+        return int(pos) if pos >= 0 else default
+
+    def label_of(self, value, default=""):
+        """Rótulo de um único id (``default`` se não existir)."""
+        pos = self.position(value, default=-1)
+        name = self._labels[pos] if pos >= 0 else None
+        return default if name is None else name
+
+    def ids_for_label(self, label):
+        if self._by_label is None:
+            by_label = {}
+            for key, name in zip(self.frame[self.key], self._labels):
+                by_label.setdefault(name, []).append(key)
+            self._by_label = by_label
+        return self._by_label.get(label, [])
+
+    def sorted_labels(self):
+        return sorted({name for name in self._labels if name is not None})
+
+    def records(self):
+        """Opções dos selects (dicts id + rótulo), reaproveitadas até a tabela mudar."""
+        if self._records is None:
+            self._records = to_records(self.frame)
+        return self._records
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_dimension(table_name):
+    """Índice da dimensão para a versão atual do snapshot (sincroniza se preciso)."""
+    snap = get_snapshot(table_name)
+    snap.sync()
+    frame, version = snap.current()
+    with _indexes_lock:
+        index = _indexes.get(table_name)
+        if index is not None and index.version == version:
+            return index
+    with metrics.stage("dimension_index", table_name, rows=len(frame)):
+        index = DimensionIndex(table_name, frame, version)
+    with _indexes_lock:
+        _indexes[table_name] = index
+    return index
@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+from uuid import uuid4
+
+import streamlit as st
+
+from utils.schema import to_frame
+from utils.supabase_client import PAGE_SIZE, count_rows, iter_table_pages
+
+# Exportação das listagens filtradas. Cada página vinda do servidor é
+# convertida e escrita no arquivo antes da próxima ser pedida, numa thread
+# separada: a memória fica em uma página e a tela continua respondendo.
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(".cache", "exports"))
+# Arquivos prontos ficam disponíveis por este tempo (segundos)
+EXPORT_TTL = float(os.getenv("EXPORT_TTL", "3600"))
+
+FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def _plain_types(df):
+    # Categorias de páginas diferentes têm dicionários diferentes; no arquivo vão como texto
+    for column in df.columns:
+        if df[column].dtype == "category":
+            df[column] = df[column].astype("string[pyarrow]")
+    return df
+
+
+def _cleanup():
+    now = time.time()
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > EXPORT_TTL:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+class ExportJob:
+    """Exporta ``table_name`` (com ``filters``) para CSV ou Parquet em segundo plano.
+
+    As páginas vêm por keyset (``iter_table_pages`` com um worker), na
+    ordem da chave; ``prepare(df)`` transforma cada página (rótulos,
+    nomes das colunas) antes de ir para o arquivo.
+    """
+
+    def __init__(self, table_name, columns, filters=None, fmt="CSV", prepare=None, page_size=PAGE_SIZE):
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        _cleanup()
+        self.table = table_name
+        self.columns = columns
+        self.filters = filters
+        self.fmt = fmt
+        self.prepare = prepare
+        self.page_size = page_size
+        self.suffix, self.mime = FORMATS[fmt]
+        self.path = os.path.join(EXPORT_DIR, f"{table_name}-{uuid4().hex}{self.suffix}")
+        self.total = None
+        self.rows = 0
+        self.error = None
+        self.done = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self):
+        return not self.done
+
+    def _frames(self):
+        for page in iter_table_pages(self.table, filters=self.filters, columns=self.columns,
+                                     page_size=self.page_size, workers=1):
+            df = to_frame(self.table, page, self.columns)
+            if self.prepare is not None:
+                df = self.prepare(df)
+            yield _plain_types(df)
+
+    def _write_csv(self, tmp):
+        with open(tmp, "w", encoding="utf-8-sig", newline="") as f:
+            header = True
+            for df in self._frames():
+                df.to_csv(f, index=False, header=header)
+                header = False
+                self.rows += len(df)
+
+    def _write_parquet(self, tmp):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for df in self._frames():
+                if writer is None:
+                    batch = pa.Table.from_pandas(df, preserve_index=False)
+                    writer = pq.ParquetWriter(tmp, batch.schema)
+                else:
+                    batch = pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False)
+                writer.write_table(batch)
+                self.rows += len(df)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            pq.write_table(pa.table({}), tmp)
+
+    def _run(self):
+        tmp = f"{self.path}.part"
+        try:
+            self.total = count_rows(self.table, filters=self.filters)
+            if self.fmt == "Parquet":
+                self._write_parquet(tmp)
+            else:
+                self._write_csv(tmp)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            self.error = e
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        finally:
+            self.done = True
+
+
+def export_panel(key, table_name, columns, filters=None, prepare=None, file_stem=None):
+    """Botão de exportar a visão filtrada + acompanhamento e download do arquivo."""
+    file_stem = file_stem or table_name
+    c1, c2 = st.columns([1, 3])
+    fmt = c1.selectbox("Formato", list(FORMATS), key=f"{key}_export_fmt", label_visibility="collapsed")
+    if c2.button("⬇️ Exportar visão filtrada", key=f"{key}_export_btn"):
+        st.session_state[f"{key}_export"] = ExportJob(table_name, columns, filters=filters, fmt=fmt, prepare=prepare)
+
+    job = st.session_state.get(f"{key}_export")
+    if job is None:
+        return
+    if job.running:
+        _export_progress(job)
+    elif job.error is not None:
+        st.error(f"Erro ao exportar: {job.error}")
+    elif not os.path.exists(job.path):
+        st.info("O arquivo exportado expirou; exporte de novo.")
+    else:
+        label = f"{job.fmt} ({job.rows} linha(s), {os.path.getsize(job.path) / 1e6:.1f} MB)"
+        # O download_button lê o arquivo inteiro para a memória do servidor a
+        # cada rerun em que aparece: só é montado no rerun do clique
+        if st.button(f"📦 Preparar download: {label}", key=f"{key}_export_prepare"):
+            with open(job.path, "rb") as f:
+                st.download_button(
+                    f"Baixar {label}", f, file_name=f"{file_stem}{job.suffix}",
+                    mime=job.mime, key=f"{key}_export_download", on_click="ignore",
+                )
+
+
+@st.fragment(run_every=1)
+def _export_progress(job):
+    # Só o aviso de progresso é redesenhado; ao terminar, a página mostra o download
+    if job.done:
+        st.rerun()
+    total = f" de {job.total}" if job.total is not None else ""
+    st.caption(f"⏳ Exportando... {job.rows}{total} linha(s)")
@@ -0,0 +1,582 @@
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from base64 import b32hexencode
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import quote, urlsplit
+from zoneinfo import ZoneInfo
+
+import httpx
+import pandas as pd
+
+from utils import metrics
+from utils.agenda import DURATION, TABLE
+from utils.dimensions import get_dimension
+from utils.schema import to_records
+from utils.snapshot import load_table
+from utils.supabase_client import PRIMARY_KEYS, delete_data, on_change, update_data
+
+logger = logging.getLogger(__name__)
+
+# Sincronização de mais_emp_agendamento com uma agenda do Google, nos dois
+# sentidos. Uma thread por processo, a cada GCAL_SYNC_INTERVAL (ou logo
+# depois de uma escrita na tabela):
+#  - puxa só os eventos alterados desde a rodada anterior (syncToken do
+#    events.list; 410 = token expirado, refaz a listagem completa);
+#  - empurra só os agendamentos cujo conteúdo mudou desde o último envio,
+#    comparando com a tabela de mapeamento local (SQLite), em lotes do
+#    endpoint de batch e limitado a GCAL_RATE requisições por segundo.
+# O id do evento é derivado do id do agendamento: reenviar não duplica.
+# Eventos criados direto no Google (sem agendamento) são ignorados.
+GCAL_CALENDAR_ID = os.getenv("GCAL_CALENDAR_ID")  # vazio = sincronização desligada
+GCAL_API_URL = os.getenv("GCAL_API_URL", "https://www.googleapis.com/calendar/v3")
+GCAL_BATCH_URL = os.getenv("GCAL_BATCH_URL", "https://www.googleapis.com/batch/calendar/v3")
+GCAL_TOKEN_URL = os.getenv("GCAL_TOKEN_URL", "https://oauth2.googleapis.com/token")
+# Credenciais OAuth do dono da agenda (refresh token) ou um token de acesso fixo
+GCAL_CLIENT_ID = os.getenv("GCAL_CLIENT_ID")
+GCAL_CLIENT_SECRET = os.getenv("GCAL_CLIENT_SECRET")
+GCAL_REFRESH_TOKEN = os.getenv("GCAL_REFRESH_TOKEN")
+GCAL_ACCESS_TOKEN = os.getenv("GCAL_ACCESS_TOKEN")
+GCAL_STATE_DB = os.getenv("GCAL_STATE_DB", os.path.join(".cache", "gcal.sqlite"))
+GCAL_SYNC_INTERVAL = float(os.getenv("GCAL_SYNC_INTERVAL", "60"))
+# Itens por requisição de batch (o Google aceita até 1000 e recomenda 50)
+GCAL_BATCH_SIZE = int(os.getenv("GCAL_BATCH_SIZE", "50"))
+# Requisições por segundo; cada item de um lote conta como uma na cota
+GCAL_RATE = float(os.getenv("GCAL_RATE", "5"))
+# Agendamentos com data anterior a hoje - GCAL_DAYS_BACK não são enviados
+GCAL_DAYS_BACK = int(os.getenv("GCAL_DAYS_BACK", "30"))
+GCAL_TIMEZONE = os.getenv("GCAL_TIMEZONE", "America/Sao_Paulo")
+MAX_ATTEMPTS = 5
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+EVENT_PREFIX = "maisemp"
+# Campos que vão para o evento; mudar qualquer um reenvia o agendamento
+FIELDS = ("id_agendamento", "cliente_id", "tipo_evento", "data", "horario", "status", "negociacao", "updated_at")
+DONE_COLOR = "8"  # cinza: agendamento realizado
+
+PK = PRIMARY_KEYS[TABLE]
+
+
+class CalendarError(RuntimeError):
+    def __init__(self, status, message):
+        super().__init__(f"Google Agenda {status}: {message}")
+        self.status = status
+
+
+class SyncTokenExpired(CalendarError):
+    def __init__(self):
+        super().__init__(410, "syncToken expirado")
+
+
+def event_id(agendamento_id):
+    """Id do evento para um agendamento (base32hex, o alfabeto aceito pelo Google)."""
+    return EVENT_PREFIX + b32hexencode(str(agendamento_id).encode()).decode().lower().rstrip("=")
+
+
+def _error_reason(body):
+    errors = ((body or {}).get("error") or {}).get("errors") or [{}]
+    return errors[0].get("reason")
+
+
+def _retryable(status, body):
+    return status in RETRY_STATUS or (status == 403 and _error_reason(body) in RATE_LIMIT_REASONS)
+
+
+def _backoff(attempt):
+    return min(2 ** attempt + random.random(), 32)
+
+
+class RateLimiter:
+    """Balde de fichas: em média ``rate`` requisições por segundo.
+
+    ``acquire(n)`` pode deixar o saldo negativo (um lote de 50 passa de uma
+    vez) e espera até ele voltar a zero.
+    """
+
+    def __init__(self, rate=GCAL_RATE):
+        self.rate = rate
+        self.tokens = rate
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n=1):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= n
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class Credentials:
+    """Token de acesso, renovado pelo refresh token antes de expirar."""
+
+    def __init__(self, http, access_token=GCAL_ACCESS_TOKEN):
+        self.http = http
+        self.token = access_token
+        self.expires = float("inf") if access_token else 0.0
+        self.lock = threading.Lock()
+
+    def header(self):
+        with self.lock:
+            if time.time() > self.expires - 60:
+                self._refresh()
+            return {"Authorization": f"Bearer {self.token}"}
+
+    def _refresh(self):
+        if not (GCAL_CLIENT_ID and GCAL_CLIENT_SECRET and GCAL_REFRESH_TOKEN):
+            raise CalendarError(401, "defina GCAL_ACCESS_TOKEN ou GCAL_CLIENT_ID/GCAL_CLIENT_SECRET/GCAL_REFRESH_TOKEN")
+        r = self.http.post(GCAL_TOKEN_URL, data={
+            "grant_type": "refresh_token", "client_id": GCAL_CLIENT_ID,
+            "client_secret": GCAL_CLIENT_SECRET, "refresh_token": GCAL_REFRESH_TOKEN,
+        })
+        if r.status_code != 200:
+            raise CalendarError(r.status_code, r.text)
+        body = r.json()
+        self.token = body["access_token"]
+        self.expires = time.time() + float(body.get("expires_in", 3600))
+
+
+def _parse_batch(response, size):
+    # multipart/mixed: cada parte traz "Content-ID: <response-itemN>" e uma resposta HTTP inteira
+    boundary = re.search(r'boundary="?([^";]+)"?', response.headers.get("content-type", ""))
+    replies = {}
+    if boundary:
+        text = response.text.replace("\r\n", "\n")
+        for part in text.split(f"--{boundary.group(1)}")[1:]:
+            if part.startswith("--"):
+                break
+            head, _, inner = part.strip("\n").partition("\n\n")
+            cid = re.search(r"content-id:\s*<response-item(\d+)>", head, re.I)
+            status_line, _, rest = inner.partition("\n")
+            if cid is None or not status_line.startswith("HTTP/"):
+                continue
+            body = rest[1:] if rest.startswith("\n") else rest.partition("\n\n")[2]
+            try:
+                payload = json.loads(body) if body.strip() else None
+            except ValueError:
+                payload = None
+            replies[int(cid.group(1))] = (int(status_line.split()[1]), payload)
+    return [replies.get(i, (500, None)) for i in range(size)]
+
+
+class CalendarClient:
+    """Cliente mínimo da API v3 (events.list e batch de insert/update/delete)."""
+
+    def __init__(self, calendar_id=GCAL_CALENDAR_ID, api_url=GCAL_API_URL, batch_url=GCAL_BATCH_URL,
+                 limiter=None, http=None):
+        self.http = http or httpx.Client(timeout=30)
+        self.calendar = calendar_id
+        self.api_url = api_url.rstrip("/")
+        self.batch_url = batch_url
+        self.prefix = urlsplit(self.api_url).path  # caminho dos itens do lote
+        self.credentials = Credentials(self.http)
+        self.limiter = limiter or RateLimiter()
+
+    def events_path(self, eid=None):
+        path = f"/calendars/{quote(self.calendar, safe='')}/events"
+        return path if eid is None else f"{path}/{eid}"
+
+    def _send(self, operation, items, method, url, **kwargs):
+        started = time.perf_counter()
+        r = self.http.request(method, url, headers={**self.credentials.header(), **kwargs.pop("headers", {})}, **kwargs)
+        labels = {"operation": operation}
+        metrics.registry.observe("mais_emp_gcal_request_seconds", labels, time.perf_counter() - started)
+        metrics.registry.add("mais_emp_gcal_requests_total", labels, items)
+        return r
+
+    def _get(self, path, params):
+        for attempt in range(MAX_ATTEMPTS):
+            self.limiter.acquire()
+            r = self._send("list", 1, "GET", self.api_url + path, params=params)
+            body = r.json() if r.content else None
+            if not _retryable(r.status_code, body) or attempt == MAX_ATTEMPTS - 1:
+                break
+            time.sleep(_backoff(attempt))
+        if r.status_code == 410:
+            raise SyncTokenExpired()
+        if r.status_code != 200:
+            raise CalendarError(r.status_code, r.text)
+        return body
+
+    def list_changes(self, sync_token=None):
+        """(eventos, próximo syncToken) alterados desde ``sync_token``; sem token lista todos.
+
+        Levanta SyncTokenExpired quando o Google não aceita mais o token.
+        """
+        params = {"maxResults": 2500, "showDeleted": "true"}
+        if sync_token:
+            params["syncToken"] = sync_token
+        events, page = [], None
+        while True:
+            body = self._get(self.events_path(), {**params, **({"pageToken": page} if page else {})})
+            events.extend(body.get("items") or [])
+            page = body.get("nextPageToken")
+            if not page:
+                return events, body.get("nextSyncToken")
+
+    def _batch_once(self, requests):
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for n, (method, eid, body) in enumerate(requests):
+            lines = [f"--{boundary}", "Content-Type: application/http", f"Content-ID: <item{n}>", "",
+                     f"{method} {self.prefix}{self.events_path(eid)}"]
+            if body is not None:
+                lines += ["Content-Type: application/json", "", json.dumps(body)]
+            parts.append("\r\n".join(lines) + "\r\n")
+        payload = "".join(parts) + f"--{boundary}--\r\n"
+        r = self._send("batch", len(requests), "POST", self.batch_url, content=payload.encode(),
+                       headers={"Content-Type": f"multipart/mixed; boundary={boundary}"})
+        if r.status_code != 200:
+            # O lote inteiro falhou (cota, token, servidor): vale para todos os itens
+            body = r.json() if r.headers.get("content-type", "").startswith("application/json") else None
+            return [(r.status_code, body)] * len(requests)
+        return _parse_batch(r, len(requests))
+
+    def batch(self, requests):
+        """Executa ``[(método, event_id, corpo)]`` em lotes de GCAL_BATCH_SIZE.
+
+        Itens recusados por cota ou erro passageiro são repetidos com espera
+        exponencial. Devolve ``[(status, corpo)]`` na ordem dos pedidos.
+        """
+        results = [None] * len(requests)
+        pending = list(range(len(requests)))
+        for attempt in range(MAX_ATTEMPTS):
+            retry = []
+            for lo in range(0, len(pending), GCAL_BATCH_SIZE):
+                chunk = pending[lo:lo + GCAL_BATCH_SIZE]
+                self.limiter.acquire(len(chunk))
+                for i, reply in zip(chunk, self._batch_once([requests[i] for i in chunk])):
+                    results[i] = reply
+                    if _retryable(*reply):
+                        retry.append(i)
+            if not retry or attempt == MAX_ATTEMPTS - 1:
+                break
+            metrics.registry.add("mais_emp_gcal_retries_total", {}, len(retry))
+            pending = retry
+            time.sleep(_backoff(attempt))
+        return results
+
+
+class MappingStore:
+    """Tabela local agendamento ↔ evento (SQLite).
+
+    ``hash`` é o conteúdo do agendamento na última vez que os dois lados
+    ficaram iguais; ``etag`` identifica a versão do evento gravada por nós,
+    para ignorar o eco das próprias escritas na listagem incremental.
+    """
+
+    def __init__(self, path=GCAL_STATE_DB):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.db:
+            self.db.executescript("""
+                create table if not exists eventos (
+                    id_agendamento text primary key,
+                    event_id text not null unique,
+                    hash text not null,
+                    etag text
+                );
+                create table if not exists estado (chave text primary key, valor text);
+            """)
+
+    def all(self):
+        """{id_agendamento: (event_id, hash, etag)}"""
+        with self.lock:
+            rows = self.db.execute("select id_agendamento, event_id, hash, etag from eventos").fetchall()
+        return {r[0]: r[1:] for r in rows}
+
+    def put(self, rows):
+        """Grava ``[(id_agendamento, event_id, hash, etag)]``."""
+        with self.lock, self.db:
+            self.db.executemany("insert or replace into eventos values (?, ?, ?, ?)", rows)
+
+    def delete(self, ids):
+        with self.lock, self.db:
+            self.db.executemany("delete from eventos where id_agendamento = ?", [(i,) for i in ids])
+
+    def get_state(self, key):
+        with self.lock:
+            row = self.db.execute("select valor from estado where chave = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key, value):
+        with self.lock, self.db:
+            self.db.execute("insert or replace into estado values (?, ?)", (key, value))
+
+    def reset(self):
+        with self.lock, self.db:
+            self.db.execute("delete from eventos")
+            self.db.execute("delete from estado")
+
+
+# ---------------- Agendamento ↔ evento ----------------
+def content_hashes(frame):
+    """Hash do conteúdo sincronizado de cada linha (``frame`` com FIELDS + ``Cliente``)."""
+    if frame.empty:
+        return pd.Series([], dtype=object)
+    plain = pd.DataFrame({
+        "tipo_evento": frame["tipo_evento"].astype("string"),
+        "data": pd.to_datetime(frame["data"], errors="coerce").dt.strftime("%Y-%m-%d").astype("string"),
+        "horario": frame["horario"].astype("string").str.slice(0, 8),
+        "status": frame["status"].astype("string"),
+        "negociacao": frame["negociacao"].astype("string"),
+        "cliente": frame["Cliente"].astype("string"),
+    }, index=frame.index)
+    return pd.util.hash_pandas_object(plain, index=False).map("{:016x}".format)
+
+
+def to_event(row, tz=GCAL_TIMEZONE):
+    """Corpo do evento para um agendamento (dict de ``to_records`` + ``Cliente``)."""
+    summary = " · ".join(p for p in (row.get("tipo_evento") or "Agendamento", row.get("Cliente")) if p)
+    body = {
+        "id": event_id(row[PK]),
+        "summary": summary,
+        "description": row.get("negociacao") or "",
+        "extendedProperties": {"private": {"id_agendamento": str(row[PK]), "status": row.get("status") or ""}},
+    }
+    day = date.fromisoformat(str(row["data"])[:10])
+    if row.get("horario"):
+        start = datetime.combine(day, datetime.strptime(str(row["horario"])[:8], "%H:%M:%S").time())
+        body["start"] = {"dateTime": start.isoformat(), "timeZone": tz}
+        body["end"] = {"dateTime": (start + DURATION.to_pytimedelta()).isoformat(), "timeZone": tz}
+    else:
+        body["start"] = {"date": day.isoformat()}
+        body["end"] = {"date": (day + timedelta(days=1)).isoformat()}
+    if row.get("status") == "realizada":
+        body["colorId"] = DONE_COLOR
+    return body
+
+
+def from_event(event, tz=GCAL_TIMEZONE):
+    """Campos do agendamento que o evento pode alterar (data, horário e negociação)."""
+    start = event.get("start") or {}
+    if start.get("dateTime"):
+        moment = pd.Timestamp(start["dateTime"])
+        moment = moment.tz_convert(ZoneInfo(tz)) if moment.tzinfo else moment
+        day, hour = moment.date().isoformat(), moment.strftime("%H:%M:%S")
+    else:
+        day, hour = start.get("date"), None
+    return {"data": day, "horario": hour, "negociacao": event.get("description") or None}
+
+
+def _agendamento_of(event, by_event):
+    private = (event.get("extendedProperties") or {}).get("private") or {}
+    return private.get("id_agendamento") or by_event.get(event.get("id"))
+
+
+def _updated_at(value):
+    ts = pd.Timestamp(value) if value else None
+    if ts is None or pd.isna(ts):
+        return None
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts
+
+
+# ---------------- Sincronização ----------------
+class CalendarSync:
+    """Uma rodada = puxar o que mudou no Google + empurrar o que mudou no banco."""
+
+    def __init__(self, client=None, store=None, interval=GCAL_SYNC_INTERVAL):
+        self.client = client or CalendarClient()
+        self.store = store or MappingStore()
+        self.interval = interval
+        self.status = {}  # última rodada (a página mostra)
+        self.lock = threading.Lock()  # uma rodada por vez
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        if self.store.get_state("calendario") != self.client.calendar:
+            # Outra agenda: mapeamento e syncToken antigos não valem
+            self.store.reset()
+            self.store.set_state("calendario", self.client.calendar)
+
+    def _local(self):
+        frame = load_table(TABLE, columns=FIELDS)
+        usuarios = get_dimension("mais_emp_usuarios")
+        frame["Cliente"] = usuarios.labels_for(frame["cliente_id"]) if not frame.empty else None
+        return frame
+
+    def pull(self):
+        """Aplica no banco os eventos alterados no Google desde a última rodada."""
+        token = self.store.get_state("sync_token")
+        try:
+            events, next_token = self.client.list_changes(token)
+        except SyncTokenExpired:
+            logger.info("syncToken do Google Agenda expirou; listando a agenda inteira")
+            events, next_token = self.client.list_changes(None)
+        counts = {"updated": 0, "deleted": 0}
+        if events:
+            mapping = self.store.all()
+            by_event = {eid: key for key, (eid, _, _) in mapping.items()}
+            frame = self._local()
+            rows = {str(r[PK]): r for r in to_records(frame)} if not frame.empty else {}
+            hashes = dict(zip(frame[PK].astype(str), content_hashes(frame))) if not frame.empty else {}
+            done, merged, gone = [], [], []
+            for event in events:
+                key = _agendamento_of(event, by_event)
+                if key is None:
+                    continue  # evento que não veio do painel
+                known = mapping.get(key)
+                if known is not None and known[2] == event.get("etag"):
+                    continue  # eco da nossa própria escrita
+                row = rows.get(key)
+                if event.get("status") == "cancelled":
+                    if row is not None:
+                        delete_data(TABLE, PK, row[PK])
+                        counts["deleted"] += 1
+                    gone.append(key)
+                    continue
+                if row is None:
+                    continue  # apagado no banco; o push remove o evento
+                changes = {k: v for k, v in from_event(event).items() if v != row.get(k)}
+                local_changed = known is None or known[1] != hashes.get(key)
+                remote_newer = (_updated_at(event.get("updated")) or pd.Timestamp.max.tz_localize("UTC")) >= (
+                    _updated_at(row.get("updated_at")) or pd.Timestamp.min.tz_localize("UTC"))
+                if changes and (remote_newer or not local_changed):
+                    written = update_data(TABLE, PK, row[PK], changes)
+                    row = {**row, **changes, **((written or [{}])[0])}
+                    counts["updated"] += 1
+                elif changes:
+                    continue  # o banco mudou depois: o push sobrescreve o evento
+                # Os dois lados iguais: o hash da linha como ficou evita o eco no push
+                done.append((key, event["id"], event.get("etag")))
+                merged.append(row)
+            if done:
+                digests = content_hashes(pd.DataFrame(merged, columns=[*FIELDS, "Cliente"]))
+                self.store.put([(key, eid, digest, etag) for (key, eid, etag), digest in zip(done, digests)])
+            self.store.delete(gone)
+        if next_token:
+            self.store.set_state("sync_token", next_token)
+        for action, n in counts.items():
+            metrics.registry.add("mais_emp_gcal_events_total", {"direction": "pull", "action": action}, n)
+        return counts
+
+    def push(self):
+        """Envia ao Google só os agendamentos novos, alterados ou apagados desde o último envio."""
+        frame = self._local()
+        mapping = self.store.all()
+        if frame.empty:
+            keys, window = pd.Series([], dtype=str), frame
+        else:
+            keys = frame[PK].astype(str)
+            cutoff = pd.Timestamp(date.today() - timedelta(days=GCAL_DAYS_BACK))
+            window = frame[(pd.to_datetime(frame["data"], errors="coerce") >= cutoff).to_numpy()]
+        with metrics.stage("gcal_diff", TABLE, rows=len(window)):
+            hashes = content_hashes(window)
+            known = pd.Series([mapping.get(k, (None, None, None))[1] for k in keys[window.index]],
+                              index=window.index, dtype=object)
+            changed = window[(hashes != known).to_numpy()]
+            alive = set(keys)
+            gone = [k for k in mapping if k not in alive]
+
+        requests, meta = [], []
+        for row, digest in zip(to_records(changed), hashes[changed.index]):
+            key = str(row[PK])
+            body = to_event(row)
+            if key in mapping:
+                requests.append(("PUT", mapping[key][0], body))
+            else:
+                requests.append(("POST", None, body))
+            meta.append((key, digest))
+        for key in gone:
+            requests.append(("DELETE", mapping[key][0], None))
+            meta.append((key, None))
+
+        counts = {"created": 0, "updated": 0, "deleted": 0, "failed": 0}
+        if not requests:
+            return counts
+        results = self.client.batch(requests)
+        # Criado antes por outro processo (409) ou apagado no Google (404): troca o verbo e repete
+        redo = [i for i, (status, _) in enumerate(results)
+                if (requests[i][0] == "POST" and status == 409) or (requests[i][0] == "PUT" and status == 404)]
+        if redo:
+            again = self.client.batch([
+                ("PUT", requests[i][2]["id"], requests[i][2]) if requests[i][0] == "POST" else ("POST", None, requests[i][2])
+                for i in redo
+            ])
+            for i, reply in zip(redo, again):
+                results[i] = reply
+
+        done, removed = [], []
+        for (method, _, body), (key, digest), (status, reply) in zip(requests, meta, results):
+            if method == "DELETE":
+                if status in (200, 204, 404, 410):
+                    removed.append(key)
+                    counts["deleted"] += 1
+                else:
+                    counts["failed"] += 1
+            elif status == 200:
+                done.append((key, body["id"], digest, (reply or {}).get("etag")))
+                counts["created" if key not in mapping else "updated"] += 1
+            else:
+                counts["failed"] += 1
+                logger.warning("Google Agenda recusou %s do agendamento %s: %s %s", method, key, status, reply)
+        self.store.put(done)
+        self.store.delete(removed)
+        for action, n in counts.items():
+            metrics.registry.add("mais_emp_gcal_events_total", {"direction": "push", "action": action}, n)
+        return counts
+
+    def run_once(self):
+        """Uma rodada completa; devolve (e guarda em ``status``) o que foi feito."""
+        with self.lock:
+            started = time.perf_counter()
+            try:
+                result = {"pull": self.pull(), "push": self.push(), "error": None}
+            except Exception as e:
+                logger.warning("Sincronização com o Google Agenda falhou: %s", e)
+                result = {"error": str(e)}
+            result["at"] = datetime.now(timezone.utc)
+            result["seconds"] = round(time.perf_counter() - started, 3)
+            self.status = result
+            return result
+
+    def request_sync(self):
+        """Antecipa a próxima rodada (chamado depois de escritas na tabela)."""
+        self._wake.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="mais-emp-gcal", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _on_change(self, table_name, event, new, old):
+        # Escritas da própria sincronização não precisam de outra rodada
+        if table_name == TABLE and threading.current_thread() is not self._thread:
+            self.request_sync()
+
+
+_sync = None
+_sync_lock = threading.Lock()
+
+
+def start_calendar_sync():
+    """Inicia a sincronização uma única vez por processo (só com GCAL_CALENDAR_ID definido)."""
+    global _sync
+    if not GCAL_CALENDAR_ID:
+        return None
+    with _sync_lock:
+        if _sync is None:
+            _sync = CalendarSync()
+            on_change(_sync._on_change)
+            _sync.start()
+        return _sync
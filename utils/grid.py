@@ -0,0 +1,73 @@
+import streamlit as st
+
+from utils.schema import to_frame
+from utils.supabase_client import count_rows, get_page
+
+PAGE_SIZES = (25, 50, 100)
+
+
+def _state(key, signature):
+    # Pilha de cursores: stack[i] é o cursor de início da página i
+    state = st.session_state.setdefault(f"{key}_grid", {"sig": None, "stack": [None], "next": None})
+    if state["sig"] != signature:
+        state.update(sig=signature, stack=[None], next=None)
+    return state
+
+
+def _first(state):
+    state["stack"] = [None]
+
+
+def _prev(state):
+    if len(state["stack"]) > 1:
+        state["stack"].pop()
+
+
+def _next(state):
+    if state["next"] is not None:
+        state["stack"].append(state["next"])
+
+
+def paginated_grid(key, table_name, columns, filters=None, sort_options=None, default_sort=None,
+                   prepare=None, column_config=None):
+    """Listagem paginada no servidor: só a página visível é buscada e enviada ao navegador.
+
+    ``sort_options`` é ``{rótulo: coluna}`` (colunas indexadas, ver sql/004);
+    ``prepare(df)`` transforma a página antes de exibir (nomes, renomear).
+    O total vem de uma contagem ``head`` com os mesmos filtros.
+    """
+    sort_options = sort_options or {"Padrão": None}
+    labels = list(sort_options)
+    c1, c2, c3 = st.columns([2, 1, 1])
+    sort_label = c1.selectbox(
+        "Ordenar por", labels,
+        index=labels.index(default_sort) if default_sort in labels else 0,
+        key=f"{key}_sort",
+    )
+    descending = c2.selectbox("Ordem", ["Crescente", "Decrescente"], key=f"{key}_dir") == "Decrescente"
+    page_size = c3.selectbox("Por página", PAGE_SIZES, index=1, key=f"{key}_size")
+
+    order_by = sort_options[sort_label]
+    signature = (table_name, filters.key() if filters else (), order_by, descending, page_size)
+    state = _state(key, signature)
+
+    rows, next_cursor = get_page(
+        table_name, columns=columns, filters=filters, order_by=order_by,
+        descending=descending, page_size=page_size, after=state["stack"][-1],
+    )
+    state["next"] = next_cursor
+    total = count_rows(table_name, filters=filters)
+
+    df = to_frame(table_name, rows, columns)
+    if prepare is not None:
+        df = prepare(df)
+    st.dataframe(df, column_config=column_config, hide_index=True)
+
+    page = len(state["stack"])
+    pages = max(1, -(-total // page_size))
+    n1, n2, n3, info = st.columns([1, 1, 1, 4])
+    n1.button("⏮", key=f"{key}_first", on_click=_first, args=(state,), disabled=page == 1)
+    n2.button("◀", key=f"{key}_prev", on_click=_prev, args=(state,), disabled=page == 1)
+    n3.button("▶", key=f"{key}_next", on_click=_next, args=(state,), disabled=next_cursor is None)
+    info.caption(f"Página {page} de {pages} · {total} registro(s)")
+    return df
@@ -0,0 +1,380 @@
+import codecs
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from utils.supabase_client import clear_cache, insert_rows, is_transient
+
+# Importação em massa de leads (CSV/XLSX). O arquivo é lido linha a linha,
+# validado e enviado em lotes; o progresso de cada arquivo fica gravado em
+# disco para retomar de onde parou se algo falhar no meio.
+TABLE = "mais_emp_lead"
+IMPORT_DIR = os.getenv("IMPORT_DIR", os.path.join(".cache", "imports"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "4"))
+# CSV do Excel em português sai em cp1252; latin-1 decodifica qualquer byte
+CSV_ENCODINGS = ("utf-8-sig", "cp1252", "latin-1")
+
+# Cabeçalhos aceitos (já normalizados: minúsculas, sem acento, "_" → espaço)
+HEADER_ALIASES = {
+    "nome": "nome",
+    "nome do lead": "nome",
+    "objetivo": "objetivo",
+    "forma pagamento": "forma_pagamento",
+    "forma de pagamento": "forma_pagamento",
+    "pagamento": "forma_pagamento",
+    "renda": "renda_familiar",
+    "renda familiar": "renda_familiar",
+    "potencial": "potencial",
+    "interesse": "interesse_empreendimento",
+    "interesse empreendimento": "interesse_empreendimento",
+    "empreendimento": "empreendimento",
+}
+
+# Mesmas opções do formulário de cadastro
+CHOICES = {
+    "objetivo": ["Moradia", "Investimento"],
+    "forma_pagamento": ["À vista", "Financiamento"],
+    "potencial": ["Alto", "Médio", "Baixo"],
+}
+
+
+def _norm(text):
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode()
+    return " ".join(text.replace("_", " ").lower().split())
+
+
+_CHOICES = {col: {_norm(v): v for v in values} for col, values in CHOICES.items()}
+
+
+def _text(value):
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _money(value):
+    # Aceita 5000, "5.000,00", "R$ 3.500", "R$ 5,000.00", "3500.50"...
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).replace("R$", "").replace(" ", "")
+    if "," in text and "." in text:
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif "," in text:
+        text = text.replace(",", ".")
+    elif "." in text:
+        groups = text.split(".")
+        # Só ponto: "3.500" e "1.234.567" são milhares (pt-BR), "3500.5" é decimal;
+        # "1.23.4" não é nenhum dos dois e vira erro da linha
+        if len(groups) > 2 or len(groups[-1]) == 3:
+            if not all(len(g) == 3 and g.isdigit() for g in groups[1:]):
+                raise ValueError
+            text = "".join(groups)
+    amount = float(text)
+    if amount < 0:
+        raise ValueError
+    return amount
+
+
+# ---------------- Leitura ----------------
+def _encoding(file):
+    """Primeira de CSV_ENCODINGS que decodifica o arquivo inteiro (lido em blocos)."""
+    for encoding in CSV_ENCODINGS[:-1]:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        file.seek(0)
+        try:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                decoder.decode(chunk)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            continue
+        finally:
+            file.seek(0)
+        return encoding
+    return CSV_ENCODINGS[-1]
+
+
+def _iter_csv(file):
+    stream = io.TextIOWrapper(file, encoding=_encoding(file), newline="")
+    try:
+        sample = stream.read(4096)
+        stream.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(stream, dialect)
+        header = next(reader, None) or []
+        for line, values in enumerate(reader, start=2):
+            if any(v.strip() for v in values):
+                yield line, dict(zip(header, values))
+    finally:
+        stream.detach()  # não fecha o arquivo enviado
+
+
+def _iter_xlsx(file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise RuntimeError("Para importar .xlsx instale o openpyxl (requirements.txt).") from e
+    book = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = book.active.iter_rows(values_only=True)
+        header = [str(h) if h is not None else "" for h in next(rows, None) or []]
+        for line, values in enumerate(rows, start=2):
+            if any(v not in (None, "") for v in values):
+                yield line, dict(zip(header, values))
+    finally:
+        book.close()
+
+
+def iter_rows(file, filename):
+    """(nº da linha no arquivo, {cabeçalho: valor}) sem carregar o arquivo todo."""
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        return _iter_xlsx(file)
+    return _iter_csv(file)
+
+
+def file_digest(file):
+    """sha256 do conteúdo: identifica o arquivo para retomar a importação."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(1 << 20), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+# ---------------- Validação ----------------
+class LeadValidator:
+    """Normaliza uma linha do arquivo para o formato de ``mais_emp_lead``.
+
+    ``empreendimentos`` é o ``DimensionIndex`` da tabela; o nome do
+    empreendimento é resolvido sem acento/caixa. Nomes repetidos no
+    cadastro são ambíguos e viram erro da linha.
+    """
+
+    def __init__(self, empreendimentos):
+        by_name = {}
+        for rec in empreendimentos.records():
+            by_name.setdefault(_norm(rec.get("nome") or ""), []).append(rec["id_empreendimento"])
+        self._emps = by_name
+
+    def __call__(self, raw):
+        row = {}
+        for header, value in raw.items():
+            column = HEADER_ALIASES.get(_norm(header))
+            if column is not None:
+                row[column] = value
+        if not row:
+            raise ValueError("nenhuma coluna reconhecida")
+
+        lead = {"nome": _text(row.get("nome")), "id_usuario": None, "id_empreendimento": None}
+        for column, options in _CHOICES.items():
+            value = _text(row.get(column))
+            if value is None:
+                lead[column] = None
+            elif _norm(value) in options:
+                lead[column] = options[_norm(value)]
+            else:
+                raise ValueError(f"{column} inválido: {value!r} (use {', '.join(CHOICES[column])})")
+
+        renda = _text(row.get("renda_familiar"))
+        try:
+            lead["renda_familiar"] = None if renda is None else _money(row["renda_familiar"])
+        except ValueError:
+            raise ValueError(f"renda_familiar inválida: {renda!r}") from None
+        lead["interesse_empreendimento"] = _text(row.get("interesse_empreendimento"))
+
+        emp = _text(row.get("empreendimento"))
+        if emp is not None:
+            ids = self._emps.get(_norm(emp), [])
+            if not ids:
+                raise ValueError(f"empreendimento não encontrado: {emp!r}")
+            if len(ids) > 1:
+                raise ValueError(f"empreendimento ambíguo (nome repetido): {emp!r}")
+            lead["id_empreendimento"] = ids[0]
+        return lead
+
+
+# ---------------- Envio ----------------
+@dataclass
+class ImportResult:
+    read: int = 0
+    inserted: int = 0
+    skipped: int = 0          # linhas de lotes já enviados numa execução anterior
+    errors: list = field(default_factory=list)         # [{"linha", "erro"}]
+    failed_batches: list = field(default_factory=list)  # [{"lote", "linhas", "erro"}]
+
+    @property
+    def complete(self):
+        return not self.failed_batches
+
+    def report(self):
+        """Relatório por linha (erros de validação e de gravação)."""
+        rows = [*self.errors, *({"linha": b["linhas"], "erro": f"lote não enviado: {b['erro']}"} for b in self.failed_batches)]
+        return pd.DataFrame(rows, columns=["linha", "erro"])
+
+
+class _Checkpoint:
+    # Lotes concluídos (e os erros deles) de um arquivo, gravados a cada lote.
+    # Lote que caiu no meio do envio linha a linha guarda as linhas já
+    # resolvidas (gravadas ou recusadas): a retomada manda só as outras.
+    def __init__(self, digest, batch_size, restart=False):
+        os.makedirs(IMPORT_DIR, exist_ok=True)
+        self.path = os.path.join(IMPORT_DIR, f"{digest}-{batch_size}.json")
+        self.done = {}
+        self.partial = {}  # lote → {"linhas": [números resolvidos], "inseridas", "erros"}
+        self.lock = threading.Lock()
+        if not restart and os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if "feitos" not in saved:
+                saved = {"feitos": saved}  # formato antigo: só os lotes concluídos
+            self.done = {int(k): v for k, v in saved["feitos"].items()}
+            self.partial = {int(k): v for k, v in saved.get("parciais", {}).items()}
+
+    def _write(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"feitos": self.done, "parciais": self.partial}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def line(self, index, line, error=None):
+        """Uma linha do envio linha a linha resolvida (``error`` = recusada pelo banco)."""
+        with self.lock:
+            state = self.partial.setdefault(index, {"linhas": [], "inseridas": 0, "erros": []})
+            state["linhas"].append(line)
+            if error is None:
+                state["inseridas"] += 1
+            else:
+                state["erros"].append({"linha": line, "erro": error})
+            self._write()
+
+    def finish(self, index, count, errors):
+        with self.lock:
+            self.partial.pop(index, None)
+            self.done[index] = {"linhas": count, "erros": errors}
+            self._write()
+
+
+def _rejected(exc):
+    # Recusa do banco por causa dos dados (constraint, tipo): 4xx que não passa sozinho.
+    # 5xx/indisponibilidade sobe e o lote fica para a retomada.
+    from postgrest.exceptions import APIError  # import tardio (ver supabase_client._create_client)
+
+    return isinstance(exc, APIError) and not is_transient(exc) and (getattr(exc, "http_status", None) or 400) < 500
+
+
+def _send(batch, on_line=None):
+    """Um INSERT por lote; se o banco recusar, grava linha a linha para achar as ruins.
+
+    ``on_line(linha, erro)`` registra cada linha resolvida no envio linha a
+    linha, para que uma falha de rede no meio não reenvie as já gravadas.
+    """
+    leads = [lead for _, lead in batch]
+    try:
+        return insert_rows(TABLE, leads), []
+    except Exception as e:
+        if not _rejected(e):
+            raise
+    inserted, errors = 0, []
+    for line, lead in batch:
+        try:
+            inserted += insert_rows(TABLE, [lead])
+            error = None
+        except Exception as e:
+            if not _rejected(e):
+                raise
+            error = e.message or str(e)
+            errors.append({"linha": line, "erro": error})
+        if on_line is not None:
+            on_line(line, error)
+    return inserted, errors
+
+
+def _chunks(rows, size):
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_leads(file, filename, empreendimentos, batch_size=IMPORT_BATCH_SIZE, workers=IMPORT_WORKERS,
+                 restart=False, on_progress=None):
+    """Importa leads de um CSV/XLSX em lotes de ``batch_size`` linhas.
+
+    No máximo ``workers`` lotes são enviados ao mesmo tempo (e só o dobro
+    disso fica em memória). Lotes que falham por rede/indisponibilidade
+    não são marcados como feitos: rodar de novo com o mesmo arquivo envia
+    só o que faltou (``restart=True`` ignora o progresso salvo).
+    ``on_progress(linhas_lidas)`` é chamado na thread de quem chamou.
+    """
+    validate = LeadValidator(empreendimentos)
+    checkpoint = _Checkpoint(file_digest(file), batch_size, restart=restart)
+    result = ImportResult()
+    pending = {}
+
+    def collect(done):
+        for future in done:
+            index, lines, errors, earlier = pending.pop(future)
+            try:
+                inserted, db_errors = future.result()
+            except Exception as e:
+                result.failed_batches.append({"lote": index, "linhas": lines, "erro": str(e)})
+                continue
+            result.inserted += inserted
+            result.errors.extend(errors + db_errors)
+            checkpoint.finish(index, earlier + inserted, errors + db_errors)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mais-emp-import") as pool:
+        for index, chunk in enumerate(_chunks(iter_rows(file, filename), batch_size)):
+            result.read += len(chunk)
+            if index in checkpoint.done:
+                result.skipped += len(chunk)
+                result.errors.extend(checkpoint.done[index]["erros"])
+            else:
+                batch, errors = [], []
+                for line, raw in chunk:
+                    try:
+                        batch.append((line, validate(raw)))
+                    except ValueError as e:
+                        errors.append({"linha": line, "erro": str(e)})
+                lines = f"{chunk[0][0]}–{chunk[-1][0]}"
+                # Lote que caiu no meio numa execução anterior: só as linhas não resolvidas
+                partial = checkpoint.partial.get(index)
+                earlier = 0
+                if partial is not None:
+                    resolved = set(partial["linhas"])
+                    batch = [(line, lead) for line, lead in batch if line not in resolved]
+                    earlier = partial["inseridas"]
+                    result.skipped += earlier
+                    errors += partial["erros"]
+                on_line = lambda line, error, index=index: checkpoint.line(index, line, error)
+                pending[pool.submit(_send, batch, on_line)] = (index, lines, errors, earlier)
+                if len(pending) >= workers * 2:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            if on_progress is not None:
+                on_progress(result.read)
+        collect(wait(pending).done)
+
+    if result.inserted:
+        clear_cache(TABLE)
+    result.errors.sort(key=lambda e: e["linha"])
+    return result
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+import threading
+
+from utils.supabase_client import SUPABASE_URL, SUPABASE_KEY, PRIMARY_KEYS, apply_remote_change, is_local_echo
+from utils.snapshot import get_snapshot, set_live
+
+logger = logging.getLogger(__name__)
+
+# Feed de mudanças do Postgres (Supabase Realtime). Uma thread por processo
+# escuta INSERT/UPDATE/DELETE nas tabelas mais_emp_* e aplica cada evento
+# como uma escrita local: linha corrigida no cache e nos snapshots, sem
+# invalidar consultas. Requer as tabelas na publicação supabase_realtime
+# (sql/003_realtime.sql); bench/fake_realtime.py imita o servidor.
+REALTIME_URL = os.getenv("SUPABASE_REALTIME_URL") or f"{SUPABASE_URL}/realtime/v1"
+REALTIME_ENABLED = os.getenv("REALTIME_ENABLED", "1") == "1"
+TABLES = [t for t in PRIMARY_KEYS if t != "mais_emp_exclusoes"]
+# Espera entre tentativas de reconexão (segundos, dobra até o máximo)
+RECONNECT_MIN = 1.0
+RECONNECT_MAX = 60.0
+
+
+def handle_change(payload):
+    """Aplica um evento de postgres_changes (formato do servidor ou do cliente JS)."""
+    data = payload.get("data", payload)
+    table = data.get("table")
+    if table not in TABLES:
+        return
+    event = (data.get("type") or data.get("eventType") or "").upper()
+    new = data.get("record") or data.get("new")
+    old = data.get("old_record") or data.get("old")
+    if event not in ("INSERT", "UPDATE", "DELETE"):
+        return
+    # Eco de uma escrita deste processo (já está no cache e no snapshot, com
+    # ou sem snapshot carregado) ou linha que o delta já trouxe
+    if is_local_echo(table, event, new, old) or get_snapshot(table).contains_change(event, new, old):
+        return
+    apply_remote_change(table, event, new, old)
+
+
+class ChangeFeed:
+    def __init__(self, url=REALTIME_URL, token=SUPABASE_KEY, tables=TABLES, on_change=handle_change):
+        self.url = url
+        self.token = token
+        self.tables = list(tables)
+        self.on_change = on_change
+        self.connected = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._main()), name="mais-emp-realtime", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    async def _main(self):
+        backoff = RECONNECT_MIN
+        while not self._stop.is_set():
+            try:
+                await self._run_once()
+                backoff = RECONNECT_MIN
+            except Exception as e:
+                logger.warning("Realtime desconectado: %s", e)
+            self.connected.clear()
+            set_live(False)
+            if self._stop.is_set():
+                return
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RECONNECT_MAX)
+
+    async def _run_once(self):
+        # Import na thread do feed: o realtime (websockets) fica fora do render das páginas
+        from realtime import AsyncRealtimeClient, RealtimeSubscribeStates
+
+        client = AsyncRealtimeClient(self.url, token=self.token, auto_reconnect=False)
+        await client.connect()
+        try:
+            channel = client.channel("mais-emp-changes")
+            for table in self.tables:
+                channel.on_postgres_changes("*", table=table, schema="public", callback=self._dispatch)
+
+            def on_state(state, error):
+                if state == RealtimeSubscribeStates.SUBSCRIBED:
+                    self.connected.set()
+                    set_live(True)
+                elif error is not None:
+                    logger.warning("Canal realtime: %s (%s)", state, error)
+
+            await channel.subscribe(on_state)
+            # A conexão acaba quando a tarefa de leitura do cliente termina
+            while not self._stop.is_set():
+                task = getattr(client, "_listen_task", None)
+                if task is None or task.done():
+                    return
+                await asyncio.sleep(1)
+        finally:
+            await client.close()
+
+    def _dispatch(self, payload):
+        try:
+            self.on_change(payload)
+        except Exception:
+            logger.exception("Falha ao aplicar evento realtime")
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def start_change_feed():
+    """Inicia o feed uma única vez por processo (chamar no topo das páginas)."""
+    global _feed
+    if not REALTIME_ENABLED or not SUPABASE_URL:
+        return None
+    with _feed_lock:
+        if _feed is None:
+            _feed = ChangeFeed()
+            _feed.start()
+        return _feed
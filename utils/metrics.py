@@ -0,0 +1,327 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Instrumentação: cada chamada ao Supabase e cada etapa pesada de pandas vira
+# um "span" (tabela, operação, linhas, bytes, tempo). Os spans vão para o
+# trace do rerun atual (painel de desempenho) e para o registro do processo,
+# exportado no formato texto do Prometheus (arquivo e, opcionalmente, HTTP).
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join(".cache", "metrics.prom"))
+METRICS_WRITE_INTERVAL = float(os.getenv("METRICS_WRITE_INTERVAL", "15"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = sem endpoint HTTP
+# Só a máquina local por padrão; "0.0.0.0" expõe o endpoint na rede
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Painel de desempenho na barra lateral: só para quem administra o deploy
+# (variável de ambiente), nunca por parâmetro da URL
+PERF_PANEL = os.getenv("PERF_PANEL", "0") == "1"
+# Amostras guardadas por série para calcular p50/p95
+SAMPLES = 1000
+QUANTILES = (0.5, 0.95)
+
+_trace = contextvars.ContextVar("mais_emp_trace", default=None)
+_current = threading.local()
+
+
+class Span:
+    __slots__ = ("kind", "table", "operation", "rows", "bytes_in", "bytes_out", "ms", "ok", "response")
+
+    def __init__(self, kind, table, operation):
+        self.kind = kind
+        self.table = table
+        self.operation = operation
+        self.rows = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.ms = 0.0
+        self.ok = True
+        self.response = None
+
+    def as_dict(self):
+        return {
+            "tipo": self.kind, "tabela": self.table, "operação": self.operation, "linhas": self.rows,
+            "bytes recebidos": self.bytes_in, "bytes enviados": self.bytes_out, "ms": round(self.ms, 2), "ok": self.ok,
+        }
+
+
+class Trace:
+    """Spans de um rerun de uma página."""
+
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.ms = None
+        self.spans = []
+        self.degraded = {}  # tabela -> idade (s) do último valor bom servido
+
+
+# ---------------- Registro do processo ----------------
+class _Series:
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self):
+        self.samples = deque(maxlen=SAMPLES)
+        self.count = 0
+        self.total = 0.0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._summaries = {}
+        self._counters = {}
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._summaries.get(key)
+            if series is None:
+                series = self._summaries[key] = _Series()
+            series.samples.append(value)
+            series.count += 1
+            series.total += value
+
+    def add(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def quantiles(self, name):
+        """{labels: {0.5: v, 0.95: v, "count": n}} de um resumo."""
+        out = {}
+        with self._lock:
+            items = [(k[1], list(s.samples), s.count) for k, s in self._summaries.items() if k[0] == name]
+        for labels, samples, count in items:
+            samples.sort()
+            row = {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+            row["count"] = count
+            out[labels] = row
+        return out
+
+    def prometheus(self):
+        """Texto no formato de exposição do Prometheus."""
+        def fmt(labels, extra=()):
+            items = [*labels, *extra]
+            return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in items) + "}" if items else ""
+
+        with self._lock:
+            summaries = {k: (sorted(s.samples), s.count, s.total) for k, s in self._summaries.items()}
+            counters = dict(self._counters)
+        lines, seen = [], set()
+        for (name, labels), (samples, count, total) in sorted(summaries.items()):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} summary")
+            for q in QUANTILES:
+                value = samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0
+                lines.append(f"{name}{fmt(labels, [('quantile', q)])} {value:.6f}")
+            lines.append(f"{name}_sum{fmt(labels)} {total:.6f}")
+            lines.append(f"{name}_count{fmt(labels)} {count}")
+        for (name, labels), value in sorted(counters.items()):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _finish(span):
+    trace = _trace.get()
+    if trace is not None:
+        trace.spans.append(span)
+    labels = {"table": span.table or "-", "operation": span.operation}
+    if span.kind == "supabase":
+        if trace is not None:
+            labels["page"] = trace.page
+        registry.observe("mais_emp_supabase_request_seconds", labels, span.ms / 1000)
+        registry.add("mais_emp_supabase_response_bytes_total", labels, span.bytes_in)
+        registry.add("mais_emp_supabase_rows_total", labels, span.rows or 0)
+        if not span.ok:
+            registry.add("mais_emp_supabase_errors_total", labels, 1)
+    else:
+        registry.observe("mais_emp_pandas_stage_seconds", labels, span.ms / 1000)
+
+
+@contextmanager
+def call(table, operation, bytes_out=0):
+    """Mede uma chamada HTTP ao Supabase; os bytes vêm do hook do httpx."""
+    span = Span("supabase", table, operation)
+    span.bytes_out = bytes_out
+    previous = getattr(_current, "span", None)
+    _current.span = span
+    started = time.perf_counter()
+    try:
+        yield span
+    except Exception:
+        span.ok = False
+        raise
+    finally:
+        span.ms = (time.perf_counter() - started) * 1000
+        _current.span = previous
+        if span.response is not None:
+            span.bytes_in = span.response.num_bytes_downloaded
+            span.response = None
+        _finish(span)
+
+
+@contextmanager
+def stage(operation, table=None, rows=None):
+    """Mede uma etapa de pandas (conversão, merge, agregação...)."""
+    span = Span("pandas", table, operation)
+    span.rows = rows
+    started = time.perf_counter()
+    try:
+        yield span
+    finally:
+        span.ms = (time.perf_counter() - started) * 1000
+        _finish(span)
+
+
+def _on_response(response):
+    span = getattr(_current, "span", None)
+    if span is not None:
+        span.response = response
+
+
+def instrument(http_client):
+    """Liga o hook de resposta num cliente httpx (uma vez por cliente)."""
+    hooks = http_client.event_hooks
+    if _on_response not in hooks.get("response", []):
+        hooks["response"] = [*hooks.get("response", []), _on_response]
+        http_client.event_hooks = hooks
+    return http_client
+
+
+def degraded(table, age):
+    """Anota no trace que ``table`` foi servida do último valor bom (Supabase fora)."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.degraded[table] = max(age, trace.degraded.get(table, 0))
+
+
+def propagate(fn):
+    """``fn`` rodando no contexto atual (trace da página) quando for para outra thread."""
+    return partial(contextvars.copy_context().run, fn)
+
+
+# ---------------- Páginas ----------------
+def begin_page(page):
+    """Abre o trace do rerun (chamar no topo da página)."""
+    trace = Trace(page)
+    _trace.set(trace)
+    return trace
+
+
+def end_page():
+    """Fecha o trace, registra o tempo da página e mostra o painel se habilitado."""
+    trace = _trace.get()
+    if trace is None:
+        return None
+    trace.ms = (time.perf_counter() - trace.started) * 1000
+    registry.observe("mais_emp_page_render_seconds", {"page": trace.page}, trace.ms / 1000)
+    _trace.set(None)
+    write_metrics_file()
+    _serve_metrics()
+    if trace.degraded:
+        degraded_notice(trace)
+    if panel_enabled():
+        perf_panel(trace)
+    return trace
+
+
+def panel_enabled():
+    return PERF_PANEL
+
+
+def degraded_notice(trace):
+    """Aviso de que parte da página mostra dados guardados, não os atuais."""
+    import streamlit as st
+
+    age = max(trace.degraded.values())
+    when = f"{age / 60:.0f} min" if age >= 60 else f"{age:.0f} s"
+    st.toast(f"Supabase instável: mostrando dados de até {when} atrás.", icon="⚠️")
+
+
+def perf_panel(trace):
+    """Painel (sidebar) com o trace do rerun e os p50/p95 do processo."""
+    import pandas as pd
+    import streamlit as st
+
+    calls = [s for s in trace.spans if s.kind == "supabase"]
+    with st.sidebar.expander("⏱️ Desempenho", expanded=False):
+        st.caption(
+            f"Rerun: {trace.ms:.0f} ms · {len(calls)} chamada(s) ao Supabase · "
+            f"{sum(s.bytes_in for s in calls) / 1024:.1f} KiB recebidos"
+        )
+        if trace.spans:
+            st.dataframe(pd.DataFrame([s.as_dict() for s in trace.spans]), hide_index=True)
+        rows = []
+        for name, label in (("mais_emp_page_render_seconds", "página"), ("mais_emp_supabase_request_seconds", "supabase")):
+            for labels, q in registry.quantiles(name).items():
+                labels = dict(labels)
+                if label == "supabase" and labels.get("page") != trace.page:
+                    continue
+                rows.append({
+                    "série": label, "página": labels.get("page", ""), "tabela": labels.get("table", ""),
+                    "operação": labels.get("operation", ""), "p50 (ms)": round(q[0.5] * 1000, 1),
+                    "p95 (ms)": round(q[0.95] * 1000, 1), "n": q["count"],
+                })
+        if rows:
+            st.dataframe(pd.DataFrame(rows), hide_index=True)
+
+
+# ---------------- Exportação ----------------
+_last_write = 0.0
+_write_lock = threading.Lock()
+
+
+def write_metrics_file(force=False):
+    """Grava o texto do Prometheus em METRICS_FILE (no máximo a cada METRICS_WRITE_INTERVAL)."""
+    global _last_write
+    if not METRICS_FILE:
+        return
+    now = time.monotonic()
+    with _write_lock:
+        if not force and now - _last_write < METRICS_WRITE_INTERVAL:
+            return
+        _last_write = now
+    os.makedirs(os.path.dirname(METRICS_FILE) or ".", exist_ok=True)
+    tmp = f"{METRICS_FILE}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registry.prometheus())
+    os.replace(tmp, METRICS_FILE)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.prometheus().encode()
+        self.send_response(200 if self.path.startswith("/metrics") else 404)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def _serve_metrics():
+    # Endpoint /metrics para o Prometheus (uma vez por processo, se METRICS_PORT)
+    global _server
+    if not METRICS_PORT or _server is not None:
+        return
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((METRICS_HOST, METRICS_PORT), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
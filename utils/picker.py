@@ -0,0 +1,55 @@
+import streamlit as st
+
+from utils.search import SEARCH_COLUMNS, search, search_filters
+from utils.supabase_client import PRIMARY_KEYS, Filters, get_page, get_record
+
+# Quantas opções cada busca traz do servidor
+PICKER_LIMIT = 20
+
+
+def _search_filters(table_name, search_columns, term, limit):
+    # Colunas com índice de busca (utils/search.py): sem acento e tolerante a
+    # erro de digitação; as demais continuam no ilike do servidor
+    if set(search_columns) <= set(SEARCH_COLUMNS.get(table_name, ())):
+        return search_filters(table_name, search(table_name, term, search_columns, limit=limit + 1))
+    return Filters().any_ilike(search_columns, term)
+
+
+def record_picker(key, label, table_name, columns, format_func, search_columns=None, filters_for=None,
+                  order_by=None, descending=False, limit=PICKER_LIMIT, multiple=False, record_columns="*"):
+    """Seleção com busca no servidor, no lugar de um selectbox com a tabela inteira.
+
+    A cada busca só as ``limit`` primeiras linhas que batem (projeção
+    ``columns``) são pedidas, com ``get_page`` — então o resultado fica no
+    cache e repetir o termo não vai ao Supabase. O ``text_input`` só dispara
+    no Enter ou ao sair do campo, o que já serve de debounce.
+
+    ``filters_for(term)`` monta os filtros da busca (padrão: busca indexada
+    em ``search_columns``, ou ``ilike`` se a tabela não tem índice). Devolve o registro completo (``record_columns``)
+    do item escolhido, ou a lista de ids quando ``multiple=True``.
+    """
+    pk = PRIMARY_KEYS[table_name]
+    term = st.text_input(f"Buscar — {label}", key=f"{key}_term", placeholder="Digite e tecle Enter")
+    filters = filters_for(term) if filters_for is not None else _search_filters(table_name, search_columns, term, limit)
+    rows, more = get_page(table_name, columns=columns, filters=filters, order_by=order_by,
+                          descending=descending, page_size=limit)
+
+    # Rótulos das opções; os já escolhidos continuam disponíveis ao trocar o termo
+    selected = st.session_state.get(f"{key}_sel") if multiple else None
+    previous = st.session_state.get(f"{key}_labels", {})
+    labels = {i: previous[i] for i in (selected or []) if i in previous}
+    labels.update((row[pk], format_func(row)) for row in rows)
+    st.session_state[f"{key}_labels"] = labels
+
+    ids = list(labels) if multiple else [row[pk] for row in rows]
+    if more is not None:
+        st.caption(f"Mostrando os {limit} primeiros resultados; refine a busca para ver outros.")
+    if multiple:
+        return st.multiselect(label, ids, format_func=lambda i: labels.get(i, str(i)), key=f"{key}_sel")
+    if not ids:
+        st.info("Nenhum registro encontrado.")
+        return None
+    chosen = st.selectbox(label, ids, format_func=lambda i: labels.get(i, str(i)), key=f"{key}_sel")
+    if chosen is None:
+        return None
+    return get_record(table_name, chosen, columns=record_columns)
@@ -0,0 +1,196 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import metrics
+from utils.snapshot import get_snapshot
+from utils.supabase_client import on_change
+
+logger = logging.getLogger(__name__)
+
+# Tendências do Resumo a partir de agregados diários. No banco, as tabelas
+# de sql/006_rollups.sql têm uma linha por dia × grupo, mantidas por
+# trigger; aqui elas seguem o snapshot incremental (utils/snapshot.py) e,
+# a cada versão, viram um cubo dia × grupo com soma acumulada nos dias: o
+# total de qualquer intervalo é uma subtração de duas linhas, sem depender
+# de quantos leads existem. Sem o sql/006 os mesmos agregados saem dos
+# snapshots das tabelas de origem (uma vez por versão).
+TIMEZONE = os.getenv("ROLLUP_TIMEZONE", "America/Sao_Paulo")  # o mesmo do sql/006
+# Tabela de rollup ausente: tenta de novo depois de MISSING_RETRY segundos
+MISSING_RETRY = float(os.getenv("ROLLUP_MISSING_RETRY", "300"))
+
+ROLLUPS = {
+    "leads": {
+        "table": "mais_emp_rollup_leads",
+        "source": "mais_emp_lead",
+        "day": "created_at",
+        "dims": ("id_empreendimento", "potencial"),
+        "measure": "leads",
+    },
+    "agendamentos": {
+        "table": "mais_emp_rollup_agendamentos",
+        "source": "mais_emp_agendamento",
+        "day": "data",
+        "dims": ("tipo_evento", "status"),
+        "measure": "agendamentos",
+    },
+}
+
+
+def _days(values):
+    # timestamptz → dia no fuso local; date → meia-noite sem fuso
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        return values.dt.tz_convert(TIMEZONE).dt.tz_localize(None).dt.normalize()
+    return pd.to_datetime(values, errors="coerce").dt.normalize()
+
+
+def _nullable(values):
+    # Grupos como objetos Python (None no lugar de NA) para os filtros e rótulos
+    values = values.astype(object)
+    return values.where(values.notna(), None)
+
+
+class RollupCube:
+    """Contagens por dia × grupo com soma acumulada nos dias.
+
+    A linha 0 de ``_cum`` é zero e a linha ``k`` acumula até o dia
+    ``start + k - 1``; ``totals`` custa O(grupos) e ``series`` é
+    proporcional ao tamanho do gráfico, qualquer que seja o intervalo.
+    """
+
+    def __init__(self, frame, dims, measure, version=None):
+        self.dims = tuple(dims)
+        self.measure = measure
+        self.version = version
+        self.start = self.end = None
+        self.groups = pd.DataFrame(columns=list(self.dims))
+        self._cum = np.zeros((1, 0), dtype=np.int64)
+        if frame is None or frame.empty:
+            return
+        days = _days(frame["dia"])
+        counts = frame[measure].fillna(0).astype("int64")
+        keep = days.notna() & (counts != 0)
+        if not keep.any():
+            return
+        days, counts, frame = days[keep], counts[keep], frame[keep]
+        keys = pd.Series(list(zip(*(_nullable(frame[d]) for d in self.dims))), index=frame.index)
+        codes, uniques = pd.factorize(keys)
+        self.groups = pd.DataFrame(list(uniques), columns=list(self.dims))
+        self.start, self.end = days.min(), days.max()
+        rows = (days - self.start).dt.days.to_numpy() + 1
+        cube = np.zeros((rows.max() + 1, len(uniques)), dtype=np.int64)
+        np.add.at(cube, (rows, codes), counts.to_numpy())
+        self._cum = cube.cumsum(axis=0)
+
+    @property
+    def empty(self):
+        return self.start is None
+
+    def _rows(self, days):
+        # Linha do acumulado até cada dia (antes do início → 0, depois do fim → última)
+        if self.start is None:
+            return np.zeros(len(days), dtype=np.int64)
+        offsets = (pd.DatetimeIndex(days) - self.start).days.to_numpy() + 1
+        return np.clip(offsets, 0, len(self._cum) - 1)
+
+    def _mask(self, where):
+        mask = np.ones(len(self.groups), dtype=bool)
+        for column, values in (where or {}).items():
+            if values is not None:
+                mask &= self.groups[column].isin(list(values)).to_numpy()
+        return mask
+
+    def totals(self, start, end, by=(), where=None):
+        """Soma de ``start`` a ``end`` (inclusive) por ``by``; sem ``by``, o total (int).
+
+        ``where`` filtra os grupos: ``{"id_empreendimento": [1, 2]}``.
+        """
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        lo, hi = self._rows([start - pd.Timedelta(days=1), end])
+        mask = self._mask(where)
+        values = (self._cum[hi] - self._cum[lo])[mask]
+        if not by:
+            return int(values.sum())
+        frame = self.groups.loc[mask, list(by)].assign(**{self.measure: values})
+        return frame.groupby(list(by), dropna=False, sort=False)[self.measure].sum().reset_index()
+
+    def series(self, start, end, by, freq="D", where=None):
+        """Contagens por período (``freq`` "D" dia ou "W" semana) com uma coluna por valor de ``by``."""
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        days = pd.date_range(start, end, freq="D")
+        mask = self._mask(where)
+        hi = self._rows(days)
+        lo = self._rows(days - pd.Timedelta(days=1))
+        daily = pd.DataFrame(self._cum[hi][:, mask] - self._cum[lo][:, mask], index=days)
+        labels = self.groups.loc[mask, by].to_numpy()
+        frame = daily.T.groupby(labels, dropna=False, sort=False).sum().T if mask.any() else daily
+        if freq == "W":
+            frame = frame.resample("W-MON", label="left", closed="left").sum()
+        frame.index.name = "periodo"
+        return frame
+
+
+_cubes = {}
+_cubes_lock = threading.Lock()
+_missing = {}  # rollup → time.monotonic() da última vez em que a tabela não existia
+
+
+def _aggregate(frame, spec):
+    # Mesmo formato da tabela de rollup, calculado a partir das linhas de origem
+    dims = list(spec["dims"])
+    if frame is None or frame.empty:
+        return pd.DataFrame(columns=["dia", *dims, spec["measure"]])
+    with metrics.stage("rollup_aggregate", spec["source"], rows=len(frame)):
+        grouped = pd.DataFrame({"dia": _days(frame[spec["day"]]), **{d: _nullable(frame[d]) for d in dims}})
+        return grouped.groupby(["dia", *dims], dropna=False).size().reset_index(name=spec["measure"])
+
+
+def _current(spec):
+    """(origem, frame, versão): a tabela de rollup ou, sem ela, a tabela de origem."""
+    stamp = _missing.get(spec["table"])
+    if stamp is None or time.monotonic() - stamp >= MISSING_RETRY:
+        snap = get_snapshot(spec["table"])
+        try:
+            snap.sync()
+        except Exception as e:
+            logger.info("Rollup %s indisponível (%s); agregando %s", spec["table"], e, spec["source"])
+            _missing[spec["table"]] = time.monotonic()
+        else:
+            _missing.pop(spec["table"], None)
+            return ("rollup", *snap.current())
+    snap = get_snapshot(spec["source"])
+    snap.sync()
+    return ("local", *snap.current())
+
+
+def get_rollup(name):
+    """Cubo de ``name`` ("leads" ou "agendamentos") para a versão atual dos dados."""
+    spec = ROLLUPS[name]
+    source, frame, version = _current(spec)
+    key = (source, version)
+    with _cubes_lock:
+        cube = _cubes.get(name)
+        if cube is not None and cube.version == key:
+            return cube
+    if source == "local":
+        frame = _aggregate(frame, spec)
+    with metrics.stage("rollup_cube", spec["table"], rows=len(frame)):
+        cube = RollupCube(frame, spec["dims"], spec["measure"], version=key)
+    with _cubes_lock:
+        _cubes[name] = cube
+    return cube
+
+
+def _on_change(table_name, event, new, old):
+    # Escrita deste processo numa tabela de origem: o trigger já mudou o
+    # rollup no banco, a próxima leitura busca o delta
+    for spec in ROLLUPS.values():
+        if spec["source"] == table_name:
+            get_snapshot(spec["table"]).mark_stale()
+
+
+on_change(_on_change)
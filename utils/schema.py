@@ -0,0 +1,164 @@
+import pandas as pd
+
+from utils import metrics
+
+# Tipos das colunas de cada tabela. A conversão é feita uma vez, quando os
+# dados entram no processo (snapshot ou cache); as páginas só formatam na
+# hora de exibir (column_config do st.dataframe).
+TEXT = "string[pyarrow]"
+CATEGORY = "category"   # poucos valores distintos (potencial, status, ...)
+FLOAT = "Float64"
+INTEGER = "Int64"
+DATETIME = "datetime"   # timestamptz → datetime64[ns, UTC]
+DATE = "date"           # date → datetime64[ns]
+
+_TIMESTAMPS = {"created_at": DATETIME, "updated_at": DATETIME}
+
+SCHEMAS = {
+    "mais_emp_usuarios": {
+        "nome": TEXT,
+        "telefone": TEXT,
+        "email": TEXT,
+        **_TIMESTAMPS,
+    },
+    "mais_emp_empreendimentos": {
+        "nome": TEXT,
+        "localizacao": TEXT,
+        "tipo": CATEGORY,
+        "link_pdf": TEXT,
+        "link_tour_360_computador": TEXT,
+        "link_tour_360_mobile": TEXT,
+        **_TIMESTAMPS,
+    },
+    "mais_emp_lead": {
+        "nome": TEXT,
+        "objetivo": CATEGORY,
+        "forma_pagamento": CATEGORY,
+        "renda_familiar": FLOAT,
+        "potencial": CATEGORY,
+        "interesse_empreendimento": TEXT,
+        **_TIMESTAMPS,
+    },
+    "mais_emp_agendamento": {
+        "tipo_evento": CATEGORY,
+        "data": DATE,
+        "horario": TEXT,
+        "status": CATEGORY,
+        "negociacao": TEXT,
+        **_TIMESTAMPS,
+    },
+    "mais_emp_rollup_leads": {
+        "dia": DATE,
+        "id_empreendimento": INTEGER,
+        "potencial": CATEGORY,
+        "leads": INTEGER,
+        "updated_at": DATETIME,
+    },
+    "mais_emp_rollup_agendamentos": {
+        "dia": DATE,
+        "tipo_evento": CATEGORY,
+        "status": CATEGORY,
+        "agendamentos": INTEGER,
+        "updated_at": DATETIME,
+    },
+}
+
+
+def _convert(series, kind):
+    if kind == DATETIME:
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            return series
+        return pd.to_datetime(series, errors="coerce", utc=True, format="ISO8601")
+    if kind == DATE:
+        if pd.api.types.is_datetime64_dtype(series.dtype):
+            return series
+        return pd.to_datetime(series, errors="coerce", format="ISO8601")
+    if kind == CATEGORY:
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return series
+        return series.astype("string").astype("category")
+    if str(series.dtype) == kind:
+        return series
+    return series.astype(kind)
+
+
+def apply_schema(table_name, df):
+    """Converte (no próprio DataFrame) as colunas conhecidas da tabela."""
+    for column, kind in SCHEMAS.get(table_name, {}).items():
+        if column in df.columns:
+            df[column] = _convert(df[column], kind)
+    return df
+
+
+def to_frame(table_name, rows, columns=None):
+    """Linhas JSON do Supabase → DataFrame tipado (colunas ausentes vêm vazias)."""
+    with metrics.stage("to_frame", table_name, rows=len(rows)):
+        df = pd.DataFrame(rows)
+        if columns is not None:
+            for c in columns:
+                if c not in df.columns:
+                    df[c] = None
+        return apply_schema(table_name, df)
+
+
+def concat_frames(table_name, frames):
+    """Concatena mantendo os tipos (categorias diferentes viram object no concat).
+
+    Coluna só com nulos num dos pedaços (ex.: id_usuario vazio nas linhas
+    novas) recebe o tipo do pedaço que tem valores; se nenhum tem, sai do
+    concat e volta vazia depois. Sem isso o pandas testa célula a célula
+    (lento em tabelas grandes e com FutureWarning).
+    """
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    with metrics.stage("concat", table_name, rows=sum(len(f) for f in frames)):
+        columns = list(dict.fromkeys(c for f in frames for c in f.columns))
+        nulls = [{c for c in f.columns if f[c].isna().all()} for f in frames]
+        dtypes = {}
+        for f, null in zip(frames, nulls):
+            for c in f.columns:
+                if c not in null:
+                    dtypes.setdefault(c, f[c].dtype)
+        empty = [c for c in columns if c not in dtypes]
+        aligned = []
+        for f, null in zip(frames, nulls):
+            f = f.drop(columns=[c for c in empty if c in f.columns])
+            for c in null.difference(empty):
+                if f[c].dtype != dtypes[c]:
+                    try:
+                        f = f.astype({c: dtypes[c]})
+                    except (TypeError, ValueError):
+                        pass
+            aligned.append(f)
+        df = pd.concat(aligned, ignore_index=True)
+        for c in empty:
+            df[c] = None
+        return apply_schema(table_name, df[columns])
+
+
+def _plain(value):
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        if value.tzinfo is None and value == value.normalize():
+            return value.date().isoformat()
+        return value.isoformat()
+    if hasattr(value, "item"):  # escalares numpy
+        value = value.item()
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+def to_records(df):
+    """DataFrame tipado → lista de dicts com valores simples (como vêm do Supabase).
+
+    Use nos selects: NA/NaT viram None e datas voltam a ser texto ISO.
+    """
+    return [{k: _plain(v) for k, v in row.items()} for row in df.to_dict("records")]
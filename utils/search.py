@@ -0,0 +1,328 @@
+import logging
+import os
+import re
+import threading
+import unicodedata
+from array import array
+
+import numpy as np
+
+from utils import metrics
+from utils.snapshot import get_snapshot
+from utils.supabase_client import PRIMARY_KEYS, Filters, get_page, on_change, rpc
+
+logger = logging.getLogger(__name__)
+
+# Busca por nome/e-mail sem diferenciar acento, caixa e pequenos erros de
+# digitação ("Jose" acha "José", "Joze" também). Cada texto vira trigramas
+# como no pg_trgm; a nota é a fração dos trigramas da busca presentes no
+# texto (o word_similarity do Postgres); no empate vence o texto mais curto.
+#
+# SEARCH_BACKEND=local (padrão) usa um índice em memória montado a partir
+# do snapshot e atualizado só nas linhas que mudaram; pg_trgm usa a função
+# mais_emp_buscar do banco (sql/005_busca.sql).
+#
+# O índice local é montado numa thread: enquanto a primeira montagem não
+# termina, a busca vira um ilike no servidor (sem tolerância a acento e
+# erros). Depois cada escrita (deste processo ou do feed realtime) chega
+# pelo on_change e muda só a própria linha.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "local")
+SEARCH_THRESHOLD = float(os.getenv("SEARCH_THRESHOLD", "0.4"))
+# Colunas indexadas de cada tabela; as páginas buscam em todas ou em parte delas
+SEARCH_COLUMNS = {
+    # objetivo é categoria (Moradia/Investimento): buscar nela só traria
+    # ruído e, no pg_trgm, um OR sem índice
+    "mais_emp_lead": ("nome",),
+    "mais_emp_usuarios": ("nome", "email"),
+    "mais_emp_empreendimentos": ("nome", "localizacao"),
+}
+# Quantos resultados (os mais relevantes) viram filtro de chave no servidor
+SEARCH_MAX_IDS = int(os.getenv("SEARCH_MAX_IDS", "500"))
+# Posições mortas (linhas alteradas/apagadas) toleradas antes de remontar
+COMPACT_RATIO = 0.25
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def fold(text):
+    """Minúsculas, sem acento e só letras/dígitos separados por espaço."""
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def trigrams(folded):
+    """Trigramas de cada palavra com as bordas do pg_trgm ("  jo", " jos", ..., "se ")."""
+    grams = set()
+    for word in folded.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SearchIndex:
+    """Índice de trigramas de algumas colunas de texto de uma tabela.
+
+    Cada linha ocupa uma posição; a lista de posições de cada trigrama
+    (por coluna) fica num ``array`` que o numpy lê sem cópia, e a busca é um
+    ``bincount`` sobre as listas dos trigramas do termo. Linha alterada ou
+    apagada só marca a posição antiga como morta; quando as mortas passam
+    de COMPACT_RATIO o índice é remontado.
+    """
+
+    def __init__(self, table_name, columns):
+        self.table = table_name
+        self.columns = tuple(columns)
+        self.pk = PRIMARY_KEYS[table_name]
+        self.version = None
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._ids = []
+        self._alive = bytearray()
+        self._lengths = array("i")  # desempate: texto mais curto = casamento mais exato
+        self._rows = {}  # chave -> (posição, valores originais)
+        self._postings = [{} for _ in self.columns]
+        self._dead = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _add(self, key, values, memo):
+        pos = len(self._ids)
+        self._ids.append(key)
+        self._alive.append(1)
+        self._rows[key] = (pos, values)
+        length = 0
+        for postings, value in zip(self._postings, values):
+            # Valores repetidos (categorias, nomes comuns) são processados uma vez
+            folded = memo.get(value)
+            if folded is None:
+                text = fold(value)
+                folded = memo[value] = (len(text), tuple(trigrams(text)))
+            length += folded[0]
+            for gram in folded[1]:
+                bucket = postings.get(gram)
+                if bucket is None:
+                    bucket = postings[gram] = array("i")
+                bucket.append(pos)
+        self._lengths.append(length)
+
+    def _remove(self, key):
+        pos, _ = self._rows.pop(key)
+        self._alive[pos] = 0
+        self._dead += 1
+
+    def _compact(self, memo):
+        if self._dead > COMPACT_RATIO * max(len(self._ids), 1):
+            rows = [(k, v) for k, (_, v) in self._rows.items()]
+            self._reset()
+            for key, values in rows:
+                self._add(key, values, memo)
+
+    def apply(self, event, new=None, old=None):
+        """Refaz a linha de uma escrita (INSERT/UPDATE/DELETE); colunas ausentes mantêm o valor indexado."""
+        row = {**(old or {}), **(new or {})}
+        key = row.get(self.pk)
+        if key is None:
+            return
+        current = self._rows.get(key)
+        if event == "DELETE":
+            if current is not None:
+                self._remove(key)
+                self._compact({})
+            return
+        values = tuple(
+            row[c] if c in row else (current[1][i] if current is not None else None)
+            for i, c in enumerate(self.columns)
+        )
+        if current is not None:
+            if current[1] == values:
+                return
+            self._remove(key)
+        self._add(key, values, {})
+        self._compact({})
+
+    def update(self, frame, version):
+        """Leva o índice à versão ``version`` do snapshot, refazendo só as linhas diferentes."""
+        with self.lock:
+            if version == self.version:
+                return
+            if frame.empty or self.pk not in frame.columns:
+                keys, columns = [], [[] for _ in self.columns]
+            else:
+                keys = frame[self.pk].tolist()
+                columns = [
+                    frame[c].astype(object).where(frame[c].notna(), None).tolist() if c in frame.columns else [None] * len(frame)
+                    for c in self.columns
+                ]
+            memo = {}
+            with metrics.stage("search_index", self.table, rows=len(keys)):
+                seen = set()
+                for key, *values in zip(keys, *columns):
+                    values = tuple(values)
+                    seen.add(key)
+                    current = self._rows.get(key)
+                    if current is not None and current[1] == values:
+                        continue
+                    if current is not None:
+                        self._remove(key)
+                    self._add(key, values, memo)
+                for key in [k for k in self._rows if k not in seen]:
+                    self._remove(key)
+                self._compact(memo)
+            self.version = version
+
+    def search(self, term, columns=None, limit=None, threshold=SEARCH_THRESHOLD):
+        """[(chave, nota)] das linhas parecidas com ``term``, da mais para a menos relevante.
+
+        ``columns`` restringe a busca a algumas das colunas indexadas; a
+        nota da linha é a melhor entre elas (1.0 = todos os trigramas do
+        termo aparecem no texto).
+        """
+        grams = trigrams(fold(term))
+        if not grams:
+            return []
+        wanted = [i for i, c in enumerate(self.columns) if columns is None or c in columns]
+        with self.lock:
+            size = len(self._ids)
+            if not size:
+                return []
+            hits = np.zeros(size, dtype=np.int64)
+            for i in wanted:
+                buckets = [np.frombuffer(self._postings[i][g], dtype=np.int32) for g in grams if g in self._postings[i]]
+                if buckets:
+                    np.maximum(hits, np.bincount(np.concatenate(buckets), minlength=size), out=hits)
+                del buckets  # solta a visão dos arrays (senão o próximo append falha)
+            hits *= np.frombuffer(self._alive, dtype=np.uint8)
+            found = np.flatnonzero(hits >= threshold * len(grams))
+            lengths = np.frombuffer(self._lengths, dtype=np.int32)[found]
+            order = found[np.lexsort((lengths, -hits[found]))][:limit]
+            scores = (hits[order] / len(grams)).tolist()
+            return [(self._ids[pos], score) for pos, score in zip(order.tolist(), scores)]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_building = {}  # tabela → thread montando/atualizando o índice
+
+
+def _build(index):
+    # Roda fora do rerun: sincroniza o snapshot e leva o índice até a versão
+    # atual (escritas que chegam durante a montagem entram na volta seguinte)
+    try:
+        snap = get_snapshot(index.table)
+        snap.sync()
+        while True:
+            frame, version = snap.current()
+            if index.version == version:
+                break
+            index.update(frame, version)
+    except Exception:
+        logger.exception("Falha ao montar o índice de busca de %s", index.table)
+    finally:
+        with _indexes_lock:
+            _building.pop(index.table, None)
+
+
+def get_search_index(table_name):
+    """Índice de SEARCH_COLUMNS da tabela; None enquanto a primeira montagem roda.
+
+    Não bloqueia: se o índice está atrás do snapshot, uma thread o atualiza
+    e a busca usa a versão anterior até ela terminar.
+    """
+    snap = get_snapshot(table_name)
+    with _indexes_lock:
+        index = _indexes.get(table_name)
+        if index is None:
+            index = _indexes[table_name] = SearchIndex(table_name, SEARCH_COLUMNS[table_name])
+        # Leitura sem o lock do snapshot: uma sincronização em curso não trava o rerun
+        if table_name not in _building and (index.version != snap.version or snap.due()):
+            thread = _building[table_name] = threading.Thread(
+                target=_build, args=(index,), name=f"mais-emp-search-{table_name}", daemon=True,
+            )
+            thread.start()
+    return index if index.version is not None else None
+
+
+def _on_change(table_name, event, new, old):
+    # Escrita já aplicada no snapshot: o índice muda só essa linha. Se ele
+    # estava atrás (delta sincronizado por outro caminho), a próxima busca
+    # o atualiza em segundo plano.
+    with _indexes_lock:
+        index = _indexes.get(table_name)
+    if index is None:
+        return
+    version = get_snapshot(table_name).version  # sem aplicar as pendências do snapshot
+    with index.lock:
+        if index.version == version - 1:
+            index.apply(event, new, old)
+            index.version = version
+
+
+on_change(_on_change)
+
+
+def _ilike_search(table_name, term, columns, limit):
+    # Índice ainda montando: "contém o termo" em alguma coluna, no servidor
+    pk = PRIMARY_KEYS[table_name]
+    rows, _ = get_page(table_name, columns=(pk, *columns), filters=Filters().any_ilike(columns, str(term).strip()),
+                       page_size=limit or SEARCH_MAX_IDS)
+    return [(row[pk], 1.0) for row in rows]
+
+
+def _server_search(table_name, term, columns, limit, threshold):
+    rows = rpc("mais_emp_buscar", {
+        "p_tabela": table_name, "p_colunas": list(columns), "p_termo": term,
+        "p_limite": limit or SEARCH_MAX_IDS, "p_limiar": threshold,
+    }, table_name=table_name)
+    return [(row["id"], float(row["score"])) for row in rows or []]
+
+
+def search(table_name, term, columns=None, limit=SEARCH_MAX_IDS, threshold=SEARCH_THRESHOLD):
+    """Resultados ``[(chave, nota)]`` em ordem de relevância; None se o termo está vazio.
+
+    ``columns`` é um subconjunto de SEARCH_COLUMNS da tabela (padrão: todas).
+    As chaves vêm como estão na tabela (no backend pg_trgm, como texto).
+    """
+    if not term or not str(term).strip():
+        return None
+    columns = tuple(columns or SEARCH_COLUMNS[table_name])
+    if SEARCH_BACKEND == "pg_trgm":
+        return _server_search(table_name, term, columns, limit, threshold)
+    index = get_search_index(table_name)
+    if index is None:
+        return _ilike_search(table_name, term, columns, limit)
+    return index.search(term, columns=columns, limit=limit, threshold=threshold)
+
+
+def combine(*results):
+    """Interseção de várias buscas (campos em E), somando as notas; None é ignorado."""
+    results = [r for r in results if r is not None]
+    if not results:
+        return None
+    scores = {str(key): (key, score) for key, score in results[0]}
+    for other in results[1:]:
+        other = {str(key): score for key, score in other}
+        scores = {k: (key, score + other[k]) for k, (key, score) in scores.items() if k in other}
+    return sorted(scores.values(), key=lambda r: -r[1])
+
+
+def rank(df, pk, hits):
+    """Linhas de ``df`` presentes em ``hits``, na ordem de relevância (None = sem busca)."""
+    if hits is None:
+        return df
+    order = {str(key): i for i, (key, _) in enumerate(hits)}
+    pos = df[pk].astype(str).map(order)
+    return df[pos.notna()].iloc[pos.dropna().argsort()].reset_index(drop=True)
+
+
+def search_filters(table_name, hits, filters=None, limit=SEARCH_MAX_IDS):
+    """``filters`` com a chave restrita aos ``limit`` resultados mais relevantes (None = sem busca)."""
+    filters = filters if filters is not None else Filters()
+    if hits is None:
+        return filters
+    return filters.in_(PRIMARY_KEYS[table_name], [key for key, _ in hits[:limit]])
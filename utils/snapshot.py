@@ -0,0 +1,366 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from utils import metrics
+from utils.schema import apply_schema, concat_frames, to_frame
+from utils.supabase_client import (
+    PRIMARY_KEYS, BATCH_TIMEOUT, Filters, is_missing_table, is_transient, iter_table_pages, on_change, on_write, run_parallel,
+)
+
+# Cópia local (Parquet) de cada tabela, atualizada só com o que mudou.
+# Depende de sql/002_sync_incremental.sql (updated_at + mais_emp_exclusoes);
+# sem ele, cada sincronização baixa a tabela inteira.
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(".cache", "snapshots"))
+# Intervalo mínimo entre sincronizações da mesma tabela (segundos)
+SYNC_INTERVAL = float(os.getenv("SNAPSHOT_SYNC_INTERVAL", "15"))
+# Com o feed de realtime conectado (utils/live.py) as mudanças chegam por
+# push; o delta vira só uma rede de segurança.
+LIVE_SYNC_INTERVAL = float(os.getenv("SNAPSHOT_LIVE_SYNC_INTERVAL", "300"))
+WATERMARK_COLUMN = "updated_at"
+TOMBSTONE_TABLE = "mais_emp_exclusoes"
+# Relê um pouco antes da marca para tolerar relógio/commits atrasados;
+# reaplicar upserts e exclusões não muda o resultado.
+OVERLAP = pd.Timedelta(minutes=5)
+
+
+def _watermark(df, column):
+    if df.empty or column not in df.columns:
+        return None
+    ts = pd.to_datetime(df[column], errors="coerce", utc=True).max()
+    return None if pd.isna(ts) else ts.isoformat()
+
+
+def _since(mark):
+    return (pd.Timestamp(mark) - OVERLAP).isoformat()
+
+
+def _collect(table_name, **kwargs):
+    rows = []
+    for page in iter_table_pages(table_name, **kwargs):
+        rows.extend(page)
+    return to_frame(table_name, rows)
+
+
+class TableSnapshot:
+    def __init__(self, table_name, directory=SNAPSHOT_DIR):
+        self.table = table_name
+        self.pk = PRIMARY_KEYS[table_name]
+        self.directory = directory
+        self.path = os.path.join(directory, f"{table_name}.parquet")
+        self.meta_path = os.path.join(directory, f"{table_name}.json")
+        self.frame = None
+        self.version = 0  # muda a cada alteração do frame (índices derivados usam)
+        # Escritas/eventos ainda fora do frame: chave → linha (None = apagada).
+        # Entram todas juntas na próxima leitura, num concat só.
+        self._pending = {}
+        self._positions = None  # chave → posição da linha no frame (montado sob demanda)
+        self.meta = {}
+        self.synced_at = None  # time.monotonic() da última sincronização
+        self.lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        self._loaded = True
+        if not (os.path.exists(self.path) and os.path.exists(self.meta_path)):
+            return
+        try:
+            with metrics.stage("parquet_read", self.table):
+                frame = apply_schema(self.table, pd.read_parquet(self.path))
+            with open(self.meta_path, encoding="utf-8") as fh:
+                meta = json.load(fh)
+        except Exception:
+            return  # arquivo corrompido: a próxima sincronização refaz tudo
+        self._set_frame(frame)
+        self.meta = meta
+
+    def _set_frame(self, frame):
+        self.frame = frame
+        self._positions = None
+        self.version += 1
+
+    def _key(self, value):
+        # Chave do evento no tipo da coluna (JSON/página podem trazer "12" ou 12.0)
+        if value is None or self.frame is None or self.pk not in self.frame.columns:
+            return value
+        if self.frame[self.pk].dtype.kind in "iuf" or str(self.frame[self.pk].dtype) == "Int64":
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return value
+        return str(value)
+
+    def _row(self, key):
+        """Linha atual de ``key`` (pendente ou do frame); None se não existe."""
+        if key in self._pending:
+            return self._pending[key]
+        if self.frame is None or self.frame.empty or self.pk not in self.frame.columns:
+            return None
+        if self._positions is None:
+            self._positions = {k: i for i, k in enumerate(self.frame[self.pk].tolist())}
+        pos = self._positions.get(key)
+        return None if pos is None else self.frame.iloc[pos].to_dict()
+
+    def _flush(self):
+        # Aplica as mudanças pendentes de uma vez (sem mudar a versão: cada
+        # uma já contou quando chegou)
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        frame = self.frame
+        if not frame.empty and self.pk in frame.columns:
+            keep = ~frame[self.pk].isin(list(pending))
+            if not keep.all():
+                frame = frame[keep]
+        rows = [row for row in pending.values() if row is not None]
+        if rows:
+            frame = concat_frames(self.table, [frame, to_frame(self.table, rows)])
+        version = self.version
+        self._set_frame(frame.reset_index(drop=True))
+        self.version = version
+
+    def _save(self, frame_changed=True):
+        os.makedirs(self.directory, exist_ok=True)
+        if frame_changed or not os.path.exists(self.path):
+            tmp = self.path + ".tmp"
+            with metrics.stage("parquet_write", self.table, rows=len(self.frame)):
+                self.frame.to_parquet(tmp, index=False)
+            os.replace(tmp, self.path)
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.meta, fh)
+        os.replace(tmp, self.meta_path)
+
+    def _full(self):
+        frame = _collect(self.table)
+        mark = _watermark(frame, WATERMARK_COLUMN)
+        self._set_frame(frame)
+        self.meta = {"watermark": mark, "tombstones": mark}
+
+    def _tombstones(self, since):
+        """Ids apagados desde ``since``; None se a tabela de exclusões não existe."""
+        try:
+            df = _collect(
+                TOMBSTONE_TABLE,
+                columns=("id_registro", "excluido_em"),
+                filters=Filters().eq("tabela", self.table).between("excluido_em", start=since),
+            )
+        except Exception as e:
+            if is_missing_table(e):
+                return None, None
+            raise  # falha passageira: o delta inteiro fica para a próxima
+        if df.empty:
+            return set(), None
+        return set(df["id_registro"].astype(str)), _watermark(df, "excluido_em")
+
+    def _delta(self):
+        # Marcas novas só entram no meta junto com o frame: se algo falhar no
+        # meio, a próxima sincronização relê a mesma janela
+        pk = self.pk
+        frame = self.frame
+        watermark, tombstones = self.meta["watermark"], self.meta.get("tombstones")
+        changed = _collect(self.table, filters=Filters().between(WATERMARK_COLUMN, start=_since(watermark)))
+        if not changed.empty:
+            watermark = _watermark(changed, WATERMARK_COLUMN) or watermark
+            if not frame.empty:
+                # A janela de OVERLAP traz de volta linhas que o frame já tem nessa versão
+                ids = changed[pk].astype(str)
+                known = frame[frame[pk].astype(str).isin(ids)]
+                seen = set(zip(known[pk].astype(str), known[WATERMARK_COLUMN]))
+                changed = changed[[(k, t) not in seen for k, t in zip(ids, changed[WATERMARK_COLUMN])]]
+        if not changed.empty:
+            if frame.empty:
+                frame = changed
+            else:
+                keep = ~frame[pk].astype(str).isin(changed[pk].astype(str))
+                frame = concat_frames(self.table, [frame[keep], changed])
+
+        deleted, mark = self._tombstones(_since(tombstones or self.meta["watermark"]))
+        if deleted is None:
+            # Sem tombstones: reconcilia pela lista de chaves (uma coluna só)
+            ids = _collect(self.table, columns=(pk,))
+            alive = set(ids[pk].astype(str)) if not ids.empty else set()
+            if not frame.empty:
+                keep = frame[pk].astype(str).isin(alive)
+                if not keep.all():
+                    frame = frame[keep]
+        elif deleted:
+            if not frame.empty:
+                # As tombstones da janela de OVERLAP já podem ter sido aplicadas
+                gone = frame[pk].astype(str).isin(deleted)
+                if gone.any():
+                    frame = frame[~gone]
+            tombstones = mark
+        if frame is not self.frame:
+            self._set_frame(frame.reset_index(drop=True))
+        self.meta = {**self.meta, "watermark": watermark, "tombstones": tombstones}
+
+    def sync(self, force=False, strict=False):
+        """Atualiza o snapshot (no máximo a cada SYNC_INTERVAL) e devolve o DataFrame.
+
+        Se o Supabase falhar, devolve a cópia em disco; com ``strict`` a
+        falha sobe (para quem não pode decidir com dados velhos).
+        """
+        with self.lock:
+            if not self._loaded:
+                self._load()
+            if self.frame is not None:
+                self._flush()
+            if self.frame is not None and not self.due() and not force:
+                return self.frame
+            version, meta = self.version, dict(self.meta)
+            try:
+                if self.frame is None or not self.meta.get("watermark"):
+                    self._full()
+                else:
+                    try:
+                        self._delta()
+                    except Exception as e:
+                        # Ex.: tabela ainda sem updated_at → baixa tudo (falha de rede só sobe)
+                        if is_transient(e):
+                            raise
+                        self._full()
+                # Delta vazio não regrava nada; só a marca d'água mudou → só o JSON
+                if self.version != version or self.meta != meta:
+                    self._save(frame_changed=self.version != version)
+            except Exception:
+                self.meta = meta  # marcas do que não chegou a entrar no frame
+                if self.frame is None or strict:
+                    raise
+                # Supabase fora do ar: serve o que está em disco
+            self.synced_at = time.monotonic()
+            return self.frame
+
+    def current(self):
+        """(frame, versão) lidos juntos, sem sincronizar."""
+        with self.lock:
+            if self.frame is not None:
+                self._flush()
+            return self.frame, self.version
+
+    def mark_stale(self):
+        self.synced_at = None
+
+    def due(self):
+        """True se a próxima sync() vai ao Supabase (intervalo vencido ou marcado velho)."""
+        interval = LIVE_SYNC_INTERVAL if _live else SYNC_INTERVAL
+        return self.synced_at is None or time.monotonic() - self.synced_at >= interval
+
+    def contains_change(self, event, new=None, old=None):
+        """True se o frame já reflete o evento (ex.: linha que o delta já trouxe).
+
+        UPDATE/INSERT: a linha existe com o mesmo ``updated_at``; DELETE: a
+        linha não existe. Sem frame carregado não dá para saber (False).
+        """
+        with self.lock:
+            if self.frame is None:
+                return False
+            key = (new or {}).get(self.pk)
+            if key is None:
+                key = (old or {}).get(self.pk)
+            if key is None:
+                return event == "DELETE"
+            row = self._row(self._key(key))
+            if event == "DELETE":
+                return row is None
+            stamp = (new or {}).get(WATERMARK_COLUMN)
+            if row is None or not stamp or row.get(WATERMARK_COLUMN) is None:
+                return False
+            return pd.to_datetime(stamp, utc=True, format="ISO8601") == pd.to_datetime(row[WATERMARK_COLUMN], utc=True)
+
+    def apply_change(self, event, new=None, old=None):
+        """Aplica um INSERT/UPDATE/DELETE (push do realtime ou escrita local) sem ir ao Supabase.
+
+        Custa uma consulta ao dicionário de posições: a linha fica pendente
+        e entra no frame na próxima leitura (``current``/``sync``).
+        """
+        with self.lock:
+            if self.frame is None:
+                return  # ainda não carregado: a primeira leitura traz tudo
+            key = (new or {}).get(self.pk)
+            if key is None:
+                key = (old or {}).get(self.pk)
+            if key is None:
+                return
+            key = self._key(key)
+            if event in ("INSERT", "UPDATE") and new:
+                # Linha parcial (ex.: escrita otimista) completa com a versão atual
+                self._pending[key] = {**(self._row(key) or {}), **new, self.pk: key}
+            else:
+                self._pending[key] = None
+            self.version += 1
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+_live = False
+
+
+def set_live(flag):
+    """Liga/desliga o modo push. Ao (re)conectar, força um delta para cobrir a janela sem eventos."""
+    global _live
+    _live = bool(flag)
+    with _snapshots_lock:
+        snaps = list(_snapshots.values())
+    for snap in snaps:
+        snap.mark_stale()
+
+
+def get_snapshot(table_name):
+    with _snapshots_lock:
+        snap = _snapshots.get(table_name)
+        if snap is None:
+            snap = _snapshots[table_name] = TableSnapshot(table_name)
+        return snap
+
+
+def load_table(table_name, columns=None, force=False, strict=False):
+    """DataFrame da tabela lido do snapshot local (sincroniza só o delta).
+
+    Devolve uma cópia com as colunas pedidas (as ausentes vêm como None).
+    ``strict`` levanta o erro da sincronização em vez de servir o disco.
+    """
+    frame = get_snapshot(table_name).sync(force=force, strict=strict)
+    if columns is None:
+        return frame.copy()
+    df = frame[[c for c in columns if c in frame.columns]].copy()
+    for c in columns:
+        if c not in df.columns:
+            df[c] = None
+    return df
+
+
+def load_tables(specs, timeout=BATCH_TIMEOUT):
+    """Carrega várias tabelas em paralelo.
+
+    ``specs`` é ``{tabela: colunas}`` (colunas pode ser None). Devolve
+    ``(frames, erros)``: a página decide o que fazer com as que falharam.
+    """
+    calls = {
+        table: (lambda table=table, columns=columns: load_table(table, columns=columns))
+        for table, columns in specs.items()
+    }
+    return run_parallel(calls, timeout=timeout)
+
+
+def _on_write(table_name):
+    # Cache descartado (botão atualizar ou escrita com erro): a próxima leitura busca o delta
+    with _snapshots_lock:
+        snap = _snapshots.get(table_name)
+    if snap is not None:
+        snap.mark_stale()
+
+
+def _on_change(table_name, event, new, old):
+    # Escritas deste processo entram direto no snapshot (sem delta)
+    with _snapshots_lock:
+        snap = _snapshots.get(table_name)
+    if snap is not None:
+        snap.apply_change(event, new, old)
+
+
+on_write(_on_write)
+on_change(_on_change)
@@ -0,0 +1,332 @@
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from utils import metrics
+from utils.snapshot import load_table
+from utils.supabase_client import RETRY_WAIT, SUPABASE_URL, get_client, is_transient, upload_object
+
+logger = logging.getLogger(__name__)
+
+# Arquivos do Storage endereçados pelo conteúdo: o objeto se chama
+# sha256/<hash><extensão>, então o mesmo PDF salvo de novo não sobe outra
+# vez nem ocupa outra cópia. O hash é calculado lendo o arquivo em blocos;
+# arquivos grandes sobem pelo protocolo TUS (upload resumível do Supabase),
+# um bloco por requisição, e uma falha no meio retoma do último bloco
+# aceito. Objetos que nenhuma linha referencia são apagados.
+CONTENT_PREFIX = "sha256"
+# Marcador vazio claims/<nome> regravado quando um processo reaproveita um
+# objeto que já existia: a coleta de lixo de outro processo não vê o
+# _claimed deste e o created_at do objeto pode ser antigo
+CLAIMS_PREFIX = "claims"
+# O TUS do Supabase exige blocos de exatamente 6 MB (menos o último)
+CHUNK_SIZE = 6 * 1024 * 1024
+RESUMABLE_THRESHOLD = int(os.getenv("STORAGE_RESUMABLE_THRESHOLD", str(CHUNK_SIZE)))
+RESUMABLE_ATTEMPTS = int(os.getenv("STORAGE_RESUMABLE_ATTEMPTS", "5"))
+# Uploads TUS em andamento (hash → URL), para retomar depois de uma falha
+UPLOAD_STATE_FILE = os.getenv("STORAGE_UPLOAD_STATE", os.path.join(".cache", "uploads.json"))
+UPLOAD_STATE_TTL = 23 * 3600  # o Supabase descarta uploads incompletos em 24 h
+# Objeto sem referência só é apagado depois de GC_GRACE segundos de vida:
+# protege o upload que acabou de subir e cuja linha ainda não foi gravada
+GC_GRACE = float(os.getenv("STORAGE_GC_GRACE", "3600"))
+GC_INTERVAL = float(os.getenv("STORAGE_GC_INTERVAL", "21600"))  # 0 = sem varredura periódica
+LIST_PAGE = 1000
+# Colunas que guardam URLs públicas de cada bucket
+REFERENCES = {
+    "empreendimentos-pdf": (("mais_emp_empreendimentos", "link_pdf"),),
+}
+TUS_HEADERS = {"Tus-Resumable": "1.0.0"}
+
+_claimed = {}  # (bucket, caminho) → time.monotonic() do último upload/reuso neste processo
+_claimed_lock = threading.Lock()
+_state_lock = threading.Lock()
+
+
+def _reader(file):
+    # Aceita bytes ou arquivo (UploadedFile do Streamlit, open(..., "rb"))
+    return io.BytesIO(file) if isinstance(file, (bytes, bytearray)) else file
+
+
+def content_hash(file, chunk_size=CHUNK_SIZE):
+    """(sha256 em hex, tamanho) lendo ``file`` em blocos; volta ao início no fim."""
+    file = _reader(file)
+    file.seek(0)
+    digest, size = hashlib.sha256(), 0
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return digest.hexdigest(), size
+
+
+def content_path(digest, suffix=""):
+    return f"{CONTENT_PREFIX}/{digest}{suffix}"
+
+
+def public_url(bucket, path):
+    return get_client().storage.from_(bucket).get_public_url(path)
+
+
+def path_of(bucket, url):
+    """Caminho do objeto dentro do bucket a partir da URL pública (None se for de outro lugar)."""
+    if not url:
+        return None
+    marker = f"/object/public/{bucket}/"
+    pos = str(url).find(marker)
+    if pos < 0:
+        return None
+    return str(url)[pos + len(marker):].split("?", 1)[0]
+
+
+def _claim(bucket, path):
+    with _claimed_lock:
+        _claimed[(bucket, path)] = time.monotonic()
+
+
+def _recently_claimed(bucket, path, grace):
+    with _claimed_lock:
+        stamp = _claimed.get((bucket, path))
+    return stamp is not None and time.monotonic() - stamp < grace
+
+
+def _touch(bucket, path):
+    upload_object(bucket, f"{CLAIMS_PREFIX}/{os.path.basename(path)}", b"", content_type="text/plain")
+
+
+def _stamp(item):
+    # Último created_at/updated_at do item listado (NaT se não vier)
+    times = [pd.to_datetime(item.get(k), utc=True, errors="coerce") for k in ("created_at", "updated_at")]
+    times = [t for t in times if not pd.isna(t)]
+    return max(times) if times else pd.NaT
+
+
+def _claim_times(bucket):
+    """Nome do objeto → quando foi reaproveitado por último (marcadores de CLAIMS_PREFIX)."""
+    return {path[len(CLAIMS_PREFIX) + 1:]: _stamp(item) for path, item in _list_objects(bucket, CLAIMS_PREFIX)}
+
+
+def _young(stamp, now, grace):
+    return not pd.isna(stamp) and (now - stamp).total_seconds() < grace
+
+
+def exists(bucket, path):
+    with metrics.call(f"storage:{bucket}", "exists"):
+        return get_client().storage.from_(bucket).exists(path)
+
+
+# ---------------- Upload resumível (TUS) ----------------
+def _load_state():
+    try:
+        with open(UPLOAD_STATE_FILE, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    now = time.time()
+    return {k: v for k, v in state.items() if now - v.get("created", 0) < UPLOAD_STATE_TTL}
+
+
+def _save_state(key, value):
+    with _state_lock:
+        state = _load_state()
+        if value is None:
+            state.pop(key, None)
+        else:
+            state[key] = value
+        os.makedirs(os.path.dirname(UPLOAD_STATE_FILE) or ".", exist_ok=True)
+        with open(UPLOAD_STATE_FILE, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+
+def _metadata(**items):
+    return ",".join(f"{k} {base64.b64encode(str(v).encode()).decode()}" for k, v in items.items())
+
+
+def _server_offset(session, bucket, url):
+    with metrics.call(f"storage:{bucket}", "resumable_head"):
+        r = session.head(url, headers=TUS_HEADERS)
+    if r.status_code != 200:
+        return None
+    return int(r.headers["Upload-Offset"])
+
+
+def upload_resumable(bucket, path, file, size, content_type="application/octet-stream", resume_key=None):
+    """Sobe ``file`` em blocos de CHUNK_SIZE pelo endpoint TUS do Storage.
+
+    ``resume_key`` (o hash do conteúdo) guarda a URL do upload em
+    UPLOAD_STATE_FILE: se o processo cair ou a rede falhar, a próxima
+    chamada com o mesmo conteúdo continua de onde o servidor parou.
+    """
+    session = get_client().storage.session  # o mesmo pool HTTP (e headers de auth) do Storage
+    file = _reader(file)
+    key = f"{bucket}/{resume_key or path}"
+    url = (_load_state().get(key) or {}).get("url")
+    offset = _server_offset(session, bucket, url) if url else None
+    if offset is None:
+        with metrics.call(f"storage:{bucket}", "resumable_create"):
+            r = session.post("upload/resumable", headers={
+                **TUS_HEADERS, "Upload-Length": str(size), "x-upsert": "true",
+                "Upload-Metadata": _metadata(bucketName=bucket, objectName=path, contentType=content_type,
+                                             cacheControl=3600),
+            })
+        r.raise_for_status()
+        url, offset = r.headers["Location"], 0
+        _save_state(key, {"url": url, "created": time.time()})
+
+    failures = 0
+    while offset < size:
+        file.seek(offset)
+        chunk = file.read(CHUNK_SIZE)
+        try:
+            with metrics.call(f"storage:{bucket}", "resumable_patch", bytes_out=len(chunk)):
+                r = session.patch(url, content=chunk, headers={
+                    **TUS_HEADERS, "Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream",
+                })
+            if r.status_code != 409:  # 409: offset diferente do servidor, pergunta de novo
+                r.raise_for_status()
+                offset = int(r.headers["Upload-Offset"])
+                failures = 0
+                continue
+        except Exception as e:
+            failures += 1
+            status = getattr(getattr(e, "response", None), "status_code", 0)
+            if not (is_transient(e) or status >= 500) or failures >= RESUMABLE_ATTEMPTS:
+                raise  # a URL fica em UPLOAD_STATE_FILE: a próxima tentativa retoma
+            time.sleep(RETRY_WAIT * 2 ** failures)
+        current = _server_offset(session, bucket, url)
+        if current is None:
+            raise RuntimeError("upload resumível expirou no servidor; envie o arquivo de novo")
+        offset = current
+    _save_state(key, None)
+
+
+def put_content(bucket, file, content_type="application/octet-stream", suffix=""):
+    """Guarda ``file`` pelo hash do conteúdo e devolve a URL pública.
+
+    Se o objeto já existe no bucket nada é enviado; senão sobe de uma vez
+    (até RESUMABLE_THRESHOLD) ou em blocos pelo TUS.
+    """
+    file = _reader(file)
+    with metrics.stage("sha256", f"storage:{bucket}"):
+        digest, size = content_hash(file)
+    path = content_path(digest, suffix)
+    _claim(bucket, path)
+    if exists(bucket, path):
+        _touch(bucket, path)
+        return public_url(bucket, path)
+    if size <= RESUMABLE_THRESHOLD:
+        file.seek(0)
+        return upload_object(bucket, path, file.read(), content_type=content_type)
+    upload_resumable(bucket, path, file, size, content_type=content_type, resume_key=digest)
+    return public_url(bucket, path)
+
+
+# ---------------- Coleta de lixo ----------------
+def referenced_paths(bucket):
+    """Caminhos do bucket citados nas colunas de REFERENCES (snapshot sincronizado agora).
+
+    Se a sincronização falhar o erro sobe: com a cópia em disco, uma
+    referência recente ficaria de fora e o objeto seria apagado.
+    """
+    paths = set()
+    for table, column in REFERENCES.get(bucket, ()):
+        values = load_table(table, columns=[column], force=True, strict=True)[column].dropna().tolist()
+        paths.update(p for p in (path_of(bucket, v) for v in values) if p)
+    return paths
+
+
+def release(bucket, url):
+    """Apaga o objeto de ``url`` se nenhuma linha o referencia mais (depois de editar/excluir)."""
+    path = path_of(bucket, url)
+    if path is None or _recently_claimed(bucket, path, GC_GRACE) or path in referenced_paths(bucket):
+        return False
+    now = pd.Timestamp.now(tz="UTC")
+    if _young(_claim_times(bucket).get(os.path.basename(path)), now, GC_GRACE):
+        return False  # reaproveitado agora há pouco por outro processo
+    with metrics.call(f"storage:{bucket}", "remove"):
+        get_client().storage.from_(bucket).remove([path])
+    return True
+
+
+def _list_objects(bucket, folder=""):
+    api = get_client().storage.from_(bucket)
+    offset = 0
+    while True:
+        with metrics.call(f"storage:{bucket}", "list"):
+            items = api.list(folder, {"limit": LIST_PAGE, "offset": offset, "sortBy": {"column": "name", "order": "asc"}})
+        for item in items:
+            if item.get("id") is None:  # subpasta
+                continue
+            yield (f"{folder}/{item['name']}" if folder else item["name"]), item
+        if len(items) < LIST_PAGE:
+            return
+        offset += LIST_PAGE
+
+
+def _unreferenced(bucket, grace):
+    """Objetos (raiz e sha256/) e marcadores sem referência nem uso há mais de ``grace`` segundos."""
+    keep = referenced_paths(bucket)
+    claims = _claim_times(bucket)
+    now = pd.Timestamp.now(tz="UTC")
+    doomed = []
+    for folder in ("", CONTENT_PREFIX):
+        for path, item in _list_objects(bucket, folder):
+            if path in keep or _recently_claimed(bucket, path, grace):
+                continue
+            created = pd.to_datetime(item.get("created_at"), utc=True, errors="coerce")
+            if pd.isna(created) or _young(created, now, grace) or _young(claims.get(item["name"]), now, grace):
+                continue
+            doomed.append(path)
+    doomed.extend(f"{CLAIMS_PREFIX}/{name}" for name, stamp in claims.items() if not _young(stamp, now, grace))
+    return doomed
+
+
+def collect_garbage(bucket, grace=GC_GRACE):
+    """Apaga objetos do bucket (raiz e sha256/) sem referência há mais de ``grace`` segundos.
+
+    A lista é conferida duas vezes: o que foi referenciado ou reaproveitado
+    entre a varredura e a remoção fica. Se o Supabase falhar, nada é apagado.
+    """
+    doomed = _unreferenced(bucket, grace)
+    if doomed:
+        doomed = sorted(set(doomed) & set(_unreferenced(bucket, grace)))
+    api = get_client().storage.from_(bucket)
+    for lo in range(0, len(doomed), LIST_PAGE):
+        with metrics.call(f"storage:{bucket}", "remove"):
+            api.remove(doomed[lo:lo + LIST_PAGE])
+    if doomed:
+        logger.info("Storage %s: %d objeto(s) sem referência apagado(s)", bucket, len(doomed))
+    return doomed
+
+
+_last_gc = {}
+_gc_lock = threading.Lock()
+
+
+def schedule_garbage_collection(bucket):
+    """Roda ``collect_garbage`` numa thread, no máximo uma vez a cada GC_INTERVAL por processo."""
+    if not SUPABASE_URL or GC_INTERVAL <= 0:
+        return False
+    with _gc_lock:
+        now = time.monotonic()
+        if bucket in _last_gc and now - _last_gc[bucket] < GC_INTERVAL:
+            return False
+        _last_gc[bucket] = now
+
+    def run():
+        try:
+            collect_garbage(bucket)
+        except Exception as e:
+            logger.warning("Coleta de lixo do Storage %s falhou: %s", bucket, e)
+
+    threading.Thread(target=run, name=f"mais-emp-gc-{bucket}", daemon=True).start()
+    return True
@@ -1,27 +1,938 @@
 import os
-from supabase import create_client
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+import pandas as pd
 from dotenv import load_dotenv
+from utils import metrics
+from utils.cache import TableCache
+from utils.schema import to_frame
 
 # Carregar variáveis do .env
 load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("❌ Variáveis SUPABASE_URL e SUPABASE_KEY não configuradas no .env")
+# Conexões HTTP do cliente (PostgREST e Storage), reaproveitadas por todas
+# as sessões do processo. HTTP/2 só é negociado em https (ALPN).
+HTTP2 = os.getenv("SUPABASE_HTTP2", "1") == "1"
+HTTP_MAX_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "32"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", "16"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_HTTP_KEEPALIVE_EXPIRY", "120"))
+HTTP_TIMEOUT = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "30"))
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+_client = None
+_client_lock = threading.Lock()
+
+
+def _http_client():
+    import httpx
+
+    return httpx.Client(
+        http2=HTTP2,
+        follow_redirects=True,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def _create_client():
+    # Import tardio: supabase/postgrest/gotrue custam ~0,3 s e só são
+    # necessários na primeira consulta, não para desenhar a página.
+    from supabase import Client, ClientOptions
+
+    class _PooledClient(Client):
+        # O cliente httpx informado em ClientOptions é compartilhado entre
+        # auth, PostgREST e Storage, e cada um troca o base_url dele; por
+        # isso cada serviço recebe o seu, todos com o mesmo pool configurado.
+        @staticmethod
+        def _init_postgrest_client(rest_url, headers, schema, **kwargs):
+            return Client._init_postgrest_client(rest_url, headers, schema, http_client=metrics.instrument(_http_client()))
+
+        @staticmethod
+        def _init_storage_client(storage_url, headers, **kwargs):
+            return Client._init_storage_client(storage_url, headers, http_client=metrics.instrument(_http_client()))
+
+    return _PooledClient.create(SUPABASE_URL, SUPABASE_KEY, ClientOptions())
+
+
+def get_client():
+    """Cliente do Supabase do processo, criado na primeira chamada."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if not SUPABASE_URL or not SUPABASE_KEY:
+                    raise ValueError("❌ Variáveis SUPABASE_URL e SUPABASE_KEY não configuradas no .env")
+                with metrics.stage("client_init"):
+                    _client = _create_client()
+    return _client
+
+
+def __getattr__(name):
+    # Compatibilidade: ``from utils.supabase_client import supabase``
+    if name == "supabase":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Resiliência: leituras com falha passageira (rede, timeout, gateway ou
+# PostgREST sem conexão com o banco) são repetidas com espera exponencial
+# aleatória. Falhas seguidas abrem o circuito: por BREAKER_COOLDOWN segundos
+# nada é enviado ao Supabase e o cache serve o último valor bom de cada consulta.
+READ_ATTEMPTS = int(os.getenv("SUPABASE_READ_ATTEMPTS", "3"))
+RETRY_WAIT = float(os.getenv("SUPABASE_RETRY_WAIT", "0.2"))
+RETRY_WAIT_MAX = float(os.getenv("SUPABASE_RETRY_WAIT_MAX", "2"))
+BREAKER_THRESHOLD = int(os.getenv("SUPABASE_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("SUPABASE_BREAKER_COOLDOWN", "30"))
+TRANSIENT_STATUS = {408, 429, 502, 503, 504}
+TRANSIENT_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}  # PostgREST sem banco
+MISSING_TABLE_CODES = {"42P01", "PGRST205"}  # relação inexistente / fora do cache de schema
+READ_OPERATIONS = {"select", "count"}
+
+
+class BackendUnavailable(RuntimeError):
+    """Circuito aberto: o Supabase falhou seguidamente e não está sendo chamado."""
+
+
+def is_transient(exc):
+    """Falha que pode passar sozinha: vale repetir ou servir o último valor bom."""
+    import httpx
+
+    return (
+        isinstance(exc, (BackendUnavailable, httpx.TransportError))
+        or getattr(exc, "http_status", None) in TRANSIENT_STATUS
+        or str(getattr(exc, "code", "")) in TRANSIENT_CODES
+    )
+
+
+def is_missing_table(exc):
+    """A tabela (ou view) consultada não existe no banco."""
+    return str(getattr(exc, "code", "")) in MISSING_TABLE_CODES
+
+
+class CircuitBreaker:
+    """Abre depois de ``threshold`` falhas passageiras seguidas.
+
+    Aberto, toda chamada falha na hora com :class:`BackendUnavailable`.
+    Passados ``cooldown`` segundos uma única chamada de teste é liberada:
+    se der certo o circuito fecha, se falhar abre de novo.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self.opened_at >= self.cooldown:
+                return "half_open"
+            return "open"
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if not self._probing and time.monotonic() - self.opened_at >= self.cooldown:
+                self._probing = True
+                return
+        raise BackendUnavailable(f"Supabase indisponível ({self.failures} falhas seguidas); tentando de novo em instantes")
+
+    def record(self, exc=None):
+        """Resultado da chamada liberada por ``before_call`` (``exc`` None = sucesso)."""
+        with self._lock:
+            probing, self._probing = self._probing, False
+            if exc is None or not is_transient(exc):
+                # O servidor respondeu (mesmo que com erro de validação/RLS)
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if probing or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+                metrics.registry.add("mais_emp_supabase_circuit_open_total", {}, 1)
+
+
+breaker = CircuitBreaker()
+
+
+def _on_fallback(key, table_name, age, exc):
+    metrics.registry.add("mais_emp_cache_fallback_total", {"table": table_name}, 1)
+    metrics.degraded(table_name, age)
+
+
+# Cache de leituras compartilhado por todas as sessões do processo
+cache = TableCache(fallback_on=is_transient, on_fallback=_on_fallback)
+
+# Paginação: o PostgREST corta cada resposta no max-rows do servidor
+# (1000 no Supabase), então nunca pedimos mais que isso por página.
+PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", "1000"))
+MAX_WORKERS = int(os.getenv("SUPABASE_MAX_WORKERS", "4"))
+
+# Pool compartilhado para carregar várias tabelas de uma vez. As threads
+# usam o mesmo cliente httpx (HTTP/2, keep-alive) do postgrest.
+BATCH_WORKERS = int(os.getenv("SUPABASE_BATCH_WORKERS", "8"))
+BATCH_TIMEOUT = float(os.getenv("SUPABASE_BATCH_TIMEOUT", "30"))
+_batch_pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="mais-emp-batch")
+
+PRIMARY_KEYS = {
+    "mais_emp_usuarios": "id_usuario",
+    "mais_emp_empreendimentos": "id_empreendimento",
+    "mais_emp_lead": "id_lead",
+    "mais_emp_agendamento": "id_agendamento",
+    "mais_emp_exclusoes": "id",
+    # Agregados diários mantidos por trigger (sql/006_rollups.sql, só leitura)
+    "mais_emp_rollup_leads": "chave",
+    "mais_emp_rollup_agendamentos": "chave",
+}
+
+# Colunas de rótulo das tabelas de dimensão (usadas nos selects e merges)
+LOOKUP_LABELS = {
+    "mais_emp_usuarios": "nome",
+    "mais_emp_empreendimentos": "nome",
+}
+
+# Views (sql/) que dependem das tabelas: uma escrita na tabela invalida a view
+DEPENDENT_VIEWS = {
+    "mais_emp_lead": ["mais_emp_leads_por_empreendimento"],
+    "mais_emp_empreendimentos": ["mais_emp_leads_por_empreendimento"],
+}
+
+def _like_pattern(text, wildcard="%"):
+    # Escapa os curingas do LIKE digitados pelo usuário
+    text = str(text).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{wildcard}{text}{wildcard}"
+
+def _quote(value):
+    # Valores dentro de or=(...) vão entre aspas para aceitar vírgulas e parênteses
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{value}"'
+
+
+class Filters:
+    """Filtros de página compilados em predicados do PostgREST.
+
+    Cada método ignora valores vazios, então a página pode encadear todos
+    os filtros sem testar um a um::
+
+        Filters().ilike("nome", f_nome).eq("potencial", f_pot)
+    """
+
+    def __init__(self):
+        self._items = []
+        self._empty = False
+
+    def ilike(self, column, text):
+        """Contém ``text``, sem diferenciar maiúsculas/minúsculas."""
+        if text:
+            self._items.append(("ilike", column, _like_pattern(text)))
+        return self
+
+    def eq(self, column, value):
+        if value is not None and value != "":
+            self._items.append(("eq", column, value))
+        return self
+
+    def in_(self, column, values):
+        values = tuple(values)
+        if not values:
+            self._empty = True
+        else:
+            self._items.append(("in", column, values))
+        return self
+
+    def between(self, column, start=None, end=None):
+        """Intervalo fechado [start, end]; datas viram texto ISO."""
+        if start is not None:
+            self._items.append(("gte", column, str(start)))
+        if end is not None:
+            self._items.append(("lte", column, str(end)))
+        return self
+
+    def any_ilike(self, columns, text):
+        """Alguma das colunas contém ``text`` (OR no servidor)."""
+        if text:
+            pattern = _quote(_like_pattern(text, wildcard="*"))
+            self._items.append(("or", None, ",".join(f"{c}.ilike.{pattern}" for c in columns)))
+        return self
+
+    def any_in(self, columns, values):
+        """Alguma das colunas está em ``values`` (OR no servidor)."""
+        values = tuple(values)
+        if not values:
+            self._empty = True
+        else:
+            inside = ",".join(_quote(v) for v in values)
+            self._items.append(("or", None, ",".join(f"{c}.in.({inside})" for c in columns)))
+        return self
+
+    def copy(self):
+        other = Filters()
+        other._items, other._empty = list(self._items), self._empty
+        return other
+
+    @property
+    def empty(self):
+        """True quando nenhum registro pode satisfazer os filtros (ex.: in_ com lista vazia)."""
+        return self._empty
+
+    def key(self):
+        return ("empty",) if self._empty else tuple(self._items)
+
+    def apply(self, query):
+        for op, column, value in self._items:
+            if op == "ilike":
+                query = query.ilike(column, value)
+            elif op == "eq":
+                query = query.eq(column, value)
+            elif op == "in":
+                query = query.in_(column, list(value))
+            elif op == "gte":
+                query = query.gte(column, value)
+            elif op == "lte":
+                query = query.lte(column, value)
+            elif op == "or":
+                query = query.or_(value)
+        return query
+
+    def __bool__(self):
+        return self._empty or bool(self._items)
+
+
+def _like_regex(pattern):
+    # Converte o padrão LIKE (com escapes) numa regex equivalente
+    out, chars = [], iter(pattern)
+    for ch in chars:
+        if ch == "\\":
+            out.append(re.escape(next(chars, "")))
+        elif ch == "%":
+            out.append(".*")
+        elif ch == "_":
+            out.append(".")
+        else:
+            out.append(re.escape(ch))
+    return re.compile("".join(out), re.IGNORECASE | re.DOTALL)
+
+def _compare(a, b):
+    try:
+        a, b = float(a), float(b)
+    except (TypeError, ValueError):
+        a, b = str(a), str(b)
+    return (a > b) - (a < b)
+
+def _matches(items, row):
+    """Avalia localmente os filtros de uma chave de cache; None se não souber avaliar."""
+    for op, column, value in items:
+        if op == "or" or column not in row:
+            return None
+        current = row[column]
+        if current is None:
+            return False
+        if op == "ilike" and not _like_regex(value).fullmatch(str(current)):
+            return False
+        if op == "eq" and str(current) != str(value):
+            return False
+        if op == "in" and str(current) not in {str(v) for v in value}:
+            return False
+        if op == "gte" and _compare(current, value) < 0:
+            return False
+        if op == "lte" and _compare(current, value) > 0:
+            return False
+    return True
+
+
+# Funções chamadas quando o cache de uma tabela é limpo (ex.: snapshots locais)
+_write_listeners = []
+# Funções chamadas com cada linha escrita por este processo
+_change_listeners = []
+
+def on_write(callback):
+    """Registra ``callback(table_name)``, chamado quando o cache da tabela é descartado."""
+    _write_listeners.append(callback)
+
+def on_change(callback):
+    """Registra ``callback(table_name, event, new, old)`` para cada linha escrita aqui."""
+    _change_listeners.append(callback)
 
 # Funções auxiliares
-def get_table_data(table_name):
-    res = supabase.table(table_name).select("*").execute()
-    return res.data if res.data else []
+def _columns(columns):
+    """Projeção: ``"*"`` ou uma sequência de nomes de coluna."""
+    if columns is None or columns == "*":
+        return "*"
+    if isinstance(columns, str):
+        return columns
+    return ",".join(columns)
+
+def _with_column(columns, column):
+    # Garante a coluna na projeção (ex.: a chave usada na paginação)
+    if _columns(columns) == "*" or column in columns:
+        return columns
+    return tuple(columns) + (column,)
+
+def _select(table_name, filters=None, columns="*", **kwargs):
+    query = get_client().table(table_name).select(_columns(columns), **kwargs)
+    return filters.apply(query) if filters else query
+
+def _execute_once(query, table_name, operation, bytes_out):
+    with metrics.call(table_name, operation, bytes_out) as span:
+        try:
+            res = query.execute()
+        except Exception as e:
+            if span.response is not None:
+                e.http_status = span.response.status_code  # o APIError não guarda o status HTTP
+            raise
+        span.rows = res.count if operation == "count" or not isinstance(res.data, list) else len(res.data)
+    return res
+
+def _with_retries(fn, table_name, operation):
+    from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+    def count_retry(state):
+        metrics.registry.add("mais_emp_supabase_retries_total", {"table": table_name, "operation": operation}, 1)
+
+    retrying = Retrying(
+        retry=retry_if_exception(is_transient),
+        stop=stop_after_attempt(READ_ATTEMPTS),
+        wait=wait_random_exponential(multiplier=RETRY_WAIT, max=RETRY_WAIT_MAX),
+        before_sleep=count_retry,
+        reraise=True,
+    )
+    return retrying(fn)
+
+def _execute(query, table_name, operation, bytes_out=0, read_only=False):
+    """Executa a consulta registrando tabela, operação, linhas, bytes e tempo (utils/metrics).
+
+    Leituras com falha passageira são repetidas até READ_ATTEMPTS vezes;
+    escritas vão uma vez só (um INSERT repetido poderia duplicar linhas).
+    Com o circuito aberto falha na hora com :class:`BackendUnavailable`.
+    """
+    breaker.before_call()
+    try:
+        if (operation in READ_OPERATIONS or read_only) and READ_ATTEMPTS > 1:
+            res = _with_retries(lambda: _execute_once(query, table_name, operation, bytes_out), table_name, operation)
+        else:
+            res = _execute_once(query, table_name, operation, bytes_out)
+    except Exception as e:
+        breaker.record(e)
+        raise
+    breaker.record()
+    return res
+
+def invalidate_queries(table_name):
+    """Descarta as consultas em cache da tabela e das views que dependem dela."""
+    cache.invalidate(table_name)
+    for view in DEPENDENT_VIEWS.get(table_name, []):
+        cache.invalidate(view)
+
+def _invalidate(table_name):
+    invalidate_queries(table_name)
+    for callback in _write_listeners:
+        callback(table_name)
+
+def _count_rows(table_name, filters=None):
+    if filters is not None and filters.empty:
+        return 0
+    # head=True: só o cabeçalho Content-Range, nenhuma linha no corpo
+    res = _execute(_select(table_name, filters, count="exact", head=True), table_name, "count")
+    return res.count or 0
+
+def count_rows(table_name, filters=None, use_cache=True):
+    if not use_cache:
+        return _count_rows(table_name, filters)
+    key = (table_name, "count", filters.key() if filters else ())
+    return cache.get_or_load(key, table_name, lambda: _count_rows(table_name, filters))
+
+def _fetch_range(table_name, start, page_size, filters=None, columns="*"):
+    query = _select(table_name, filters, columns)
+    pk = PRIMARY_KEYS.get(table_name)
+    if pk:
+        query = query.order(pk)
+    res = _execute(query.range(start, start + page_size - 1), table_name, "select")
+    return res.data or []
+
+def _fetch_key_range(table_name, start, page_size, filters=None, columns="*"):
+    # Chaves em [start, start + page_size): no máximo page_size linhas (chave inteira e única)
+    pk = PRIMARY_KEYS[table_name]
+    query = _select(table_name, filters, columns).order(pk).gte(pk, start).lt(pk, start + page_size)
+    return _execute(query, table_name, "select").data or []
+
+def _max_key(table_name, filters=None):
+    """Maior chave da tabela com os filtros; None se vazia."""
+    pk = PRIMARY_KEYS[table_name]
+    rows = _execute(_select(table_name, filters, pk).order(pk, desc=True).limit(1), table_name, "select").data
+    return rows[0][pk] if rows else None
+
+def _iter_keyset(table_name, page_size, after=None, filters=None, columns="*"):
+    pk = PRIMARY_KEYS[table_name]
+    columns = _with_column(columns, pk)
+    while True:
+        query = _select(table_name, filters, columns).order(pk).limit(page_size)
+        if after is not None:
+            query = query.gt(pk, after)
+        page = _execute(query, table_name, "select").data or []
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = page[-1][pk]
+
+def _prefetch(fetch, args, workers):
+    # Busca fetch(arg) em paralelo (no máximo 2 * workers em voo) e gera na ordem de ``args``
+    args = iter(args)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = deque()
+        for arg in args:
+            pending.append(pool.submit(metrics.propagate(fetch), arg))
+            if len(pending) >= 2 * max(1, workers):
+                break
+        while pending:
+            result = pending.popleft().result()
+            arg = next(args, None)
+            if arg is not None:
+                pending.append(pool.submit(metrics.propagate(fetch), arg))
+            yield result
+
+def iter_table_pages(table_name, filters=None, columns="*", page_size=PAGE_SIZE, workers=MAX_WORKERS):
+    """Gera a tabela página a página, na ordem da chave primária.
+
+    A primeira página é sempre uma só requisição (keyset, ou ``.range()``
+    em tabelas sem chave): leituras pequenas (delta, seletor) param nela.
+    Se ela vem cheia e ``workers > 1``, o resto de uma chave inteira é lido
+    em faixas (``pk >= a and pk < a + page_size``) buscadas em paralelo: uma
+    linha apagada no meio da leitura não desloca as outras, como aconteceria
+    com ``.range()``. Chaves muito esparsas (ou de texto) e ``workers == 1``
+    seguem por keyset, sequencial. Tabelas sem chave (views) são lidas por
+    ``.range()``. ``filters`` (:class:`Filters`) é aplicado no servidor e
+    ``columns`` limita as colunas trazidas.
+    """
+    if filters is not None and filters.empty:
+        return
+    pk = PRIMARY_KEYS.get(table_name)
+    if not pk:
+        first = _fetch_range(table_name, 0, page_size, filters, columns)
+        if first:
+            yield first
+        if len(first) < page_size:
+            return
+        total = _count_rows(table_name, filters)
+        fetch = lambda start: _fetch_range(table_name, start, page_size, filters, columns)
+        for page in _prefetch(fetch, range(page_size, total, page_size), workers):
+            if page:
+                yield page
+        return
+
+    columns = _with_column(columns, pk)
+    pages = _iter_keyset(table_name, page_size, filters=filters, columns=columns)
+    first = next(pages, [])
+    if first:
+        yield first
+    if len(first) < page_size:
+        return
+    after = first[-1][pk]
+    if workers <= 1 or not isinstance(after, int):
+        yield from pages
+        return
+    hi = _max_key(table_name, filters)
+    if hi is None or hi <= after:
+        yield from pages
+        return
+    # Faixas quase vazias (muitas exclusões ou filtro seletivo) custariam mais que o keyset
+    spans = (hi - after) // page_size + 1
+    if spans > 4:
+        rest = _count_rows(table_name, (filters.copy() if filters else Filters()).between(pk, start=after + 1))
+        if spans > 4 * (rest // page_size + 1):
+            yield from pages
+            return
+    fetch = lambda start: _fetch_key_range(table_name, start, page_size, filters, columns)
+    for page in _prefetch(fetch, range(after + 1, hi + 1, page_size), workers):
+        if page:
+            yield page
+    # Linhas inseridas depois da leitura do limite: continua pela chave
+    yield from _iter_keyset(table_name, page_size, after=hi, filters=filters, columns=columns)
+
+def _fetch_table(table_name, filters=None, columns="*", page_size=PAGE_SIZE):
+    rows = []
+    for page in iter_table_pages(table_name, filters=filters, columns=columns, page_size=page_size):
+        rows.extend(page)
+    return rows
+
+def get_table_data(table_name, columns="*", filters=None, use_cache=True):
+    """Linhas da tabela (lista de dicts).
+
+    ``columns`` é a projeção pedida ao servidor; prefira listar só as
+    colunas que a página usa em vez de ``"*"``.
+    """
+    if not use_cache:
+        return _fetch_table(table_name, filters, columns)
+    key = (table_name, _columns(columns), filters.key() if filters else ())
+    return cache.get_or_load(key, table_name, lambda: _fetch_table(table_name, filters, columns))
+
+def get_table_df(table_name, columns="*", filters=None, use_cache=True):
+    """Como get_table_data, mas já tipado (utils/schema.py).
+
+    O DataFrame convertido fica no cache junto da consulta, então a
+    conversão acontece uma vez por versão dos dados. Devolve uma cópia.
+    """
+    wanted = None if _columns(columns) == "*" else columns  # tabela vazia ainda traz as colunas
+
+    def build():
+        return to_frame(table_name, get_table_data(table_name, columns=columns, filters=filters), wanted)
+
+    if not use_cache:
+        return to_frame(table_name, get_table_data(table_name, columns=columns, filters=filters, use_cache=False), wanted)
+    key = (table_name, _columns(columns), filters.key() if filters else (), "df")
+    return cache.get_or_load(key, table_name, build).copy()
+
+def _after_clause(column, pk, cursor, descending):
+    # Próximas linhas depois de (valor, id) na ordem "column asc|desc nulls last, pk asc"
+    value, key = cursor
+    tie = f"{pk}.gt.{_quote(key)}"
+    if value is None:
+        return f"and({column}.is.null,{tie})"
+    op = "lt" if descending else "gt"
+    return f"{column}.{op}.{_quote(value)},and({column}.eq.{_quote(value)},{tie}),{column}.is.null"
+
+def _fetch_page(table_name, columns, filters, order_by, descending, page_size, after):
+    pk = PRIMARY_KEYS[table_name]
+    query = _select(table_name, filters, _with_column(_with_column(columns, pk), order_by))
+    if after is not None and order_by == pk:
+        query = query.lt(pk, after[1]) if descending else query.gt(pk, after[1])
+    elif after is not None:
+        query = query.or_(_after_clause(order_by, pk, after, descending))
+    query = query.order(order_by, desc=descending, nullsfirst=False)
+    if order_by != pk:
+        query = query.order(pk)
+    return _execute(query.limit(page_size), table_name, "select").data or []
+
+def get_page(table_name, columns="*", filters=None, order_by=None, descending=False, page_size=50, after=None):
+    """Uma página por keyset: ORDER BY order_by, pk + LIMIT, a partir do cursor ``after``.
+
+    ``after`` é ``(valor de order_by, pk)`` da última linha da página
+    anterior (None na primeira). Pede ``page_size + 1`` linhas só para
+    saber se existe próxima página; devolve ``(linhas, cursor_da_próxima)``.
+    """
+    pk = PRIMARY_KEYS[table_name]
+    order_by = order_by or pk
+    if filters is not None and filters.empty:
+        return [], None
+    key = (table_name, _columns(columns), filters.key() if filters else (),
+           ("page", order_by, descending, page_size, after))
+    rows = cache.get_or_load(
+        key, table_name,
+        lambda: _fetch_page(table_name, columns, filters, order_by, descending, page_size + 1, after),
+    )
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, (rows[-1].get(order_by), rows[-1].get(pk))
+
+def get_record(table_name, row_id, columns="*"):
+    """Uma linha pela chave primária (None se não existir)."""
+    pk = PRIMARY_KEYS[table_name]
+    filters = Filters().eq(pk, row_id)
+
+    def fetch():
+        # Uma requisição só (sem a paginação de iter_table_pages)
+        query = _select(table_name, filters, _with_column(columns, pk)).limit(1)
+        return _execute(query, table_name, "select").data or []
+
+    # Mesma chave de get_table_data: escritas locais corrigem a entrada
+    key = (table_name, _columns(columns), filters.key())
+    rows = cache.get_or_load(key, table_name, fetch)
+    return rows[0] if rows else None
+
+def rpc(function_name, params=None, table_name=None, use_cache=True):
+    """Resultado de uma função do banco (sql/), chamada por POST /rpc.
+
+    Só para funções de leitura: são repetidas em falha passageira e, com
+    ``table_name``, ficam no cache até a tabela mudar.
+    """
+    params = dict(params or {})
+
+    def load():
+        return _execute(get_client().rpc(function_name, params), table_name or function_name, f"rpc:{function_name}",
+                        read_only=True).data
+
+    if not use_cache or table_name is None:
+        return load()
+    # Chave de 4 itens: escritas na tabela descartam a entrada (_patch_entry)
+    key = (table_name, "rpc", function_name, tuple(sorted((k, repr(v)) for k, v in params.items())))
+    return cache.get_or_load(key, table_name, load)
+
+def leads_por_empreendimento():
+    """Total de leads por empreendimento, agregado no banco.
+
+    Lê a view ``mais_emp_leads_por_empreendimento`` (sql/001). Se a view
+    ainda não foi criada no projeto, agrega as tabelas localmente.
+    """
+    try:
+        df = get_table_df("mais_emp_leads_por_empreendimento")
+    except Exception:
+        from utils.dimensions import get_dimension  # import tardio: dimensions depende deste módulo
+
+        leads = get_table_df("mais_emp_lead", columns=("id_empreendimento",))
+        if leads.empty:
+            return pd.DataFrame(columns=["Empreendimento", "Leads"])
+        names = get_dimension("mais_emp_empreendimentos").labels_for(leads["id_empreendimento"])
+        leads["Empreendimento"] = names.fillna("Sem vínculo")
+        return leads.groupby("Empreendimento", dropna=False).size().reset_index(name="Leads")
+
+    if df.empty:
+        return pd.DataFrame(columns=["Empreendimento", "Leads"])
+    return df.rename(columns={"empreendimento": "Empreendimento", "leads": "Leads"})[["Empreendimento", "Leads"]]
+
+def run_parallel(calls, timeout=BATCH_TIMEOUT):
+    """Executa ``{nome: função}`` em paralelo e devolve ``(resultados, erros)``.
+
+    ``timeout`` é um número (vale para todas) ou ``{nome: segundos}``.
+    Uma chamada que falha ou estoura o tempo aparece só em ``erros``;
+    as demais seguem normalmente.
+    """
+    start = time.monotonic()
+    futures = {name: _batch_pool.submit(metrics.propagate(fn)) for name, fn in calls.items()}
+    results, errors = {}, {}
+    for name, future in futures.items():
+        limit = timeout.get(name, BATCH_TIMEOUT) if isinstance(timeout, dict) else timeout
+        remaining = max(0.0, limit - (time.monotonic() - start))
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeout:
+            errors[name] = TimeoutError(f"{name}: sem resposta em {limit:.0f}s")
+        except Exception as e:
+            errors[name] = e
+    return results, errors
+
+def clear_cache(table_name=None):
+    """Descarta o cache de uma tabela (ou de todas). Usado pelos botões de atualizar."""
+    if table_name is None:
+        cache.invalidate()
+        for table in PRIMARY_KEYS:
+            for callback in _write_listeners:
+                callback(table)
+    else:
+        _invalidate(table_name)
+
+def _patch_entry(key, value, pk, new, old):
+    """Aplica uma linha escrita numa entrada de cache; None descarta a entrada."""
+    if len(key) != 3:
+        return None  # DataFrames derivados: refeitos a partir das linhas já corrigidas
+    _, kind, items = key
+    if items == ("empty",):
+        return value
+    new_in = _matches(items, new) if new else False
+    if new_in is None:
+        return None
+
+    if kind == "count":
+        old_in = _matches(items, old) if old else False
+        if old_in is None:
+            return None
+        return value + int(new_in) - int(old_in)
+
+    key_value = str((new or old).get(pk))
+    rows, found = [], False
+    for row in value:
+        if str(row.get(pk)) != key_value:
+            rows.append(row)
+        elif new_in:
+            found = True
+            merged = dict(row)
+            merged.update({c: new[c] for c in row if c in new})
+            rows.append(merged)
+    if new_in and not found:
+        rows.append(dict(new) if kind == "*" else {c: new.get(c) for c in kind.split(",")})
+    return rows
+
+def _apply_local(table_name, event, new=None, old=None):
+    """Leva uma escrita ao cache e aos snapshots sem nova leitura no servidor."""
+    pk = PRIMARY_KEYS.get(table_name)
+    if pk is None:
+        invalidate_queries(table_name)
+        return
+    cache.patch(table_name, lambda key, value: _patch_entry(key, value, pk, new, old))
+    for view in DEPENDENT_VIEWS.get(table_name, []):
+        cache.invalidate(view)
+    for callback in _change_listeners:
+        callback(table_name, event, new, old)
+
+# Escritas confirmadas pelo servidor neste processo: o feed realtime devolve
+# cada uma como evento (eco), que não pode ser aplicado de novo. Guarda a
+# chave e o updated_at gravados, por tabela, independente de snapshot.
+ECHO_MEMORY = 2000  # escritas lembradas por tabela
+_echoes = {}
+_echoes_lock = threading.Lock()
+
+def _echo_key(table_name, event, new, old):
+    pk = PRIMARY_KEYS.get(table_name)
+    row = old if event == "DELETE" else new
+    if pk is None or not row or row.get(pk) is None:
+        return None
+    stamp = None if event == "DELETE" else row.get("updated_at")
+    if stamp is not None:
+        try:
+            stamp = pd.Timestamp(stamp).isoformat()  # "Z" e "+00:00" comparam igual
+        except ValueError:
+            stamp = str(stamp)
+    return ("DELETE" if event == "DELETE" else "UPSERT", str(row[pk]), stamp)
+
+def _remember(table_name, event, new=None, old=None):
+    key = _echo_key(table_name, event, new, old)
+    if key is None:
+        return
+    with _echoes_lock:
+        seen = _echoes.setdefault(table_name, OrderedDict())
+        seen[key] = None
+        while len(seen) > ECHO_MEMORY:
+            seen.popitem(last=False)
+
+def is_local_echo(table_name, event, new=None, old=None):
+    """True (uma vez) se o evento é a volta de uma escrita já aplicada por este processo."""
+    key = _echo_key(table_name, event, new, old)
+    if key is None:
+        return False
+    with _echoes_lock:
+        seen = _echoes.get(table_name)
+        if seen is None or key not in seen:
+            return False
+        del seen[key]
+        return True
+
+def apply_remote_change(table_name, event, new=None, old=None):
+    """Aplica uma mudança feita por outro processo (feed realtime) como uma escrita local."""
+    _apply_local(table_name, event, new, old)
 
 def insert_data(table_name, data_dict):
-    return supabase.table(table_name).insert(data_dict).execute().data
+    """Insere e devolve as linhas gravadas, já aplicadas no cache local."""
+    try:
+        rows = _execute(get_client().table(table_name).insert(data_dict), table_name, "insert").data
+    except Exception:
+        _invalidate(table_name)
+        raise
+    for row in rows or []:
+        _remember(table_name, "INSERT", row)
+        _apply_local(table_name, "INSERT", row)
+    return rows
+
+def insert_rows(table_name, rows):
+    """Insere várias linhas numa única requisição (um INSERT, tudo ou nada).
 
-def update_data(table_name, row_id_name, row_id_value, data_dict):
-    return supabase.table(table_name).update(data_dict).eq(row_id_name, row_id_value).execute().data
+    Pede ``returning=minimal``: em cargas grandes não vale trazer as linhas
+    de volta nem aplicá-las uma a uma no cache. Quem chama invalida a
+    tabela (``clear_cache``) ao terminar a carga.
+    """
+    if rows:
+        _execute(get_client().table(table_name).insert(rows, returning="minimal"), table_name, "insert")
+    return len(rows)
+
+def upload_object(bucket, path, data, content_type="application/octet-stream", upsert=True):
+    """Sobe um arquivo ao Storage (medido como as consultas) e devolve a URL pública."""
+    storage = get_client().storage
+    with metrics.call(f"storage:{bucket}", "upload", bytes_out=len(data)):
+        storage.from_(bucket).upload(
+            path=path, file=data,
+            file_options={"content-type": content_type, "upsert": "true" if upsert else "false"},
+        )
+    return storage.from_(bucket).get_public_url(path)
+
+def update_data(table_name, row_id_name, row_id_value, data_dict, current=None):
+    """Atualiza uma linha e devolve a versão gravada.
+
+    Com ``current`` (a linha como a página a conhece) a mudança aparece no
+    cache antes da resposta e é desfeita se o servidor recusar a escrita.
+    """
+    optimistic = None
+    if current is not None:
+        optimistic = {**current, **data_dict, row_id_name: row_id_value}
+        _apply_local(table_name, "UPDATE", optimistic, current)
+    try:
+        rows = _execute(get_client().table(table_name).update(data_dict).eq(row_id_name, row_id_value), table_name, "update").data
+    except Exception:
+        if current is not None:
+            _apply_local(table_name, "UPDATE", current, optimistic)
+        else:
+            _invalidate(table_name)
+        raise
+    if rows:
+        for row in rows:
+            _remember(table_name, "UPDATE", row)
+            _apply_local(table_name, "UPDATE", row, optimistic or current)
+    elif current is not None:
+        # Nenhuma linha alterada (ex.: RLS): volta ao estado anterior
+        _apply_local(table_name, "UPDATE", current, optimistic)
+    return rows
 
 def delete_data(table_name, row_id_name, row_id_value):
-    return supabase.table(table_name).delete().eq(row_id_name, row_id_value).execute().data
+    try:
+        rows = _execute(get_client().table(table_name).delete().eq(row_id_name, row_id_value), table_name, "delete").data
+    except Exception:
+        _invalidate(table_name)
+        raise
+    for row in rows or []:
+        _remember(table_name, "DELETE", None, row)
+        _apply_local(table_name, "DELETE", None, row)
+    return rows
+
+# Códigos do Postgres que explicam por que uma exclusão não aconteceu
+_DELETE_ERRORS = {
+    "23503": "registro referenciado por outra tabela (chave estrangeira)",
+    "42501": "sem permissão (RLS/política de acesso)",
+}
+
+
+@dataclass
+class DeleteResult:
+    deleted: list = field(default_factory=list)   # ids confirmados pelo servidor
+    blocked: list = field(default_factory=list)   # ids que continuam na tabela
+    error: str | None = None
+
+    @property
+    def ok(self):
+        return self.error is None and not self.blocked
+
+
+def delete_rows(table_name, row_id_name, ids):
+    """Exclui ``ids`` numa única requisição e diz o que de fato saiu.
+
+    O PostgREST devolve as linhas apagadas (returning=representation); ids
+    ausentes da resposta são conferidos com uma consulta só da chave, para
+    separar "já não existia" de "bloqueado por RLS".
+    """
+    from postgrest.exceptions import APIError  # import tardio, como o do cliente
+
+    ids = list(ids)
+    if not ids:
+        return DeleteResult()
+    try:
+        res = _execute(get_client().table(table_name).delete(returning="representation").in_(row_id_name, ids), table_name, "delete")
+    except APIError as e:
+        reason = _DELETE_ERRORS.get(str(e.code), e.message or str(e))
+        return DeleteResult(blocked=ids, error=reason)
+    except Exception:
+        _invalidate(table_name)
+        raise
+
+    # A resposta traz as linhas apagadas inteiras: o cache é ajustado sem nova leitura
+    for row in res.data or []:
+        _remember(table_name, "DELETE", None, row)
+        _apply_local(table_name, "DELETE", None, row)
+    deleted = [row.get(row_id_name) for row in (res.data or [])]
+    gone = {str(d) for d in deleted}
+    missing = [i for i in ids if str(i) not in gone]
+    blocked = []
+    if missing:
+        still = _execute(get_client().table(table_name).select(row_id_name).in_(row_id_name, missing), table_name, "select").data or []
+        blocked = [row.get(row_id_name) for row in still]
+    return DeleteResult(deleted=deleted, blocked=blocked)